@@ -591,13 +591,8 @@ def dkey_images(request, slug):
     page = get_object_or_404(dkey_models.Page, title=title)
 
     taxa = None
-    rank = None
-    taxa_names = []
-    for lead in page.leads.all():
-        if lead.taxa_cache:
-            rank, comma_list = lead.taxa_cache.split(':')
-            taxa_names.extend(comma_list.split(','))
-    if rank is None:
+    rank = page.rank_beneath
+    if not rank:
         return jsonify({})
 
     group_title = None
@@ -628,7 +623,9 @@ def dkey_images(request, slug):
                 ON (i.group_number = %s AND f.name = i.family_name)
               LEFT JOIN core_taxon t
                 ON (i.species_name = t.scientific_name)
-              WHERE f.name IN %s""", (group_number, tuple(taxa_names),))
+              JOIN dkey_pagetaxon pt
+                ON (pt.page_id = %s AND f.name = pt.name)""",
+                       (group_number, page.id))
 
         rows = cursor.fetchall()
         family_map = {}
@@ -647,12 +644,14 @@ def dkey_images(request, slug):
             SELECT
               (SELECT id FROM core_taxon WHERE genus_id = g.id LIMIT 1)
               FROM core_genus g
-              WHERE g.name IN %s""", (tuple(taxa_names),))
+              JOIN dkey_pagetaxon pt
+                ON (pt.page_id = %s AND g.name = pt.name)""", (page.id,))
         taxon_ids = [ id for (id,) in cursor.fetchall() ]
 
     elif rank == u'species':
 
-        taxa = Taxon.objects.filter(scientific_name__in=taxa_names)
+        taxa = Taxon.objects.filter(
+            scientific_name__in=page.taxa.values('name'))
         taxon_ids = [ taxon.id for taxon in taxa ]
 
     else:
@@ -13,7 +13,7 @@ from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 
 from gobotany.admin import GoBotanyModelAdmin
-from gobotany.core import models
+from gobotany.core import models, rebuild
 from gobotany.core.distribution_places import DISTRIBUTION_PLACES
 
 # View classes
@@ -134,6 +134,11 @@ class TaxonAdmin(_Base):
             for partner in models.PartnerSite.objects.filter(users=user):
                 models.PartnerSpecies(species=obj, partner=partner).save()
 
+    def save_related(self, request, form, formsets, change):
+        super(TaxonAdmin, self).save_related(request, form, formsets, change)
+        # Synonyms and common names are saved by the inlines.
+        rebuild.rebuild_posting_restrictions([form.instance.id])
+
 
 class GlossaryTermAdmin(_Base):
     """
@@ -523,6 +528,18 @@ class ConservationStatusAdmin(_Base):
         'allow_public_posting')
     search_fields = ['taxon__scientific_name', 'variety_subspecies_hybrid',]
 
+    def save_model(self, request, obj, form, change):
+        super(ConservationStatusAdmin, self).save_model(
+            request, obj, form, change)
+        taxon_ids = [obj.taxon_id]
+        if change and form.initial.get('taxon') is not None:
+            taxon_ids.append(form.initial['taxon'])
+        rebuild.rebuild_posting_restrictions(taxon_ids)
+
+    def delete_model(self, request, obj):
+        super(ConservationStatusAdmin, self).delete_model(request, obj)
+        rebuild.rebuild_posting_restrictions([obj.taxon_id])
+
 
 class InvasiveStatusAdmin(_Base):
     search_fields = ['taxon__scientific_name']
@@ -32,6 +32,7 @@ from gobotany.core.pile_suffixes import pile_suffixes
 from gobotany.search.models import (GroupsListPage, PlainPage,
                                     SubgroupResultsPage, SubgroupsListPage)
 from gobotany.simplekey.groups_order import ordered_pilegroups, ordered_piles
+from gobotany.site import suggestions as site_suggestions
 from gobotany.site.models import PlantNameSuggestion, SearchSuggestion
 
 DEBUG=False
@@ -595,6 +596,8 @@ class Importer(object):
             table.get(name=name)
         table.save()
 
+        site_suggestions.bump_data_version()
+
 
     def import_conservation_statuses(self, statuses_file):
         log.info('Importing conservation statuses')
@@ -640,6 +643,8 @@ class Importer(object):
 
         log.info('Created %d conservation status records.' % statuses_count)
 
+        rebuild.rebuild_posting_restrictions()
+
 
     def import_litsources(self, citation_file):
         log.info('Importing literary source citations')
@@ -2017,6 +2022,8 @@ class Importer(object):
             if created:
                 log.info('  New SearchSuggestion: %s' % suggestion)
 
+        site_suggestions.bump_data_version()
+
 # Split a multiple value string like u'foo| bar'
 
 def pipe_split(text):
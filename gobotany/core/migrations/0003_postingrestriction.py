@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_posting_restrictions(apps, schema_editor):
+    # A copy of gobotany.core.rebuild.rebuild_posting_restrictions as it
+    # stood when this migration was written, so that later changes to
+    # it or to the models cannot change what the migration does.
+    Taxon = apps.get_model('core', 'Taxon')
+    CommonName = apps.get_model('core', 'CommonName')
+    Synonym = apps.get_model('core', 'Synonym')
+    ConservationStatus = apps.get_model('core', 'ConservationStatus')
+    PostingRestriction = apps.get_model('core', 'PostingRestriction')
+    PostingRestrictionName = apps.get_model('core', 'PostingRestrictionName')
+
+    common_name_lists = defaultdict(list)
+    for taxon_id, name in CommonName.objects.order_by(
+            'common_name').values_list('taxon_id', 'common_name'):
+        common_name_lists[taxon_id].append(name)
+    synonym_lists = defaultdict(list)
+    for taxon_id, name in Synonym.objects.order_by(
+            'scientific_name').values_list('taxon_id', 'scientific_name'):
+        synonym_lists[taxon_id].append(name)
+    allowed = defaultdict(
+        lambda: dict((name, True) for name in settings.STATE_NAMES.values()))
+    for taxon_id, region, allow in ConservationStatus.objects.values_list(
+            'taxon_id', 'region', 'allow_public_posting'):
+        state_name = settings.STATE_NAMES[region.lower()]
+        allowed[taxon_id][state_name] = (
+            allowed[taxon_id][state_name] and allow)
+
+    restrictions = []
+    names = []
+    for taxon_id, scientific_name in Taxon.objects.values_list(
+            'id', 'scientific_name'):
+        restrictions.append(PostingRestriction(
+            taxon_id=taxon_id,
+            scientific_name=scientific_name,
+            common_names=json.dumps(common_name_lists[taxon_id]),
+            synonyms=json.dumps(synonym_lists[taxon_id]),
+            allow_public_posting=json.dumps(allowed[taxon_id]),
+            ))
+        all_names = set([scientific_name])
+        all_names.update(common_name_lists[taxon_id])
+        all_names.update(synonym_lists[taxon_id])
+        names.extend(PostingRestrictionName(name=name,
+                                            restriction_id=taxon_id)
+                     for name in all_names)
+
+    PostingRestriction.objects.bulk_create(restrictions, batch_size=1000)
+    PostingRestrictionName.objects.bulk_create(names, batch_size=1000)
+
+
+def create_trigram_index(apps, schema_editor):
+    # Names are looked up with the typo-tolerant patterns of
+    # gobotany.site.fuzzy, as in site migration 0002.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX core_postingrestrictionname_name_trgm'
+        ' ON core_postingrestrictionname USING gin (name gin_trgm_ops)')
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS core_postingrestrictionname_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_auto_20160413_1915'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostingRestriction',
+            fields=[
+                ('taxon', models.OneToOneField(primary_key=True, related_name='posting_restriction', serialize=False, to='core.Taxon', on_delete=django.db.models.deletion.CASCADE)),
+                ('scientific_name', models.CharField(max_length=100)),
+                ('common_names', models.TextField()),
+                ('synonyms', models.TextField()),
+                ('allow_public_posting', models.TextField()),
+            ],
+            options={
+                'ordering': ['scientific_name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PostingRestrictionName',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.CharField(max_length=100, db_index=True)),
+                ('restriction', models.ForeignKey(related_name='names', to='core.PostingRestriction', on_delete=django.db.models.deletion.CASCADE)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='postingrestrictionname',
+            unique_together=set([('name', 'restriction')]),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+        migrations.RunPython(fill_posting_restrictions,
+                             migrations.RunPython.noop),
+    ]
@@ -869,6 +869,42 @@ class ConservationStatus(models.Model):
         return settings.STATE_NAMES[self.region.lower()]
 
 
+class PostingRestriction(models.Model):
+    """Where sightings of a taxon may be posted publicly, precomputed.
+
+    PlantShare checks these restrictions as each sighting is posted, so
+    they are kept ready, along with the taxon's names, by
+    `rebuild.rebuild_posting_restrictions()` whenever the conservation
+    statuses are imported or edited.
+
+    """
+    taxon = models.OneToOneField(Taxon, primary_key=True,
+                                 related_name='posting_restriction')
+    scientific_name = models.CharField(max_length=100)
+    common_names = models.TextField()   # JSON list
+    synonyms = models.TextField()   # JSON list
+    allow_public_posting = models.TextField()   # JSON: state name -> bool
+
+    class Meta:
+        ordering = ['scientific_name']
+
+    def __unicode__(self):
+        return self.scientific_name
+
+
+class PostingRestrictionName(models.Model):
+    """A scientific name, synonym, or common name of a taxon, by which
+    its posting restrictions are looked up."""
+    name = models.CharField(max_length=100, db_index=True)
+    restriction = models.ForeignKey(PostingRestriction, related_name='names')
+
+    class Meta:
+        unique_together = ('name', 'restriction')
+
+    def __unicode__(self):
+        return self.name
+
+
 class InvasiveStatus(models.Model):
     """A list of states that have designated a plant as being invasive or
     prohibited from being sold. Note that we store the lowercase state codes.
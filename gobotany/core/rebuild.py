@@ -1,15 +1,18 @@
 """Rebuild parts of our database that we generate rather than import."""
 
 import csv
+import json
 import sys
+import time
+from collections import defaultdict
 
 # The GoBotany settings have to be imported before most of Django.
 from django.conf import settings
 
 import bulkup
 from django.contrib.contenttypes.models import ContentType
-from django.core.exceptions import ObjectDoesNotExist
 from django.db import connection, transaction
+from django.utils import timezone
 
 from gobotany.core import models
 from gobotany.plantoftheday.models import PlantOfTheDay
@@ -209,7 +212,8 @@ def rebuild_sample_pile_images(name=None):
             print '- found'
 
 
-def rebuild_plant_of_the_day(include_plants='SIMPLEKEY'):   # or 'ALL'
+def rebuild_plant_of_the_day(include_plants='SIMPLEKEY',   # or 'ALL'
+                             stale_plants='KEEP'):   # or 'PURGE'
     """Rebuild the Plant of the Day list without wiping it out.
 
     This means that plant data can be reloaded and the Plant of the Day
@@ -217,34 +221,148 @@ def rebuild_plant_of_the_day(include_plants='SIMPLEKEY'):   # or 'ALL'
     exclusions. This will ensure any new plants (or those with changed
     names) make it into the list.
 
-    Any records in the list that do not have their last_modified field
-    showing the latest rebuild date are likely old and should be deleted.
-    For now, this is left as an occasional manual maintenance task.
+    Each partner's list is rebuilt with a few set-based statements: one
+    UPDATE touches the last_updated field of the plants already listed,
+    and the new plants are inserted in bulk.  Plants whose Taxon records
+    no longer exist are excluded.
+
+    Records for plants that are no longer among a partner's species are
+    likely old.  They are kept unless `stale_plants` is 'PURGE':
+
+    python -m gobotany.core.rebuild plant_of_the_day SIMPLEKEY PURGE
     """
     if include_plants not in ['SIMPLEKEY', 'ALL']:
         print '  Unknown include_plants value: %s' % include_plants
+    elif stale_plants not in ['KEEP', 'PURGE']:
+        print '  Unknown stale_plants value: %s' % stale_plants
     else:
         print '  Rebuilding Plant of the Day list (%s):' % include_plants
+        rebuild_start = time.time()
         for partner_site in models.PartnerSite.objects.all():
             print '    Partner site: %s' % partner_site
+            partner_start = time.time()
             species = models.PartnerSpecies.objects.filter(
                 partner=partner_site)
             if include_plants == 'SIMPLEKEY':
                 species = species.filter(simple_key=True)
-            for s in species:
-                try:
-                    potd = PlantOfTheDay.objects.get(
-                        scientific_name=s.species.scientific_name,
-                        partner_short_name=s.partner.short_name)
-                    # Save the existing record so its last_updated field
-                    # will be updated.
-                    potd.save()
-                except ObjectDoesNotExist:
-                    # Create a new Plant of the Day record.
-                    potd = PlantOfTheDay(
-                        scientific_name=s.species.scientific_name,
-                        partner_short_name=s.partner.short_name)
-                    potd.save()
+            names = species.values('species__scientific_name')
+            plants = PlantOfTheDay.objects.filter(
+                partner_short_name=partner_site.short_name)
+
+            # Touch the existing records so their last_updated fields
+            # show this rebuild.
+            touched = plants.filter(scientific_name__in=names).update(
+                last_updated=timezone.now())
+
+            # Create Plant of the Day records for any new plants.
+            existing_names = set(plants.values_list('scientific_name',
+                                                    flat=True))
+            new_plants = [
+                PlantOfTheDay(scientific_name=name,
+                              partner_short_name=partner_site.short_name)
+                for name in names.values_list('species__scientific_name',
+                                              flat=True)
+                if name not in existing_names]
+            PlantOfTheDay.objects.bulk_create(new_plants, batch_size=500)
+
+            purged = 0
+            if stale_plants == 'PURGE':
+                purged, _ = plants.exclude(scientific_name__in=names).delete()
+
+            log.info('Plant of the Day for %s: %d touched, %d added and '
+                     '%d purged in %.2f seconds', partner_site.short_name,
+                     touched, len(new_plants), purged,
+                     time.time() - partner_start)
+
+        # Exclude plants whose names no longer match a Taxon record, so
+        # that picking a Plant of the Day need not skip over them.
+        missing_plants = PlantOfTheDay.objects.filter(include=True).exclude(
+            scientific_name__in=models.Taxon.objects.values('scientific_name'))
+        print '    Excluded %d plants no longer in the database' % (
+            missing_plants.update(include=False))
+        log.info('Rebuilt the Plant of the Day list in %.2f seconds',
+                 time.time() - rebuild_start)
+
+
+def _allow_public_posting(statuses):
+    """Return whether public posting is allowed in each state.
+
+    `statuses` are (region, allow_public_posting) pairs.  A state allows
+    public posting unless any of its statuses disallows it.
+
+    """
+    allowed = dict((name, True) for name in settings.STATE_NAMES.values())
+    for region, allow in statuses:
+        state_name = settings.STATE_NAMES[region.lower()]
+        allowed[state_name] = allowed[state_name] and allow
+    return allowed
+
+
+def rebuild_posting_restrictions(taxon_ids=None):
+    """Rebuild the PlantShare posting restrictions of every taxon, or of
+    just the taxa with the given ids.
+
+    PlantShare looks a plant's restrictions up by any of its names as
+    each sighting is posted, so each taxon's names, synonyms, and
+    whether each state allows public posting are stored together, with
+    every name in a separately indexed table.
+
+    """
+    PostingRestriction = models.PostingRestriction
+    PostingRestrictionName = models.PostingRestrictionName
+
+    taxa = models.Taxon.objects.all()
+    common_names = models.CommonName.objects.order_by('common_name')
+    synonyms = models.Synonym.objects.order_by('scientific_name')
+    statuses = models.ConservationStatus.objects.all()
+    restrictions = PostingRestriction.objects.all()
+    names = PostingRestrictionName.objects.all()
+    if taxon_ids is not None:
+        taxa = taxa.filter(id__in=taxon_ids)
+        common_names = common_names.filter(taxon_id__in=taxon_ids)
+        synonyms = synonyms.filter(taxon_id__in=taxon_ids)
+        statuses = statuses.filter(taxon_id__in=taxon_ids)
+        restrictions = restrictions.filter(taxon_id__in=taxon_ids)
+        names = names.filter(restriction_id__in=taxon_ids)
+
+    common_name_lists = defaultdict(list)
+    for taxon_id, name in common_names.values_list('taxon_id', 'common_name'):
+        common_name_lists[taxon_id].append(name)
+    synonym_lists = defaultdict(list)
+    for taxon_id, name in synonyms.values_list('taxon_id', 'scientific_name'):
+        synonym_lists[taxon_id].append(name)
+    status_lists = defaultdict(list)
+    for taxon_id, region, allow in statuses.values_list(
+            'taxon_id', 'region', 'allow_public_posting'):
+        status_lists[taxon_id].append((region, allow))
+
+    new_restrictions = []
+    new_names = []
+    for taxon_id, scientific_name in taxa.values_list('id', 'scientific_name'):
+        new_restrictions.append(PostingRestriction(
+            taxon_id=taxon_id,
+            scientific_name=scientific_name,
+            common_names=json.dumps(common_name_lists[taxon_id]),
+            synonyms=json.dumps(synonym_lists[taxon_id]),
+            allow_public_posting=json.dumps(
+                _allow_public_posting(status_lists[taxon_id])),
+            ))
+        all_names = set([scientific_name])
+        all_names.update(common_name_lists[taxon_id])
+        all_names.update(synonym_lists[taxon_id])
+        new_names.extend(PostingRestrictionName(name=name,
+                                                restriction_id=taxon_id)
+                         for name in all_names)
+
+    with transaction.atomic():
+        names.delete()
+        restrictions.delete()
+        PostingRestriction.objects.bulk_create(new_restrictions,
+                                               batch_size=1000)
+        PostingRestrictionName.objects.bulk_create(new_names,
+                                                   batch_size=1000)
+    log.info('Rebuilt posting restrictions for %d taxa',
+             len(new_restrictions))
 
 
 def main():
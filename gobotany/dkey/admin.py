@@ -37,7 +37,7 @@ class LeadAdmin(GoBotanyModelAdmin):
     }
     list_display = ('page', 'letter', 'text', 'goto_page')
     ordering = ('page__title',)
-    readonly_fields = ('taxa_cache',)
+    readonly_fields = ('rank_beneath',)
     search_fields = ('page__title', 'letter', 'text', 'goto_page__title')
 
 
@@ -48,7 +48,7 @@ class PageAdmin(GoBotanyModelAdmin):
     list_display = ('title', 'rank', 'chapter')
     list_filter = ('rank',)
     ordering = ('title',)
-    readonly_fields = ('breadcrumb_cache',)
+    readonly_fields = ('breadcrumb_cache', 'rank_beneath')
     search_fields = ('title', 'chapter', 'rank')
 
 
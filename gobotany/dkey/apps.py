@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 class DichotomousKeyConfig(AppConfig):
     name = 'gobotany.dkey'
-    verbose_name = 'Dichotomous Key'
\ No newline at end of file
+    verbose_name = 'Dichotomous Key'
+
+    def ready(self):
+        from gobotany.dkey import leadtree
+        from gobotany.dkey.models import Lead, Page
+        for model in Page, Lead:
+            name = model._meta.model_name
+            post_save.connect(leadtree.invalidate_rendered_pages,
+                              sender=model,
+                              dispatch_uid='dkey_{}_saved'.format(name))
+            post_delete.connect(leadtree.invalidate_rendered_pages,
+                                sender=model,
+                                dispatch_uid='dkey_{}_deleted'.format(name))
@@ -0,0 +1,40 @@
+"""Time the construction of lead trees for the largest dkey pages,
+and their retrieval through `get_lead_tree` once its cache is warm.
+
+Usage: python -m gobotany.dkey.benchmark [number_of_pages]
+
+"""
+import os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gobotany.settings')
+
+import django
+django.setup()
+
+import sys
+import timeit
+
+from django.db.models import Count
+from django.test.utils import override_settings
+from gobotany.dkey import models
+from gobotany.dkey.leadtree import LeadTree, get_lead_tree
+
+REPEAT = 20
+
+def main(count):
+    pages = (models.Page.objects.annotate(lead_count=Count('leads'))
+             .order_by('-lead_count')[:count])
+    print '{:<40} {:>6} {:>12} {:>12}'.format(
+        'Page', 'Leads', 'Build (ms)', 'Cached (ms)')
+    for page in pages:
+        build = min(timeit.repeat(lambda: LeadTree(page), number=1,
+                                  repeat=REPEAT))
+        # Trees are only cached in production.
+        with override_settings(IN_PRODUCTION=True):
+            get_lead_tree(page)
+            cached = min(timeit.repeat(lambda: get_lead_tree(page), number=1,
+                                       repeat=REPEAT))
+        print u'{:<40} {:>6} {:>12.3f} {:>12.6f}'.format(
+            page.title[:40], page.lead_count, build * 1000.0, cached * 1000.0)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,121 @@
+"""Compact, cached lead trees for rendering dichotomous key pages.
+
+Building the tree of leads for a page means fetching and sorting its
+leads, linking each to its parent, and laying out the nested couplet
+markup.  None of that depends on the request or on the partner site,
+so each process keeps the finished `LeadTree` for every page it has
+rendered, keyed by page ID and by a data version that `sync` bumps
+whenever the dkey is rebuilt.
+
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from gobotany.dkey import models
+
+DATA_VERSION_KEY = 'dkey-data-version'
+
+_trees = {}
+_trees_version = [None]
+
+def data_version():
+    """Return the current version of the dkey data."""
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        version = 0
+    return version
+
+def bump_data_version():
+    """Tell every process that its cached lead trees are stale."""
+    try:
+        cache.incr(DATA_VERSION_KEY)
+    except ValueError:
+        cache.set(DATA_VERSION_KEY, 1, None)
+
+def invalidate_rendered_pages(sender, **kwargs):
+    """Drop the cached lead trees and page snapshots after a Page or
+    Lead is edited; connected in `apps.py`."""
+    if kwargs.get('raw'):
+        return
+    bump_data_version()
+
+class LeadTree(object):
+    """The leads of one dkey page, arranged for the page template.
+
+    `leads` lists the leads in couplet order, and `parents` holds the
+    index in `leads` of each lead's parent, or -1 for a top-level lead.
+    `lead_hierarchy` interleaves the leads with the markup of the
+    nested couplet lists, with adjacent markup already joined into a
+    single string.
+
+    """
+    def __init__(self, page):
+        q = models.Lead.objects.filter(page=page).select_related('goto_page')
+        leads = sorted(q, key=models.Lead.sort_key)
+
+        taxa = defaultdict(set)
+        q = models.LeadTaxon.objects.filter(lead__page=page)
+        for lead_id, name in q.values_list('lead_id', 'name'):
+            taxa[lead_id].add(name)
+
+        index = {lead.id: i for i, lead in enumerate(leads)}
+        parents = [index.get(lead.parent_id, -1) for lead in leads]
+        children = [[] for lead in leads]
+        tops = []
+
+        for i, lead in enumerate(leads):
+            lead.taxa_beneath = taxa[lead.id]
+            parent = parents[i]
+            if parent < 0:
+                tops.append(i)
+            else:
+                children[parent].append(i)
+                leads[parent].child_couplet_number = lead.number()
+
+        self.page_id = page.id
+        self.leads = leads
+        self.parents = parents
+        self.rank_beneath = page.rank_beneath
+        self.taxa_beneath = set(page.taxa.values_list('name', flat=True))
+
+        items = []
+        self._build_hierarchy(tops, children, items)
+        self.lead_hierarchy = items
+
+    def _build_hierarchy(self, indexes, children, items):
+        leads = self.leads
+        for i in indexes:
+            self._append(items, '<li>')
+            items.append(leads[i])
+            if children[i]:
+                self._append(items, '<ul id="c{}" class="couplet">'.format(
+                        leads[i].child_couplet_number))
+                self._build_hierarchy(children[i], children, items)
+                self._append(items, '</ul>')
+            self._append(items, '</li>')
+
+    def _append(self, items, markup):
+        if items and isinstance(items[-1], basestring):
+            items[-1] += markup
+        else:
+            items.append(markup)
+
+def get_lead_tree(page):
+    """Return the `LeadTree` for `page`, building it only if necessary.
+
+    Trees are only kept between requests in production, so that
+    developers see their changes to the dkey data immediately.
+
+    """
+    if not settings.IN_PRODUCTION:
+        return LeadTree(page)
+    version = data_version()
+    if _trees_version[0] != version:
+        _trees.clear()
+        _trees_version[0] = version
+    tree = _trees.get(page.id)
+    if tree is None:
+        tree = _trees[page.id] = LeadTree(page)
+    return tree
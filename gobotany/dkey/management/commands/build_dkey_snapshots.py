@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.http import Http404
+from django.test.client import RequestFactory
+
+from gobotany.core.models import PartnerSite
+from gobotany.dkey import models, snapshots, views
+from gobotany.dkey.templatetags.dkey_filters import slug
+
+class Command(BaseCommand):
+    """Render every non-species dkey page into the snapshot cache.
+
+    The page view serves these snapshots instead of rendering the page
+    live.  Snapshots are kept per host, so each page is rendered as it
+    would be served from each host given, by default the production
+    host of every partner site.  Run this after each dkey import and
+    sync, as bin/load does:
+
+    dev/django build_dkey_snapshots [host ...]
+    """
+    help = 'Pre-render snapshots of the dichotomous key into the cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('hosts', nargs='*',
+            help='Hosts to render the pages for (default: the production'
+                 ' host of each partner site)')
+
+    def handle(self, *args, **options):
+        if not snapshots.snapshot_timeout():
+            self.stderr.write('DKEY_SNAPSHOT_TIMEOUT is not configured.')
+            return
+
+        hosts = options['hosts'] or [
+            '{}.newenglandwild.org'.format(short_name) for short_name in
+            PartnerSite.objects.order_by('short_name').values_list(
+                'short_name', flat=True)]
+
+        slugs = [slug(page) for page in
+                 models.Page.objects.exclude(rank='species').order_by('id')]
+        factory = RequestFactory()
+
+        for host in hosts:
+            count = 0
+            for page_slug in slugs:
+                request = factory.get('/dkey/{}/'.format(page_slug),
+                                      HTTP_HOST=host)
+                try:
+                    response = views.render_page(request, page_slug)
+                except Http404:
+                    continue
+                if response.status_code != 200:
+                    continue
+                snapshots.write_snapshot(host, page_slug, response.content)
+                count += 1
+            self.stdout.write('{}: rendered {} pages'.format(host, count))
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+from django.db import models, migrations
+
+
+def roll_up_taxa(leads, leadin_taxa):
+    """Compute which taxa lie beneath every lead and every page.
+
+    A copy of `gobotany.dkey.models.roll_up_taxa` as it stood when this
+    migration was written, so that later changes to it cannot change
+    what the migration does.
+
+    """
+    children = defaultdict(list)
+    tops = defaultdict(list)
+    for lead in sorted(leads, key=lambda lead: lead.id):
+        if lead.parent_id:
+            children[lead.parent_id].append(lead.id)
+        else:
+            tops[lead.page_id].append(lead.id)
+
+    lead_beneath = {}
+
+    def visit(lead_id):
+        result = lead_beneath.get(lead_id)
+        if result is None:
+            result = leadin_taxa.get(lead_id)
+        if result is None:
+            rank, names = u'', set()
+            for child_id in children[lead_id]:
+                child_rank, child_names = visit(child_id)
+                rank = child_rank or rank
+                names.update(child_names)
+            result = rank, names
+        lead_beneath[lead_id] = result
+        return result
+
+    page_beneath = {}
+    for page_id, lead_ids in tops.items():
+        rank, names = u'', set()
+        for lead_id in lead_ids:
+            lead_rank, lead_names = visit(lead_id)
+            rank = rank or lead_rank
+            names.update(lead_names)
+        page_beneath[page_id] = rank, names
+
+    for lead in leads:
+        visit(lead.id)
+
+    return lead_beneath, page_beneath
+
+
+def split_taxa_cache(apps, schema_editor):
+    """Move each "rank:name1,name2" taxa cache string into real rows."""
+    Lead = apps.get_model('dkey', 'Lead')
+    LeadTaxon = apps.get_model('dkey', 'LeadTaxon')
+    Page = apps.get_model('dkey', 'Page')
+    PageTaxon = apps.get_model('dkey', 'PageTaxon')
+
+    leads = list(Lead.objects.all())
+    leadin_taxa = {}
+    for lead in leads:
+        if lead.taxa_cache:
+            rank, comma_list = lead.taxa_cache.split(':')
+            leadin_taxa[lead.id] = rank, set(comma_list.split(','))
+
+    lead_beneath, page_beneath = roll_up_taxa(leads, leadin_taxa)
+
+    for lead_id, (rank, names) in lead_beneath.items():
+        if rank:
+            Lead.objects.filter(id=lead_id).update(rank_beneath=rank)
+    LeadTaxon.objects.bulk_create(
+        LeadTaxon(lead_id=lead_id, name=name)
+        for lead_id, (rank, names) in lead_beneath.items()
+        for name in names)
+
+    for page_id, (rank, names) in page_beneath.items():
+        if rank:
+            Page.objects.filter(id=page_id).update(rank_beneath=rank)
+    PageTaxon.objects.bulk_create(
+        PageTaxon(page_id=page_id, name=name)
+        for page_id, (rank, names) in page_beneath.items()
+        for name in names)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dkey', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='rank_beneath',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='page',
+            name='rank_beneath',
+            field=models.TextField(blank=True),
+        ),
+        migrations.CreateModel(
+            name='LeadTaxon',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.TextField(db_index=True)),
+                ('lead', models.ForeignKey(related_name='taxa', to='dkey.Lead')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PageTaxon',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('name', models.TextField(db_index=True)),
+                ('page', models.ForeignKey(related_name='taxa', to='dkey.Page')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='leadtaxon',
+            unique_together=set([('lead', 'name')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='pagetaxon',
+            unique_together=set([('page', 'name')]),
+        ),
+        migrations.RunPython(split_taxa_cache, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='lead',
+            name='taxa_cache',
+        ),
+    ]
@@ -1,5 +1,7 @@
 """Data model for the dichotomous key."""
 
+from collections import defaultdict
+
 from django.db import models
 
 # Here are the possible dkey page ranks. Note that a "subgroup" can
@@ -24,6 +26,57 @@ def slug_to_title(slug):
     return slug.replace(u'-', u' ').capitalize().replace(
         ' families', ' Families').replace(' group ', ' Group ')
 
+def roll_up_taxa(leads, leadin_taxa):
+    """Compute which taxa lie beneath every lead and every page.
+
+    `leads` is a list of leads, and `leadin_taxa` maps the id of each
+    lead that jumps to another page to a `(rank, names)` tuple naming
+    the major taxa that can be reached through that page.  A lead that
+    has child leads instead inherits the union of its children's taxa.
+
+    Returns two dicts: one mapping each lead id to `(rank, names)` and
+    another mapping each page id to the `(rank, names)` of its top-level
+    leads taken together.
+
+    """
+    children = defaultdict(list)
+    tops = defaultdict(list)
+    for lead in sorted(leads, key=lambda lead: lead.id):
+        if lead.parent_id:
+            children[lead.parent_id].append(lead.id)
+        else:
+            tops[lead.page_id].append(lead.id)
+
+    lead_beneath = {}
+
+    def visit(lead_id):
+        result = lead_beneath.get(lead_id)
+        if result is None:
+            result = leadin_taxa.get(lead_id)
+        if result is None:
+            rank, names = u'', set()
+            for child_id in children[lead_id]:
+                child_rank, child_names = visit(child_id)
+                rank = child_rank or rank
+                names.update(child_names)
+            result = rank, names
+        lead_beneath[lead_id] = result
+        return result
+
+    page_beneath = {}
+    for page_id, lead_ids in tops.items():
+        rank, names = u'', set()
+        for lead_id in lead_ids:
+            lead_rank, lead_names = visit(lead_id)
+            rank = rank or lead_rank
+            names.update(lead_names)
+        page_beneath[page_id] = rank, names
+
+    for lead in leads:
+        visit(lead.id)
+
+    return lead_beneath, page_beneath
+
 class Page(models.Model):
     """A page of the dichotomous key, that can have several leads on it."""
 
@@ -32,6 +85,7 @@ class Page(models.Model):
     rank = models.TextField(db_index=True)
     text = models.TextField(blank=True)
     breadcrumb_cache = models.ManyToManyField('Page', related_name='ignore+')
+    rank_beneath = models.TextField(blank=True)
 
     class Meta:
         verbose_name = 'dichotomous key page'
@@ -54,7 +108,7 @@ class Lead(models.Model):
     goto_page = models.ForeignKey('Page', related_name='leadins', null=True,
         blank=True)
     goto_num = models.IntegerField(null=True, blank=True)
-    taxa_cache = models.TextField(blank=True)
+    rank_beneath = models.TextField(blank=True)
 
     def __unicode__(self):
         return u'{}:{}.{}'.format(self.id, self.letter, self.goto_page_id
@@ -78,6 +132,24 @@ class Lead(models.Model):
         else:
             return int(self.letter[:-1]), self.letter[-1]
 
+class LeadTaxon(models.Model):
+    """A major taxon that can be reached by following a lead."""
+
+    lead = models.ForeignKey('Lead', related_name='taxa')
+    name = models.TextField(db_index=True)
+
+    class Meta:
+        unique_together = ('lead', 'name')
+
+class PageTaxon(models.Model):
+    """A major taxon that can be reached from somewhere on a page."""
+
+    page = models.ForeignKey('Page', related_name='taxa')
+    name = models.TextField(db_index=True)
+
+    class Meta:
+        unique_together = ('page', 'name')
+
 class Hybrid(models.Model):
     """A paragraph describing a hybrid species."""
 
@@ -97,4 +169,4 @@ class IllustrativeSpecies(models.Model):
     species_name = models.TextField()
 
     class Meta:
-        verbose_name_plural = 'Illustrative species'
\ No newline at end of file
+        verbose_name_plural = 'Illustrative species'
@@ -0,0 +1,120 @@
+"""Pre-rendered snapshots of the dichotomous key's pages.
+
+Every dkey page is derived entirely from imported data, so once a page
+has been rendered it is kept in the cache, together with gzip and (if
+the `brotli` module is installed) brotli compressed copies, and later
+requests for it are answered without touching the database.  The cache
+is shared by every process, so the `build_dkey_snapshots` command, run
+by bin/load after each dkey import, can render every page ahead of time
+for the web processes.
+
+The page markup depends on the host it is served from, so snapshots
+are kept per host.  They are also keyed by the dkey data version, which
+`sync` bumps after each import and which is bumped whenever a Page or
+Lead is saved or deleted, so that edits in the Admin show up at once.
+Snapshots are only kept when DKEY_SNAPSHOT_TIMEOUT is set.
+
+"""
+import gzip
+import hashlib
+from StringIO import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from gobotany.dkey import leadtree
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# The encodings we precompress for, in order of preference.
+
+ENCODINGS = ['br', 'gzip']
+
+def snapshot_timeout():
+    return getattr(settings, 'DKEY_SNAPSHOT_TIMEOUT', None)
+
+def snapshot_key(host, slug, encoding, version):
+    """Return the cache key for one encoding of a page's snapshot."""
+    digest = hashlib.md5(host.encode('utf-8')).hexdigest()
+    return 'dkey-snapshot:{}:{}:{}:{}'.format(
+        version, digest, slug, encoding or 'identity')
+
+def _gzip(data):
+    buf = StringIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9) as f:
+        f.write(data)
+    return buf.getvalue()
+
+def write_snapshot(host, slug, content):
+    """Save `content` and its compressed variants for `host`."""
+    timeout = snapshot_timeout()
+    if not timeout:
+        return
+    variants = {None: content, 'gzip': _gzip(content)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(content)
+    version = leadtree.data_version()
+    cache.set_many(dict(
+        (snapshot_key(host, slug, encoding, version), data)
+        for encoding, data in variants.items()), timeout)
+
+def accepted_encodings(header):
+    """Return the set of content codings that an Accept-Encoding header
+    allows, leaving out any it gives a quality of zero."""
+    qualities = {}
+    for part in header.split(','):
+        params = part.split(';')
+        coding = params[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params[1:]:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    wildcard = qualities.pop('*', 0.0)
+    return set(coding for coding in ENCODINGS
+               if qualities.get(coding, wildcard) > 0)
+
+def _host(request):
+    return request.META.get('HTTP_HOST', '')
+
+def serve_snapshot(request, slug):
+    """Return a response for the snapshot of `slug`, or None if absent."""
+    if not snapshot_timeout():
+        return None
+    host = _host(request)
+    version = leadtree.data_version()
+
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    candidates = [(encoding, snapshot_key(host, slug, encoding, version))
+                  for encoding in ENCODINGS if encoding in accepted]
+    candidates.append((None, snapshot_key(host, slug, None, version)))
+    found = cache.get_many([key for encoding, key in candidates])
+
+    for encoding, key in candidates:
+        content = found.get(key)
+        if content is None:
+            continue
+        response = HttpResponse(content, content_type='text/html; charset=utf-8')
+        if encoding is not None:
+            response['Content-Encoding'] = encoding
+        response['Content-Length'] = str(len(content))
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    return None
+
+def store_snapshot(request, slug, response):
+    """Keep a live rendered page as the snapshot for its host."""
+    if snapshot_timeout() and response.status_code == 200:
+        write_snapshot(_host(request), slug, response.content)
@@ -6,15 +6,16 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gobotany.settings')
 import django
 django.setup()
 
+from collections import defaultdict
 from operator import attrgetter
 
 from django.db import connection, transaction
-from gobotany.dkey import models
+from gobotany.dkey import leadtree, models
 
 def is_major_taxon(page):
     return page.rank in ('family', 'genus', 'species')
 
-def cache_taxon(pagedict, leadindict, rank, taxon, page):
+def cache_taxon(pagedict, leadindict, leadin_taxa, rank, taxon, page):
     """Tell the leads leading to `page` that `rank` `taxon` is below them.
 
     For example, 1a on the first page will be told that the "Family"
@@ -25,12 +26,12 @@ def cache_taxon(pagedict, leadindict, rank, taxon, page):
 
     """
     for leadin in leadindict[page.id]:
-        if not leadin.taxa_cache:
-            leadin.taxa_cache = (rank, set())  # turned into str before save()
-        leadin.taxa_cache[1].add(taxon)
+        if leadin.id not in leadin_taxa:
+            leadin_taxa[leadin.id] = (rank, set())
+        leadin_taxa[leadin.id][1].add(taxon)
         page2 = pagedict[leadin.page_id]
         if not is_major_taxon(page2):
-            cache_taxon(pagedict, leadindict, rank, taxon, page2)
+            cache_taxon(pagedict, leadindict, leadin_taxa, rank, taxon, page2)
 
 @transaction.atomic
 def sync():
@@ -40,7 +41,10 @@ def sync():
 
     c = connection.cursor()
     c.execute("DELETE FROM dkey_page_breadcrumb_cache")
-    c.execute("UPDATE dkey_lead SET taxa_cache = ''")
+    c.execute("DELETE FROM dkey_leadtaxon")
+    c.execute("DELETE FROM dkey_pagetaxon")
+    c.execute("UPDATE dkey_lead SET rank_beneath = ''")
+    c.execute("UPDATE dkey_page SET rank_beneath = ''")
 
     # Load pages.
     print 'Loading pages...'
@@ -48,6 +52,7 @@ def sync():
     pagelist = list(models.Page.objects.all())
     pagedict = { page.id: page for page in pagelist }
     leadindict = { page.id: list(page.leadins.all()) for page in pagelist }
+    leadin_taxa = {}
     parents = {}
     idgetter = attrgetter('id')
 
@@ -70,16 +75,39 @@ def sync():
             parent = parents.get(parent)
 
         if is_major_taxon(page):
-            cache_taxon(pagedict, leadindict, page.rank, page.title, page)
+            cache_taxon(pagedict, leadindict, leadin_taxa,
+                        page.rank, page.title, page)
 
-    for leadins in leadindict.values():
-        for leadin in leadins:
-            tc = leadin.taxa_cache
-            leadin.taxa_cache = '{}:{}'.format(tc[0], ','.join(sorted(tc[1])))
-            leadin.save()  # save the new `taxa_cache` strings
+    # Roll the taxa up through the lead tree on each page, so that page
+    # views can read the taxa beneath each lead and page straight from
+    # the database.
+    print 'Storing the taxa beneath each lead and page...'
+
+    leadlist = list(models.Lead.objects.all())
+    lead_beneath, page_beneath = models.roll_up_taxa(leadlist, leadin_taxa)
+
+    _store_taxa_beneath(models.Lead, models.LeadTaxon, 'lead_id',
+                        lead_beneath)
+    _store_taxa_beneath(models.Page, models.PageTaxon, 'page_id',
+                        page_beneath)
+
+    leadtree.bump_data_version()
 
     print 'Done.'
 
+def _store_taxa_beneath(model, taxon_model, key, beneath):
+    """Save the rank and taxon rows for each `(rank, names)` in `beneath`."""
+    ids_by_rank = defaultdict(list)
+    rows = []
+    for id, (rank, names) in beneath.items():
+        if rank:
+            ids_by_rank[rank].append(id)
+        for name in sorted(names):
+            rows.append(taxon_model(**{key: id, 'name': name}))
+    for rank, ids in ids_by_rank.items():
+        model.objects.filter(id__in=ids).update(rank_beneath=rank)
+    taxon_model.objects.bulk_create(rows, batch_size=1000)
+
 
 if __name__ == '__main__':
     sync()
@@ -5,7 +5,7 @@
 import json as json_module
 import re
 from django.db.models import Q
-from django.template import Context, Library
+from django.template import Library
 from django.template.loader import get_template
 from django.utils.safestring import SafeUnicode, mark_safe
 from django.conf import settings
@@ -95,23 +95,79 @@ re_floating_figure = re.compile(ur'<FIG-(\d+)>')  # see parser.py
 # some malformed figure references like "[Fig. 940 \n]".
 re_figure_link = re.compile(ur'\[Figs?\. ([\d, ]+)(, [RL])?\s*\]')
 
-@register.filter
-def render_floating_figure(match):
-    number = int(match.group(1))
-    figure = models.Figure.objects.get(number=number)
-    return get_template('dkey/figure.html').render(Context({'figure': figure}))
-
-@register.filter
-def render_figure_link(match):
-    numbers = [ int(number) for number in match.group(1).split(',') ]
-    figures = list(models.Figure.objects.filter(number__in=numbers))
-    context = Context({'figures': figures, 'suffix': match.group(2) or ''})
-    return get_template('dkey/figure_link.html').render(context)
-
-@register.filter
-def render_floating_figures(text):
-    text = re_floating_figure.sub(render_floating_figure, text)
-    return text
+_templates = {}
+
+def _get_template(name):
+    """Return a compiled template, reusing it across calls in production."""
+    if settings.DEBUG:
+        return get_template(name)
+    template = _templates.get(name)
+    if template is None:
+        template = _templates[name] = get_template(name)
+    return template
+
+def _figure_numbers(numbers_text):
+    return [ int(number) for number in numbers_text.split(',')
+             if number.strip() ]
+
+class FigureRenderer(object):
+    """Render every figure referenced in a set of texts, like a dkey page.
+
+    All of the figures mentioned anywhere in `texts` are fetched with a
+    single query, and the HTML for each distinct figure reference is
+    rendered only once however many times it appears.  A reference to a
+    figure outside of `texts` is still fetched on demand.
+
+    """
+    def __init__(self, texts=()):
+        numbers = set()
+        for text in texts:
+            for number_text in re_floating_figure.findall(text):
+                numbers.add(int(number_text))
+            for numbers_text, suffix in re_figure_link.findall(text):
+                numbers.update(_figure_numbers(numbers_text))
+        self.figures = (models.Figure.objects.in_bulk(numbers)
+                        if numbers else {})
+        self.rendered = {}
+
+    def _get_figures(self, numbers):
+        missing = [ n for n in numbers if n not in self.figures ]
+        if missing:
+            self.figures.update(models.Figure.objects.in_bulk(missing))
+        return [ self.figures[n] for n in sorted(set(numbers))
+                 if n in self.figures ]
+
+    def render_floating_figure(self, match):
+        key = match.group(0)
+        html = self.rendered.get(key)
+        if html is None:
+            figures = self._get_figures([int(match.group(1))])
+            html = self.rendered[key] = (
+                _get_template('dkey/figure.html').render(
+                    {'figure': figures[0]}) if figures else u'')
+        return html
+
+    def render_figure_link(self, match):
+        key = match.group(0)
+        html = self.rendered.get(key)
+        if html is None:
+            figures = self._get_figures(_figure_numbers(match.group(1)))
+            html = self.rendered[key] = (
+                _get_template('dkey/figure_link.html').render({
+                    'figures': figures, 'suffix': match.group(2) or ''}))
+        return html
+
+    def render_floating_figures(self, text):
+        return re_floating_figure.sub(self.render_floating_figure, text)
+
+    def render_figure_links(self, text):
+        return re_figure_link.sub(self.render_figure_link, text)
+
+@register.filter
+def render_floating_figures(text, renderer=None):
+    if renderer is None:
+        renderer = FigureRenderer([text])
+    return renderer.render_floating_figures(text)
 
 @register.filter
 def discard_floating_figures(text):
@@ -119,9 +175,10 @@ def discard_floating_figures(text):
     return text
 
 @register.filter
-def render_figure_links(text):
-    text = re_figure_link.sub(render_figure_link, text)
-    return text
+def render_figure_links(text, renderer=None):
+    if renderer is None:
+        renderer = FigureRenderer([text])
+    return renderer.render_figure_links(text)
 
 @register.filter
 def json(anything):
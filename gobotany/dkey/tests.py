@@ -1,9 +1,16 @@
 """Tests of whether our basic site layout is present."""
 
+import gzip
 import unittest
+from StringIO import StringIO
 
-from django.test.client import Client
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.test.client import Client, RequestFactory
 
+from gobotany.dkey import leadtree, models, snapshots
+from gobotany.dkey.leadtree import LeadTree, get_lead_tree
+from gobotany.dkey.templatetags.dkey_filters import FigureRenderer
 from gobotany.libtest import FunctionalCase
 
 @unittest.skip('Skipping tests that run against the real database')
@@ -27,3 +34,171 @@ class HomeTests(FunctionalCase):
         client = Client()
         response = client.get('/dkey/equisetum-hyemale/')
         self.assertEqual(response.status_code, 404)
+
+
+class RollUpTaxaTests(TestCase):
+
+    def _lead(self, id, page_id, parent_id=None):
+        return models.Lead(id=id, page_id=page_id, parent_id=parent_id)
+
+    def test_leads_inherit_taxa_of_their_children(self):
+        leads = [
+            self._lead(1, 10),
+            self._lead(2, 10),
+            self._lead(3, 10, parent_id=2),
+            self._lead(4, 10, parent_id=2),
+            ]
+        leadin_taxa = {
+            1: (u'family', set([u'Aceraceae'])),
+            3: (u'family', set([u'Betulaceae'])),
+            4: (u'family', set([u'Cornaceae', u'Betulaceae'])),
+            }
+        lead_beneath, page_beneath = models.roll_up_taxa(leads, leadin_taxa)
+        self.assertEqual(lead_beneath[2],
+                         (u'family', set([u'Betulaceae', u'Cornaceae'])))
+        self.assertEqual(page_beneath[10], (u'family', set([
+            u'Aceraceae', u'Betulaceae', u'Cornaceae'])))
+
+    def test_leads_without_taxa_have_empty_rank(self):
+        leads = [self._lead(1, 10)]
+        lead_beneath, page_beneath = models.roll_up_taxa(leads, {})
+        self.assertEqual(lead_beneath[1], (u'', set()))
+        self.assertEqual(page_beneath[10], (u'', set()))
+
+
+class FigureRendererTests(TestCase):
+
+    def setUp(self):
+        models.Figure.objects.create(number=12, caption=u'Leaf apex.')
+        models.Figure.objects.create(number=13, caption=u'Leaf base.')
+
+    def test_figures_are_fetched_with_one_query(self):
+        texts = [u'See <FIG-12> here.', u'Leaves [Figs. 12, 13] and [Fig. 12]']
+        with self.assertNumQueries(1):
+            renderer = FigureRenderer(texts)
+            renderer.render_floating_figures(texts[0])
+            html = renderer.render_figure_links(texts[1])
+        self.assertEqual(html.count(u'data-caption="Leaf apex."'), 2)
+        self.assertEqual(html.count(u'data-caption="Leaf base."'), 1)
+
+    def test_repeated_references_share_output(self):
+        renderer = FigureRenderer([u'[Fig. 13]'])
+        renderer.render_figure_links(u'[Fig. 13]')
+        with self.assertNumQueries(0):
+            html = renderer.render_figure_links(u'Again [Fig. 13].')
+        self.assertIn(u'>13</a', html)
+
+
+class SnapshotTests(TestCase):
+
+    HOST = 'gobotany.newenglandwild.org'
+
+    def setUp(self):
+        cache.clear()
+        self.override = override_settings(DKEY_SNAPSHOT_TIMEOUT=60)
+        self.override.enable()
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.override.disable()
+
+    def _get(self, host=HOST, **extra):
+        request = self.factory.get('/dkey/group-1/', HTTP_HOST=host, **extra)
+        return snapshots.serve_snapshot(request, 'group-1')
+
+    def test_missing_snapshot_falls_back(self):
+        self.assertIsNone(self._get())
+
+    def test_plain_snapshot(self):
+        snapshots.write_snapshot(self.HOST, 'group-1', '<p>Group 1</p>')
+        response = self._get()
+        self.assertEqual(response.content, '<p>Group 1</p>')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_gzip_snapshot(self):
+        snapshots.write_snapshot(self.HOST, 'group-1', '<p>Group 1</p>')
+        response = self._get(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gzip.GzipFile(fileobj=StringIO(response.content)).read()
+        self.assertEqual(content, '<p>Group 1</p>')
+
+    def test_refused_encodings_are_not_served(self):
+        snapshots.write_snapshot(self.HOST, 'group-1', '<p>Group 1</p>')
+        response = self._get(HTTP_ACCEPT_ENCODING='br;q=0, gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_accepted_encodings(self):
+        self.assertEqual(snapshots.accepted_encodings('gzip, br;q=0.5'),
+                         set(['gzip', 'br']))
+        self.assertEqual(snapshots.accepted_encodings('GZIP;q=0, *'),
+                         set(['br']))
+        self.assertEqual(snapshots.accepted_encodings('identity'), set())
+
+    def test_snapshots_are_kept_per_host(self):
+        snapshots.write_snapshot(self.HOST, 'group-1', '<p>Group 1</p>')
+        self.assertIsNone(self._get('gobotany-dev.newenglandwild.org'))
+
+    def test_edits_invalidate_snapshots(self):
+        snapshots.write_snapshot(self.HOST, 'group-1', '<p>Group 1</p>')
+        models.Page.objects.create(title=u'Group 1', rank=u'group')
+        self.assertIsNone(self._get())
+
+    def test_no_snapshots_unless_configured(self):
+        snapshots.write_snapshot(self.HOST, 'group-1', '<p>Group 1</p>')
+        with override_settings(DKEY_SNAPSHOT_TIMEOUT=None):
+            self.assertIsNone(self._get())
+
+
+class LeadTreeTests(TestCase):
+
+    def setUp(self):
+        self.page = models.Page.objects.create(
+            title=u'Equisetum', rank=u'genus', rank_beneath=u'species')
+        species = models.Page.objects.create(
+            title=u'Equisetum arvense', rank=u'species')
+        a = models.Lead.objects.create(page=self.page, letter=u'1a', text=u'')
+        b = models.Lead.objects.create(page=self.page, letter=u'1b', text=u'')
+        models.Lead.objects.create(page=self.page, parent=b, letter=u'2a',
+                                   text=u'', goto_page=species)
+        models.Lead.objects.create(page=self.page, parent=b, letter=u'2b',
+                                   text=u'')
+        models.PageTaxon.objects.create(page=self.page,
+                                        name=u'Equisetum arvense')
+
+    def test_parent_indexes(self):
+        tree = LeadTree(self.page)
+        self.assertEqual([lead.letter for lead in tree.leads],
+                         [u'1a', u'1b', u'2a', u'2b'])
+        self.assertEqual(tree.parents, [-1, -1, 1, 1])
+        self.assertEqual(tree.leads[1].child_couplet_number, u'2')
+        self.assertEqual(tree.taxa_beneath, set([u'Equisetum arvense']))
+
+    def test_adjacent_markup_is_joined(self):
+        tree = LeadTree(self.page)
+        kinds = [isinstance(item, basestring) for item in tree.lead_hierarchy]
+        self.assertEqual(kinds, [True, False, True, False, True, False,
+                                 True, False, True])
+        self.assertEqual(tree.lead_hierarchy[4],
+                         u'<ul id="c2" class="couplet"><li>')
+        self.assertEqual(tree.lead_hierarchy[-1], u'</li></ul></li>')
+
+    @override_settings(IN_PRODUCTION=True)
+    def test_cached_tree_matches_a_fresh_one(self):
+        cache.clear()
+        leadtree._trees.clear()
+        tree = get_lead_tree(self.page)
+        self.assertIs(get_lead_tree(self.page), tree)
+        fresh = LeadTree(self.page)
+        self.assertEqual([lead.id for lead in tree.leads],
+                         [lead.id for lead in fresh.leads])
+        self.assertEqual(tree.parents, fresh.parents)
+        markup = lambda t: [item if isinstance(item, basestring) else item.id
+                            for item in t.lead_hierarchy]
+        self.assertEqual(markup(tree), markup(fresh))
+        self.assertEqual(tree.taxa_beneath, fresh.taxa_beneath)
+
+    @override_settings(IN_PRODUCTION=True)
+    def test_bumping_the_data_version_rebuilds_the_tree(self):
+        tree = get_lead_tree(self.page)
+        leadtree.bump_data_version()
+        self.assertIsNot(get_lead_tree(self.page), tree)
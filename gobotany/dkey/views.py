@@ -2,7 +2,9 @@ from django.http import Http404
 from django.shortcuts import get_object_or_404, render
 from django.template import RequestContext
 from gobotany.core.partner import partner_short_name
-from gobotany.dkey import models
+from gobotany.dkey import models, snapshots
+from gobotany.dkey.leadtree import get_lead_tree
+from gobotany.dkey.templatetags.dkey_filters import FigureRenderer
 
 group_texts = {
     1: u'Lycophytes, Monilophytes',
@@ -30,49 +32,12 @@ class _Proxy(object):
         self.set_page(self.leads[0].goto_page)
 
     def set_page(self, page):
-        q = models.Lead.objects.filter(page=page).select_related('goto_page')
-        self.leads = list(sorted(q, key=models.Lead.sort_key))
+        tree = get_lead_tree(page)
         self.page = page
-
-        idmap = {lead.id: lead for lead in self.leads}
-        tops = []
-
-        for lead in self.leads:
-            lead.childlist = []
-            if lead.parent_id:
-                parent = idmap[lead.parent_id]
-                parent.childlist.append(lead)
-                parent.child_couplet_number = lead.number()
-            else:
-                tops.append(lead)
-
-        for lead in reversed(self.leads):
-            if lead.taxa_cache:
-                lead.rank_beneath, commalist = lead.taxa_cache.split(':')
-                lead.taxa_beneath = set(commalist.split(','))
-            else:
-                lead.taxa_beneath = set()
-                for child in lead.childlist:
-                    if hasattr(child, 'rank_beneath'):
-                        lead.rank_beneath = child.rank_beneath
-                    lead.taxa_beneath.update(child.taxa_beneath)
-
-        self.rank_beneath = tops[0].rank_beneath if tops else ''
-        self.taxa_beneath = set().union(*(lead.taxa_beneath for lead in tops))
-
-        self.lead_hierarchy = []
-        self.build_lead_hierarchy(tops, self.lead_hierarchy)
-
-    def build_lead_hierarchy(self, leads, items):
-        for lead in leads:
-            items.append('<li>')
-            items.append(lead)
-            if lead.childlist:
-                items.append('<ul id="c{}" class="couplet">'.format(
-                        lead.child_couplet_number))
-                self.build_lead_hierarchy(lead.childlist, items)
-                items.append('</ul>')
-            items.append('</li>')
+        self.leads = tree.leads
+        self.lead_hierarchy = tree.lead_hierarchy
+        self.rank_beneath = tree.rank_beneath
+        self.taxa_beneath = tree.taxa_beneath
 
 def get_groups():
     groups = []
@@ -85,6 +50,14 @@ def get_groups():
 def page(request, slug=u'key-to-the-families'):
     if slug != slug.lower():
         raise Http404
+    response = snapshots.serve_snapshot(request, slug)
+    if response is None:
+        response = render_page(request, slug)
+        snapshots.store_snapshot(request, slug, response)
+    return response
+
+def render_page(request, slug):
+    """Render a dkey page live from the database."""
     title = models.slug_to_title(slug)
     if title.startswith('Section '):
         title = title.title()
@@ -92,8 +65,11 @@ def page(request, slug=u'key-to-the-families'):
     if page.rank == 'species':
         raise Http404
     proxy = _Proxy(page)
+    figures = FigureRenderer(
+        [page.text] + [lead.text for lead in proxy.leads])
     return render(request, 'dkey/page.html', {
             'partner_site': partner_short_name(request),
+            'figures': figures,
             'groups': get_groups,
             'leads': (lambda: proxy.leads),
             'lead_hierarchy': (lambda: proxy.lead_hierarchy),
@@ -0,0 +1,135 @@
+"""Cache each partner's recent Plants of the Day for the day.
+
+The home page and the Atom feed both show the recent Plants of the Day,
+which used to be looked up, along with each plant's taxon, common names
+and image, on every request.  Now the first request of each day for a
+partner picks any Plants of the Day still needed and collects what the
+templates show about each plant into plain dictionaries, which are kept
+in the cache under a key naming the partner and the day.  A lock in the
+cache keeps other processes from doing the same work at the same time;
+they wait for the list instead, up to LOCK_TIMEOUT seconds.
+
+Since the key names the day, the list is rebuilt after midnight without
+needing to be invalidated, so a plant excluded in the Admin disappears
+from the list the next day.
+
+"""
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+
+from gobotany.core import botany
+from gobotany.core.models import Taxon
+from gobotany.plantoftheday.models import PlantOfTheDay
+
+MAX_PLANTS = 15
+CACHE_TIMEOUT = 60 * 60 * 24
+LOCK_TIMEOUT = 60
+LOCK_POLL_INTERVAL = 0.1
+
+def cache_key(partner_name, day):
+    """Return the cache key for a partner's list of plants on a day."""
+    return 'plantoftheday:{}:{}'.format(partner_name, day.isoformat())
+
+def plants_of_the_day(partner_name):
+    """Return the recent Plants of the Day for a partner, latest first,
+    building the list if it has not been built yet today."""
+    key = cache_key(partner_name, date.today())
+    plants = cache.get(key)
+    if plants is not None:
+        return plants
+
+    lock_key = key + ':lock'
+    deadline = time.time() + LOCK_TIMEOUT
+    locked = cache.add(lock_key, True, LOCK_TIMEOUT)
+    while not locked and time.time() < deadline:
+        # Another process is building the list, so wait for it.
+        time.sleep(LOCK_POLL_INTERVAL)
+        plants = cache.get(key)
+        if plants is not None:
+            return plants
+        locked = cache.add(lock_key, True, LOCK_TIMEOUT)
+
+    try:
+        plants = cache.get(key)
+        if plants is None:
+            plants = build_plants_of_the_day(partner_name)
+            cache.set(key, plants, CACHE_TIMEOUT)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return plants
+
+def build_plants_of_the_day(partner_name, max_number_plants=MAX_PLANTS):
+    """Get recent plants of the day, generating some if needed."""
+
+    # Generate today's Plant of the Day if it hasn't been already.
+    # If there is a gap of any recent days where no Plant of the Day
+    # record exists yet, generate records for those days too.
+    today = date.today()
+    first_day = today - timedelta(days=max_number_plants - 1)
+    days_seen = set(PlantOfTheDay.objects.filter(
+        last_seen__range=(first_day, today),
+        partner_short_name=partner_name, include=True,
+        ).values_list('last_seen', flat=True))
+    for i in range(max_number_plants):
+        day = today - timedelta(days=i)
+        if day in days_seen:
+            # Found the latest recent Plant of the Day record within
+            # the date range used for the feed, so no more records
+            # need to be generated.
+            break
+        PlantOfTheDay.get_by_date.for_day(day, partner_name)
+
+    # Now that any new records that were needed have been generated,
+    # collect what the templates show about each plant.
+    plant_records = list(PlantOfTheDay.objects.filter(
+        include=True,
+        last_seen__isnull=False,
+        partner_short_name=partner_name)
+        .order_by('-last_seen')[:max_number_plants])
+    taxa = Taxon.objects.filter(
+        scientific_name__in=[p.scientific_name for p in plant_records]
+        ).select_related('genus').prefetch_related('common_names')
+    taxa = dict((taxon.scientific_name, taxon) for taxon in taxa)
+
+    plants = []
+    for plant_record in plant_records:
+        taxon = taxa.get(plant_record.scientific_name)
+        if taxon is None:
+            continue
+
+        # Use the last_updated field because it is a date/time field,
+        # rather than last_seen which is just a date field, because the
+        # time is needed for stamping each post. However, the actual
+        # query above must use last_seen to get the correct plant records.
+        post_datetime = datetime.combine(plant_record.last_seen,
+                                         plant_record.last_updated.time())
+        time_zone_offset = '-00:00'   # unknown local time zone offset
+
+        image = None
+        species_images = botany.species_images(taxon).select_related(
+            'image_type')
+        if len(species_images) > 0:
+            image = species_images[0]
+            image = {
+                'image_type': image.image_type.name,
+                'thumb_large': image.thumb_large(),
+                'image_medium': image.image_medium(),
+                }
+
+        plants.append({
+            'scientific_name': plant_record.scientific_name,
+            'post_datetime': ''.join([post_datetime.isoformat(),
+                                      time_zone_offset]),
+            'common_names': [unicode(name) for name in
+                             taxon.common_names.all()],
+            'facts': taxon.factoid,
+            'url': reverse('taxa-species',
+                           args=[taxon.genus.slug, taxon.epithet]),
+            'image': image,
+            })
+
+    return plants
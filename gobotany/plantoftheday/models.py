@@ -2,7 +2,6 @@ import random
 
 from datetime import date
 
-from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 
 from gobotany.core.models import Taxon
@@ -12,60 +11,58 @@ class PlantOfTheDayManager(models.Manager):
 
     def _pick_candidate_plant(self, day_date, partner_name):
         """Pick a candidate Plant of the Day for a given day and partner."""
-        candidate_plant = None
+        plants = self.filter(partner_short_name=partner_name, include=True)
+
         # First check to see if there is already a plant for this day.
-        plants = self.filter(last_seen=day_date,
-                             partner_short_name=partner_name,
-                             include=True)
-        if len(plants) > 0:
-            candidate_plant = plants[0]
-        else:
-            # A plant wasn't found for the requested date.
-            if day_date > date.today():
-                # The requested date is in the future.
-                candidate_plant = None
+        candidate_plant = plants.filter(last_seen=day_date).first()
+        if candidate_plant is None and day_date <= date.today():
+            # A plant wasn't found for the requested date, which is not
+            # in the future, so pick a new Plant of the Day for it.
+
+            # Try picking a yet-unseen plant at random.  Rather than
+            # sort every unseen plant to reach a random offset, pick a
+            # random ID between the lowest and highest unseen IDs and
+            # take the first unseen plant from there on, which the
+            # primary key index finds without a sort.  Gaps in the IDs
+            # make some plants a little likelier than others.
+            unseen = plants.filter(last_seen__isnull=True)
+            ids = unseen.aggregate(low=models.Min('id'),
+                                   high=models.Max('id'))
+            if ids['low'] is not None:
+                candidate_plant = unseen.filter(
+                    id__gte=random.randint(ids['low'], ids['high']),
+                    ).order_by('id').first()
             else:
-                # Pick a new Plant of the Day for this date.
-
-                # Try picking a yet-unseen plant at random.
-                plants = self.filter(last_seen__isnull=True,
-                                     partner_short_name=partner_name,
-                                     include=True)
-                if len(plants) > 0:
-                    index = random.randrange(0, len(plants))
-                    candidate_plant = plants[index]
-                else:
-                    # If none are unseen, pick the one last seen longest ago.
-                    plants = self.filter(last_seen__isnull=False,
-                                         partner_short_name=partner_name,
-                                         include=True).order_by('last_seen')
-                    if len(plants) > 0:
-                        candidate_plant = plants[0]
+                # If none are unseen, pick the one last seen longest ago.
+                candidate_plant = plants.filter(
+                    last_seen__isnull=False).order_by('last_seen').first()
 
         return candidate_plant
 
     def for_day(self, day_date, partner_name):
-        """Return the Plant of the Day for a given day and partner site."""
+        """Return the Plant of the Day for a given day and partner site.
+
+        Plants whose Taxon records are gone are excluded in bulk when
+        the list is rebuilt, but one could still be deleted afterwards,
+        so each candidate is checked before it is returned.
+        """
 
         plant_for_day = None
-        taxon = None
 
-        while not taxon:
+        while True:
             candidate_plant = self._pick_candidate_plant(
                 day_date, partner_name)
-            if candidate_plant:
-                # Make sure this plant still exists in the main database.
-                try:
-                    taxon = Taxon.objects.get(
-                        scientific_name=candidate_plant.scientific_name)
-                    plant_for_day = candidate_plant
-                except ObjectDoesNotExist:
-                    # Disable this plant in the Plant of the Day list,
-                    # so it cannot be picked again.
-                    candidate_plant.include = False
-                    candidate_plant.save()
-            else:
+            if not candidate_plant:
+                break
+            # Make sure this plant still exists in the main database.
+            if Taxon.objects.filter(
+                    scientific_name=candidate_plant.scientific_name).exists():
+                plant_for_day = candidate_plant
                 break
+            # Disable this plant in the Plant of the Day list,
+            # so it cannot be picked again.
+            candidate_plant.include = False
+            candidate_plant.save()
 
         if plant_for_day:
             plant_for_day.last_seen = day_date
@@ -124,6 +121,7 @@ class PlantOfTheDay(models.Model):
         ordering = ['scientific_name', 'partner_short_name']
 
         unique_together = ('scientific_name', 'partner_short_name')
+        index_together = [('partner_short_name', 'include', 'last_seen')]
         verbose_name = 'Plant of the Day'
         verbose_name_plural = 'Plants of the Day'
 
@@ -7,12 +7,15 @@ import unittest
 from datetime import date, timedelta
 from StringIO import StringIO
 
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
 
 from gobotany.core.models import (Family, Genus, PartnerSite, PartnerSpecies,
                                   Taxon)
 from gobotany.core.rebuild import rebuild_plant_of_the_day
 from gobotany.libtest import FunctionalCase
+from gobotany.plantoftheday import daily
 from gobotany.plantoftheday.models import PlantOfTheDay
 
 # Test data
@@ -81,13 +84,14 @@ def _get_expected_taxa_count(simplekey_plants, non_simplekey_plants):
     expected_taxa_count = len(set(epithets))
     return expected_taxa_count
 
-def _run_rebuild_plant_of_the_day(include_plants):
+def _run_rebuild_plant_of_the_day(include_plants, stale_plants='KEEP'):
     """Run the rebuild function, redirecting message output to a return
     variable for testing and for quiet test output.
     """
     original_stdout = sys.stdout
     sys.stdout = stdout = StringIO()
-    rebuild_plant_of_the_day(include_plants=include_plants)
+    rebuild_plant_of_the_day(include_plants=include_plants,
+                             stale_plants=stale_plants)
     sys.stdout = original_stdout
     output = stdout.getvalue()
     return output
@@ -223,6 +227,50 @@ class PlantOfTheDayTestCase(TestCase):
             scientific_name='Acer ginala', partner_short_name='montshire')
         self.assertTrue(obsolete_plant)
 
+    def test_rebuild_excludes_plants_without_taxa(self):
+        _run_rebuild_plant_of_the_day('SIMPLEKEY')
+        Taxon.objects.get(scientific_name='Acer ginala').delete()
+
+        rebuild_output = _run_rebuild_plant_of_the_day('SIMPLEKEY')
+
+        self.assertTrue(rebuild_output.find(
+            'Excluded 1 plants no longer in the database') > -1)
+        self.assertEqual(['Acer ginala'], list(
+            PlantOfTheDay.objects.filter(include=False).values_list(
+                'scientific_name', flat=True)))
+
+    def test_rebuild_keeps_or_purges_stale_plants(self):
+        _run_rebuild_plant_of_the_day('SIMPLEKEY')
+        PartnerSpecies.objects.filter(partner__short_name='gobotany',
+            species__scientific_name='Acer rubrum').delete()
+
+        _run_rebuild_plant_of_the_day('SIMPLEKEY')
+        self.assertTrue(PlantOfTheDay.objects.filter(
+            scientific_name='Acer rubrum',
+            partner_short_name='gobotany').exists())
+
+        _run_rebuild_plant_of_the_day('SIMPLEKEY', 'PURGE')
+        self.assertFalse(PlantOfTheDay.objects.filter(
+            scientific_name='Acer rubrum',
+            partner_short_name='gobotany').exists())
+        self.assertTrue(PlantOfTheDay.objects.filter(
+            scientific_name='Acer rubrum',
+            partner_short_name='montshire').exists())
+        expected_plant_count = (len(SIMPLEKEY_PLANTS['gobotany']) - 1 +
+            len(SIMPLEKEY_PLANTS['montshire']))
+        self.assertEqual(expected_plant_count,
+            len(PlantOfTheDay.objects.all()))
+
+    def test_rebuild_touches_existing_plants(self):
+        _run_rebuild_plant_of_the_day('SIMPLEKEY')
+        PlantOfTheDay.objects.update(
+            last_updated=timezone.now() - timedelta(days=30))
+
+        _run_rebuild_plant_of_the_day('SIMPLEKEY')
+
+        self.assertFalse(PlantOfTheDay.objects.filter(
+            last_updated__lt=timezone.now() - timedelta(days=1)).exists())
+
 
 class PlantOfTheDayManagerTestCase(TestCase):
     """Test the custom model manager (PlantOfTheDay.get_by_date.[...])"""
@@ -359,6 +407,44 @@ class PlantOfTheDayManagerTestCase(TestCase):
         self.assertEqual(None, excluded_plant.last_seen)
 
 
+class DailyPlantsTestCase(TestCase):
+    """Test the daily cache of recent Plants of the Day."""
+
+    PARTNER = 'gobotany'
+
+    def setUp(self):
+        _import_plant_data(SIMPLEKEY_PLANTS, NON_SIMPLEKEY_PLANTS)
+        _run_rebuild_plant_of_the_day('SIMPLEKEY')
+        cache.clear()
+
+    def test_first_request_picks_todays_plant(self):
+        plants = daily.plants_of_the_day(self.PARTNER)
+        self.assertEqual(1, len(plants))
+        todays_plant = PlantOfTheDay.objects.get(
+            partner_short_name=self.PARTNER, last_seen=date.today())
+        self.assertEqual(todays_plant.scientific_name,
+                         plants[0]['scientific_name'])
+        self.assertEqual('/species/acer/%s/' % plants[0]['scientific_name']
+                         .split(' ')[1], plants[0]['url'])
+
+    def test_later_requests_read_the_cache(self):
+        plants = daily.plants_of_the_day(self.PARTNER)
+        with self.assertNumQueries(0):
+            self.assertEqual(plants, daily.plants_of_the_day(self.PARTNER))
+
+    def test_builds_list_if_lock_is_never_released(self):
+        key = daily.cache_key(self.PARTNER, date.today())
+        cache.add(key + ':lock', True)
+        lock_timeout = daily.LOCK_TIMEOUT
+        daily.LOCK_TIMEOUT = 0
+        try:
+            plants = daily.plants_of_the_day(self.PARTNER)
+        finally:
+            daily.LOCK_TIMEOUT = lock_timeout
+        self.assertEqual(1, len(plants))
+        self.assertTrue(cache.get(key + ':lock'))
+
+
 @unittest.skip('Skipping tests that run against the real database')
 class FunctionalTests(FunctionalCase):
 
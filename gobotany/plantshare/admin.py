@@ -38,7 +38,7 @@ class QuestionAdmin(GoBotanyModelAdmin):
         if images:
             for image in images:
                 html += '<a href="%s"><img src="%s"></a> ' % (
-                    image.image.url, image.thumb.url)
+                    image.image.url, image.thumb_url)
             return html
         else:
             return None
@@ -92,15 +92,16 @@ class SightingAdmin(GoBotanyModelAdmin):
         html = ''
         for photo in obj.private_photos():
             html += '<a href="%s"><img src="%s"></a> ' % (photo.image.url,
-                photo.thumb.url)
+                photo.thumb_url)
         return html
     photographs.short_description = 'Photos'
     photographs.allow_tags = True
 
 class ScreenedImageAdmin(GoBotanyModelAdmin):
     list_display = ('image_type', 'uploaded', 'uploaded_by',
-        'email', 'screened', 'screened_by', 'is_approved', 'admin_thumb')
-    list_filter = ('is_approved',)
+        'email', 'screened', 'screened_by', 'is_approved', 'processing',
+        'admin_thumb')
+    list_filter = ('is_approved', 'processing')
     list_editable = ('is_approved',)
 
     def email(self, obj):
@@ -109,7 +110,9 @@ class ScreenedImageAdmin(GoBotanyModelAdmin):
     def admin_thumb(self, obj):
         """Show thumbnails. Doing this, because ImageKit's AdminThumbnail
         would not render."""
-        return '<img src="%s">' % (obj.thumb.url)
+        if obj.processing != 'DONE':
+            return ''
+        return '<img src="%s">' % (obj.thumb_url)
     admin_thumb.short_description = 'Thumbnail'
     admin_thumb.allow_tags = True
 
@@ -0,0 +1,100 @@
+"""Streaming exports of PlantShare data, as CSV or JSON.
+
+An export is written row by row into a StreamingHttpResponse, so that
+its first bytes are sent at once and memory use does not grow with the
+number of rows.  Rows are read as plain values, with their related rows
+joined in, a chunk at a time in order of ID; this keeps only one chunk
+of even a power user's thousands of sightings in memory at once.
+
+"""
+import csv
+import json
+from datetime import date, datetime
+
+from django.http import StreamingHttpResponse
+
+FORMATS = ('csv', 'json')
+CHUNK_SIZE = 500
+CSV_DATE_FORMAT = '%d/%m/%Y'
+
+class Echo(object):
+    """A file-like object whose `write` returns what it is given, which
+    lets a `csv.writer` produce the lines of a generator."""
+    def write(self, value):
+        return value
+
+def chunked(queryset, fields, chunk_size=CHUNK_SIZE):
+    """Yield the `fields` of each row of a queryset, as tuples, reading
+    `chunk_size` rows at a time in order of ID."""
+    names = ['id'] + [field for field in fields if field != 'id']
+    positions = [names.index(field) for field in fields]
+    queryset = queryset.order_by('id').values_list(*names)
+    last_id = None
+    while True:
+        chunk = queryset
+        if last_id is not None:
+            chunk = chunk.filter(id__gt=last_id)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            break
+        for row in chunk:
+            yield tuple(row[position] for position in positions)
+        last_id = chunk[-1][0]
+
+def _csv_value(value):
+    if value is None:
+        return 'N/A'
+    if value is True or value is False:
+        return 'Yes' if value else 'No'
+    if isinstance(value, (date, datetime)):
+        return value.strftime(CSV_DATE_FORMAT)
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+def csv_lines(headings, rows, preamble=()):
+    """Yield the lines of a CSV file, after any `preamble` rows."""
+    writer = csv.writer(Echo())
+    for row in preamble:
+        yield writer.writerow([_csv_value(value) for value in row])
+    yield writer.writerow(headings)
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+def json_lines(keys, rows):
+    """Yield the text of a JSON array of objects, one object per line."""
+    yield '['
+    separator = '\n'
+    for row in rows:
+        yield separator + json.dumps(dict(zip(keys, row)),
+                                     default=_json_default, sort_keys=True)
+        separator = ',\n'
+    yield '\n]\n'
+
+def export_response(queryset, columns, filename, format='csv',
+                    preamble=()):
+    """Return a response streaming the rows of a queryset.
+
+    Each column is a (CSV heading, JSON key, queryset field) triple.  The
+    `preamble` rows, if any, go at the top of a CSV file.
+
+    """
+    fields = [field for heading, key, field in columns]
+    rows = chunked(queryset, fields)
+    if format == 'json':
+        response = StreamingHttpResponse(
+            json_lines([key for heading, key, field in columns], rows),
+            content_type='application/json; charset=utf-8')
+    else:
+        response = StreamingHttpResponse(
+            csv_lines([heading for heading, key, field in columns], rows,
+                      preamble),
+            content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = (
+        'attachment; filename="{0}.{1}"'.format(filename, format))
+    return response
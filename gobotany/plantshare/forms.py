@@ -175,9 +175,13 @@ class ChangeEmailForm(forms.ModelForm):
 
 
 class ScreenedImageForm(forms.ModelForm):
+    # The upload is stored as the image's original; the image itself is
+    # made from it later (see gobotany.plantshare.imagequeue).
+    image = forms.ImageField()
+
     class Meta:
         model = ScreenedImage
-        fields = ('image', 'image_type') # TODO: need? ,'latitude', 'longitude')
+        fields = ('image_type',) # TODO: need? ,'latitude', 'longitude')
 
 
 class ChecklistForm(forms.ModelForm):
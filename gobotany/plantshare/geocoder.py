@@ -0,0 +1,144 @@
+"""Offline lookup of the New England state containing a point.
+
+The state boundaries in `state_boundaries.json` are the county outlines
+of the New England distribution map, converted to latitude and longitude
+by the `build_state_boundaries` command.  They are only as detailed as
+that map, about a kilometer or two, so points within `TOLERANCE` of a
+state, like sightings on a beach or a small island, count as in it.
+
+Lookups use a grid over the region.  A cell that no boundary crosses
+already knows its state; in other cells, a ray is cast east from the
+point across just the boundary edges that span the point's row.
+
+"""
+import json
+import math
+from os.path import dirname, join
+
+BOUNDARIES_PATH = join(dirname(__file__), 'state_boundaries.json')
+CELL_SIZE = 0.05   # degrees
+TOLERANCE = 0.03   # degrees of latitude, about 3 km
+
+BORDER = object()   # marks grid cells that a boundary crosses
+
+class StateBoundaries(object):
+    """A grid index of state boundary edges.
+
+    `states` maps each state name to a list of rings, each a list of
+    (longitude, latitude) pairs.  A point is in a state if it is inside
+    an odd number of that state's rings.
+
+    """
+    def __init__(self, states, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        points = [point for rings in states.values()
+                  for ring in rings for point in ring]
+        self.west = min(x for x, y in points) - TOLERANCE * 2
+        self.south = min(y for x, y in points) - TOLERANCE
+        self.east = max(x for x, y in points) + TOLERANCE * 2
+        self.north = max(y for x, y in points) + TOLERANCE
+
+        self.rows = {}
+        border_cells = set()
+        for state, rings in sorted(states.items()):
+            for ring in rings:
+                for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+                    if y1 == y2 and x1 == x2:
+                        continue
+                    edge = (x1, y1, x2, y2, state)
+                    for row in self._range(min(y1, y2), max(y1, y2),
+                                           self.south):
+                        self.rows.setdefault(row, []).append(edge)
+                    # Cells near an edge are also treated as crossed, so
+                    # that points in them get the benefit of TOLERANCE.
+                    for row in self._range(min(y1, y2) - TOLERANCE,
+                                           max(y1, y2) + TOLERANCE,
+                                           self.south):
+                        for column in self._range(
+                                min(x1, x2) - TOLERANCE * 2,
+                                max(x1, x2) + TOLERANCE * 2, self.west):
+                            border_cells.add((row, column))
+
+        self.cells = {}
+        for row in self._range(self.south, self.north, self.south):
+            for column in self._range(self.west, self.east, self.west):
+                if (row, column) in border_cells:
+                    self.cells[row, column] = BORDER
+                else:
+                    self.cells[row, column] = self._cast(
+                        self.south + (row + 0.5) * cell_size,
+                        self.west + (column + 0.5) * cell_size)
+
+    def _range(self, low, high, origin):
+        first = int(math.floor((low - origin) / self.cell_size))
+        last = int(math.floor((high - origin) / self.cell_size))
+        return xrange(first, last + 1)
+
+    def _row(self, latitude):
+        return int(math.floor((latitude - self.south) / self.cell_size))
+
+    def _column(self, longitude):
+        return int(math.floor((longitude - self.west) / self.cell_size))
+
+    def _cast(self, latitude, longitude):
+        """Return the state whose edges an eastward ray crosses oddly."""
+        inside = set()
+        for x1, y1, x2, y2, state in self.rows.get(self._row(latitude), ()):
+            if (y1 > latitude) != (y2 > latitude):
+                x = x1 + (latitude - y1) * (x2 - x1) / (y2 - y1)
+                if longitude < x:
+                    inside ^= set([state])
+        return min(inside) if inside else None
+
+    def _nearest(self, latitude, longitude):
+        """Return the state with an edge within `TOLERANCE`, if any."""
+        scale = math.cos(math.radians(latitude))
+        best_state = None
+        best_distance = TOLERANCE
+        rows = self._range(latitude - TOLERANCE, latitude + TOLERANCE,
+                           self.south)
+        for row in rows:
+            for x1, y1, x2, y2, state in self.rows.get(row, ()):
+                distance = _distance_to_segment(
+                    longitude * scale, latitude,
+                    x1 * scale, y1, x2 * scale, y2)
+                if distance < best_distance:
+                    best_state = state
+                    best_distance = distance
+        return best_state
+
+    def state_at(self, latitude, longitude):
+        """Return the name of the state containing a point, or None."""
+        cell = self.cells.get((self._row(latitude),
+                               self._column(longitude)))
+        if cell is not BORDER:
+            return cell   # a state, or None inside no state or off the grid
+        return (self._cast(latitude, longitude)
+                or self._nearest(latitude, longitude))
+
+def _distance_to_segment(px, py, x1, y1, x2, y2):
+    dx = x2 - x1
+    dy = y2 - y1
+    length_squared = dx * dx + dy * dy
+    if length_squared:
+        t = ((px - x1) * dx + (py - y1) * dy) / length_squared
+        t = max(0.0, min(1.0, t))
+    else:
+        t = 0.0
+    return math.hypot(px - (x1 + t * dx), py - (y1 + t * dy))
+
+_boundaries = []
+
+def get_boundaries():
+    """Return the `StateBoundaries`, loading them on first use."""
+    if not _boundaries:
+        with open(BOUNDARIES_PATH) as f:
+            states = json.load(f)
+        _boundaries.append(StateBoundaries(dict(
+            (state, [[tuple(point) for point in ring] for ring in rings])
+            for state, rings in states.items())))
+    return _boundaries[0]
+
+def state_at(latitude, longitude):
+    """Return the New England state containing a point, or None."""
+    return get_boundaries().state_at(latitude, longitude)
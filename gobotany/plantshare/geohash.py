@@ -0,0 +1,90 @@
+"""Geohashes: strings naming nested cells of a latitude/longitude grid.
+
+Each character of a geohash splits its cell 32 ways, so points near
+each other share a prefix and every prefix names a rectangle.  The
+`geohash` column of `Location` is indexed, so the sightings API finds
+the sightings inside a map's view by the prefixes of the few cells that
+cover it, and clusters them at low zoom levels by grouping on a prefix.
+
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+MAX_PRECISION = 12
+MAX_COVERING_CELLS = 16
+
+def encode(latitude, longitude, precision=MAX_PRECISION):
+    """Return the geohash of a point."""
+    south, north = -90.0, 90.0
+    west, east = -180.0, 180.0
+    characters = []
+    bits = 0
+    bit_count = 0
+    even = True   # bits alternate between longitude and latitude
+    while len(characters) < precision:
+        if even:
+            middle = (west + east) / 2
+            if longitude >= middle:
+                bits = bits * 2 + 1
+                west = middle
+            else:
+                bits = bits * 2
+                east = middle
+        else:
+            middle = (south + north) / 2
+            if latitude >= middle:
+                bits = bits * 2 + 1
+                south = middle
+            else:
+                bits = bits * 2
+                north = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            characters.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(characters)
+
+def cell_size(precision):
+    """Return the (height, width) in degrees of a cell."""
+    bits = 5 * precision
+    latitude_bits = bits // 2
+    longitude_bits = bits - latitude_bits
+    return 180.0 / 2 ** latitude_bits, 360.0 / 2 ** longitude_bits
+
+def precision_for_width(width):
+    """Return the longest precision whose cells are at least `width`
+    degrees of longitude wide."""
+    precision = 1
+    while (precision < MAX_PRECISION
+           and cell_size(precision + 1)[1] >= width):
+        precision += 1
+    return precision
+
+def _cells(south, west, north, east, precision):
+    height, width = cell_size(precision)
+    first_row = int(math.floor((south + 90.0) / height))
+    last_row = int(math.floor((min(north, 89.999999) + 90.0) / height))
+    first_column = int(math.floor((west + 180.0) / width))
+    last_column = int(math.floor((min(east, 179.999999) + 180.0) / width))
+    return [(-90.0 + (row + 0.5) * height, -180.0 + (column + 0.5) * width)
+            for row in range(first_row, last_row + 1)
+            for column in range(first_column, last_column + 1)]
+
+def covering(south, west, north, east, max_cells=MAX_COVERING_CELLS):
+    """Return the geohashes of at most `max_cells` cells that together
+    cover a bounding box, using the longest precision that allows."""
+    if west > east:   # the box crosses the 180th meridian
+        boxes = [(south, west, north, 180.0), (south, -180.0, north, east)]
+    else:
+        boxes = [(south, west, north, east)]
+    answer = set([''])
+    for precision in range(1, MAX_PRECISION + 1):
+        centers = [center for box in boxes
+                   for center in _cells(*(box + (precision,)))]
+        if len(centers) > max_cells:
+            break
+        answer = set(encode(latitude, longitude, precision)
+                     for latitude, longitude in centers)
+    return sorted(answer)
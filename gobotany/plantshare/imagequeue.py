@@ -0,0 +1,168 @@
+"""Process uploaded PlantShare images outside of the upload request.
+
+Uploads used to be resized by their `ProcessedImageField` inside the
+request that received them, and their thumbnails were generated by
+whichever page first showed them.  Now the upload web service only
+stores the original, reads its GPS coordinates, and queues an
+ImageProcessingJob.  Jobs are run by `dev/django process_image_queue`,
+which can drain the queue with a pool of worker processes, or by a
+background thread in each process when IMAGE_QUEUE_INTERVAL is set.
+Meanwhile the upload dialog polls the image status web service until
+the image and its thumbnails are ready.
+
+Since originals can carry GPS coordinates and other metadata in them,
+each is deleted once its processed image has been saved.
+
+"""
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image
+
+from gobotany.plantshare.models import (ExifGpsExtractor, ImageProcessingJob,
+    ScreenedImage)
+
+log = logging.getLogger('gobotany.plantshare')
+
+DEFAULT_BATCH_SIZE = 10
+MAX_ATTEMPTS = 3
+
+# A job claimed longer ago than this is assumed to belong to a worker
+# that died, and may be claimed again.
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+def store_upload(image, upload):
+    """Save an upload as the original of an unsaved image, and queue it.
+
+    Reading the GPS coordinates only needs the image's metadata, so it
+    is done at once, letting the upload form use them right away.
+
+    """
+    upload.seek(0)
+    ExifGpsExtractor(image).process(Image.open(upload))
+    upload.seek(0)
+    image.original = upload
+    image.processing = 'PENDING'
+    image.save()
+    ImageProcessingJob.objects.create(image=image)
+    start_worker()
+
+def process_image(image):
+    """Resize an image's original and generate its thumbnails, recording
+    their URLs."""
+    if image.original:
+        # Saving to the ProcessedImageField runs its resizing spec.
+        name = os.path.basename(image.original.name)
+        image.image.save(name, image.original, save=False)
+    image.record_derivatives()
+
+def claim_jobs(batch_size=DEFAULT_BATCH_SIZE):
+    """Claim up to `batch_size` queued jobs, and return their IDs.
+
+    Several workers may try to claim the same job; only one of them can
+    update its `claimed` time from the value that they all read.
+
+    """
+    now = timezone.now()
+    available = ImageProcessingJob.objects.filter(
+        Q(claimed=None) | Q(claimed__lt=now - CLAIM_TIMEOUT)).order_by('id')
+    job_ids = []
+    for job_id, claimed in available.values_list(
+            'id', 'claimed')[:batch_size]:
+        if ImageProcessingJob.objects.filter(
+                id=job_id, claimed=claimed).update(claimed=now):
+            job_ids.append(job_id)
+    return job_ids
+
+def run_job(job_id):
+    """Run a claimed job, and return whether its image is now ready.
+
+    A job that fails is released for another try, until it has failed
+    MAX_ATTEMPTS times, after which its image is marked as failed.
+
+    """
+    job = ImageProcessingJob.objects.select_related('image').get(id=job_id)
+    image = job.image
+    try:
+        process_image(image)
+    except Exception as e:
+        log.exception('Cannot process image %s', image.id)
+        job.attempts += 1
+        if job.attempts < MAX_ATTEMPTS:
+            job.claimed = None
+            job.error = unicode(e)
+            job.save()
+        else:
+            ScreenedImage.objects.filter(id=image.id).update(
+                processing='FAILED')
+            job.delete()
+        return False
+
+    original = image.original
+    image.original = ''
+    image.processing = 'DONE'
+    image.save(update_fields=['image', 'original', 'processing',
+                              'latitude', 'longitude'])
+    if original:
+        original.storage.delete(original.name)
+    job.delete()
+    return True
+
+def process_queue(batch_size=DEFAULT_BATCH_SIZE):
+    """Run queued jobs until there are none left to claim.
+
+    Returns the number of images processed and the number of failures.
+
+    """
+    done = failed = 0
+    while True:
+        job_ids = claim_jobs(batch_size)
+        if not job_ids:
+            break
+        for job_id in job_ids:
+            if run_job(job_id):
+                done += 1
+            else:
+                failed += 1
+    return done, failed
+
+# An optional background thread that runs queued jobs periodically.
+
+_worker_lock = threading.Lock()
+_worker = [None]
+
+def start_worker():
+    """Start this process's image thread, if configured and not running.
+
+    Like the search queue's thread, it is started lazily from the first
+    upload, so that it runs inside each web worker process.
+
+    """
+    interval = getattr(settings, 'IMAGE_QUEUE_INTERVAL', None)
+    if not interval:
+        return
+    with _worker_lock:
+        if _worker[0] is not None and _worker[0].is_alive():
+            return
+        thread = threading.Thread(target=_run_worker, args=(interval,),
+                                  name='image-queue-worker')
+        thread.daemon = True
+        thread.start()
+        _worker[0] = thread
+
+def _run_worker(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            process_queue()
+        except Exception:
+            log.exception('Cannot process the image queue')
+        finally:
+            connection.close()
@@ -0,0 +1,78 @@
+import logging
+import time
+from multiprocessing import Pool, cpu_count
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+
+from gobotany.plantshare.models import ScreenedImage
+
+log = logging.getLogger('gobotany.plantshare')
+
+DEFAULT_BATCH_SIZE = 50
+
+def _record_derivatives(args):
+    """Generate and record the thumbnails of a batch; runs in a worker."""
+    image_ids, force = args
+    done = failed = 0
+    for image in ScreenedImage.objects.filter(id__in=image_ids):
+        try:
+            image.record_derivatives(force=force)
+            done += 1
+        except Exception:
+            log.exception('Cannot generate thumbnails of image %s', image.id)
+            failed += 1
+    return done, failed
+
+class Command(BaseCommand):
+    """Generate missing ScreenedImage thumbnails and record their URLs.
+
+    Pages record the URL of a thumbnail the first time that they show
+    it, which for older images means generating it, or at least asking
+    the storage whether it exists, in the middle of a page view.  This
+    command does that ahead of time with a pool of worker processes:
+
+    dev/django backfill_image_derivatives --workers 8
+    """
+    help = 'Generate missing image thumbnails and record their URLs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, dest='workers',
+            default=cpu_count(), help='Number of worker processes')
+        parser.add_argument('--batch-size', type=int, dest='batch_size',
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of images each worker handles at a time')
+        parser.add_argument('--force', action='store_true', dest='force',
+            default=False,
+            help='Regenerate thumbnails of every image, even if recorded')
+
+    def handle(self, *args, **options):
+        force = options['force']
+        batch_size = max(options['batch_size'], 1)
+
+        images = ScreenedImage.objects.filter(
+            processing='DONE', deleted=False).exclude(image='')
+        if not force:
+            images = images.filter(Q(cached_thumb_url='') |
+                                   Q(cached_thumb_cropped_url=''))
+        ids = list(images.order_by('id').values_list('id', flat=True))
+        tasks = [(ids[i:i + batch_size], force)
+                 for i in range(0, len(ids), batch_size)]
+
+        # Worker processes must open their own database connections.
+        connections.close_all()
+        pool = Pool(processes=max(options['workers'], 1))
+        start = time.time()
+        try:
+            results = list(pool.imap_unordered(_record_derivatives, tasks))
+        finally:
+            pool.close()
+            pool.join()
+        elapsed = time.time() - start
+
+        done = sum(result[0] for result in results)
+        failed = sum(result[1] for result in results)
+        rate = done / elapsed if elapsed > 0 else 0.0
+        self.stdout.write('{} images in {:.1f}s ({:.1f}/s), {} failures'
+                          .format(done, elapsed, rate, failed))
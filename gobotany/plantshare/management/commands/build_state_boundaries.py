@@ -0,0 +1,161 @@
+import json
+import math
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from lxml import etree
+
+from gobotany.mapping.map import GRAPHICS_ROOT
+from gobotany.plantshare.geocoder import BOUNDARIES_PATH
+
+MAP_PATH = GRAPHICS_ROOT + '/new-england-counties-scoured.svg'
+SVG_PATH = '{http://www.w3.org/2000/svg}path'
+
+# Points whose positions are known both on the map and on the ground,
+# mostly where state lines meet each other or the coast: map (x, y),
+# then (longitude, latitude).
+CONTROL_POINTS = [
+    ((43.64, 252.09), (-73.4874, 42.0497)),   # CT, MA and NY meet
+    ((89.47, 242.15), (-71.7995, 42.0188)),   # CT, MA and RI meet
+    ((97.47, 239.70), (-71.3813, 42.0185)),   # RI's northeast corner
+    ((65.09, 220.42), (-72.4587, 42.7270)),   # MA, NH and VT meet
+    ((43.41, 225.08), (-73.2643, 42.7459)),   # MA, NY and VT meet
+    ((107.30, 203.70), (-70.8172, 42.8705)),  # MA and NH meet the sea
+    ((104.70, 194.60), (-70.7045, 43.0717)),  # ME and NH meet the sea
+    ((76.47, 117.20), (-71.0845, 45.3054)),   # ME, NH and Quebec meet
+    ((126.73, 23.14), (-69.2244, 47.4597)),   # northernmost Maine
+    ((67.90, 131.90), (-71.5048, 45.0133)),   # NH, VT and Quebec meet
+    ((186.39, 104.55), (-66.9498, 44.8152)),  # West Quoddy Head, ME
+    ((146.40, 255.91), (-69.9580, 41.2630)),  # Siasconset, Nantucket
+    ((142.70, 251.95), (-70.0485, 41.3895)),  # Great Point, Nantucket
+    ((132.28, 256.31), (-70.4480, 41.3520)),  # Wasque Point, Chappaquiddick
+    ((132.69, 227.77), (-70.2200, 42.0750)),  # Race Point, Provincetown
+    ((48.38, 292.15), (-73.6400, 40.9900)),   # Greenwich Point, CT
+    ((21.15, 143.39), (-73.3436, 45.0106)),   # NY, VT and Quebec meet
+    ((94.36, 267.63), (-71.8550, 41.3230)),   # CT and RI meet the sea
+    ((108.90, 250.10), (-71.1207, 41.4965)),  # MA and RI meet the sea
+    ((141.00, 30.20), (-67.7900, 47.0630)),   # Hamlin, ME
+    ((155.70, 79.80), (-67.7820, 45.9440)),   # Monument Brook, ME
+    ]
+
+# How far, in map units, each control point's correction reaches.
+CORRECTION_RADIUS = 10.0
+
+number_re = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+token_re = re.compile(r'[a-zA-Z]|' + number_re.pattern)
+
+def parse_path(d):
+    """Return the rings of an SVG path that uses only straight lines."""
+    tokens = token_re.findall(d)
+    rings = []
+    x = y = 0.0
+    command = None
+    i = 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+            if command in 'zZ':
+                x, y = rings[-1][0]
+                continue
+        relative = command.islower()
+        if command in 'mMlL':
+            dx, dy = float(tokens[i]), float(tokens[i + 1])
+            i += 2
+            x, y = (x + dx, y + dy) if relative else (dx, dy)
+            if command in 'mM':
+                rings.append([])
+                command = 'l' if relative else 'L'
+        elif command in 'hH':
+            x = x + float(tokens[i]) if relative else float(tokens[i])
+            i += 1
+        elif command in 'vV':
+            y = y + float(tokens[i]) if relative else float(tokens[i])
+            i += 1
+        else:
+            raise ValueError('unsupported path command %r' % command)
+        rings[-1].append((x, y))
+    return rings
+
+def _least_squares(rows, values):
+    """Solve the normal equations for `rows` by Gaussian elimination."""
+    n = len(rows[0])
+    matrix = [[sum(row[i] * row[j] for row in rows) for j in range(n)]
+              + [sum(row[i] * value for row, value in zip(rows, values))]
+              for i in range(n)]
+    for i in range(n):
+        pivot = max(range(i, n), key=lambda r: abs(matrix[r][i]))
+        matrix[i], matrix[pivot] = matrix[pivot], matrix[i]
+        for r in range(n):
+            if r != i:
+                factor = matrix[r][i] / matrix[i][i]
+                matrix[r] = [a - factor * b
+                             for a, b in zip(matrix[r], matrix[i])]
+    return [matrix[i][n] / matrix[i][i] for i in range(n)]
+
+def map_to_lon_lat():
+    """Return a function converting map coordinates to (lon, lat).
+
+    The map is hand-drawn rather than a true projection, so an affine
+    fit to the control points is off by up to tens of kilometers in
+    places.  Near each control point, its own error is blended back in,
+    which pulls the nearby outline into place.
+
+    """
+    rows = [(1.0, x, y) for (x, y), ground in CONTROL_POINTS]
+    lon_coefficients = _least_squares(
+        rows, [ground[0] for point, ground in CONTROL_POINTS])
+    lat_coefficients = _least_squares(
+        rows, [ground[1] for point, ground in CONTROL_POINTS])
+
+    def affine(x, y):
+        return (lon_coefficients[0] + lon_coefficients[1] * x
+                + lon_coefficients[2] * y,
+                lat_coefficients[0] + lat_coefficients[1] * x
+                + lat_coefficients[2] * y)
+
+    corrections = []
+    for (x, y), (lon, lat) in CONTROL_POINTS:
+        fitted_lon, fitted_lat = affine(x, y)
+        corrections.append((x, y, lon - fitted_lon, lat - fitted_lat))
+
+    def convert(x, y):
+        lon, lat = affine(x, y)
+        total_weight = lon_correction = lat_correction = 0.0
+        for cx, cy, dlon, dlat in corrections:
+            weight = math.exp(-((x - cx) ** 2 + (y - cy) ** 2)
+                              / CORRECTION_RADIUS ** 2)
+            total_weight += weight
+            lon_correction += weight * dlon
+            lat_correction += weight * dlat
+        total_weight = max(total_weight, 1.0)
+        return (round(lon + lon_correction / total_weight, 4),
+                round(lat + lat_correction / total_weight, 4))
+    return convert
+
+class Command(BaseCommand):
+    help = 'Rebuild the state boundaries used to geocode sightings'
+
+    def handle(self, *args, **options):
+        convert = map_to_lon_lat()
+        states = {}
+        for path in etree.parse(MAP_PATH).iter(SVG_PATH):
+            match = re.match(r'([A-Z]{2})_', path.get('id', ''))
+            if not match:
+                continue
+            state = settings.STATE_NAMES[match.group(1).lower()]
+            for ring in parse_path(path.get('d')):
+                points = []
+                for x, y in ring:
+                    point = convert(x, y)
+                    if not points or points[-1] != point:
+                        points.append(point)
+                if len(points) >= 3:
+                    states.setdefault(state, []).append(points)
+
+        with open(BOUNDARIES_PATH, 'w') as f:
+            json.dump(states, f, sort_keys=True, separators=(',', ':'))
+        self.stdout.write('Wrote {} rings for {} states to {}'.format(
+            sum(len(rings) for rings in states.values()), len(states),
+            BOUNDARIES_PATH))
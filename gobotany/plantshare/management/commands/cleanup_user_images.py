@@ -1,94 +1,196 @@
-from datetime import datetime, timedelta
-from optparse import make_option
-from django.core.management.base import NoArgsCommand
+from datetime import timedelta
+from multiprocessing.pool import ThreadPool
 
-from gobotany.plantshare.models import ScreenedImage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
 
-class Command(NoArgsCommand):
+from gobotany.plantshare.models import IMAGE_DERIVATIVES, ScreenedImage
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_WORKERS = 8
+MAX_KEYS_PER_REQUEST = 1000   # the most S3 deletes in a single request
+
+class StorageDeleter(object):
+    """Delete files from a storage, with a bounded number of requests in
+    flight at a time.
+
+    S3 storages delete up to MAX_KEYS_PER_REQUEST keys per request;
+    other storages delete one file per call.
+    """
+    def __init__(self, storage, pool):
+        self.storage = storage
+        self.pool = pool
+        bucket = getattr(storage, 'bucket', None)
+        self.multiple = hasattr(bucket, 'delete_keys')
+
+    def delete(self, names):
+        """Delete files, and return the names that could not be deleted."""
+        if self.multiple:
+            batches = [names[i:i + MAX_KEYS_PER_REQUEST]
+                       for i in range(0, len(names), MAX_KEYS_PER_REQUEST)]
+            results = self.pool.map(self._delete_keys, batches)
+        else:
+            results = self.pool.map(self._delete_file, names)
+        return set(name for failures in results for name in failures)
+
+    def _delete_keys(self, names):
+        keys = dict((self.storage._normalize_name(
+            self.storage._clean_name(name)), name) for name in names)
+        result = self.storage.bucket.delete_keys(list(keys))
+        return [keys[error.key] for error in result.errors]
+
+    def _delete_file(self, name):
+        try:
+            self.storage.delete(name)
+        except (IOError, OSError):
+            return [name]
+        return []
+
+class DryRunDeleter(object):
+    """Stands in for a StorageDeleter, only reporting what it would delete."""
+    def __init__(self, storage, stdout, verbosity):
+        self.stdout = stdout
+        self.verbosity = verbosity
+
+    def delete(self, names):
+        if self.verbosity >= 3:
+            for name in names:
+                self.stdout.write('Would delete: {0}\n'.format(name))
+        return set()
+
+class Command(BaseCommand):
+    """Delete user uploaded images that have been rejected or orphaned.
+
+    Stale images are read in chunks in order of ID.  The files of each
+    chunk, and of their thumbnails, are deleted with several requests
+    in flight at once, and then the chunk's rows are flagged as deleted
+    with a single UPDATE.  Since flagged rows are not considered again,
+    an interrupted cleanup picks up where it left off when run again;
+    --start-after skips ahead to the last ID that it reported:
+
+    dev/django cleanup_user_images --min-age 7 --workers 16
+    """
     help = 'Delete user uploaded images that have been rejected or orphaned.'
-    option_list = NoArgsCommand.option_list + (
-        make_option('--min-age',
-            type='int',
-            dest='days_old',
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, dest='days_old',
             default=7,
-            help='Minimum age of the file (in days) to be considered for deletion. Defaults to %default days.'),
-        make_option('--dry-run',
-            action='store_true',
-            dest='dry_run',
-            default=False,
-            help='Do a dry run. Report what would be deleted, but make no deletions or changes.'),
-        )
-
-    def handle_noargs(self, **options):
+            help='Minimum age of the file (in days) to be considered for '
+                 'deletion. Defaults to %(default)s days.')
+        parser.add_argument('--dry-run', action='store_true',
+            dest='dry_run', default=False,
+            help='Do a dry run. Report what would be deleted, but make no '
+                 'deletions or changes.')
+        parser.add_argument('--workers', type=int, dest='workers',
+            default=DEFAULT_WORKERS,
+            help='Number of storage requests to make at a time')
+        parser.add_argument('--batch-size', type=int, dest='batch_size',
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of images to read and flag at a time')
+        parser.add_argument('--start-after', type=int, dest='start_after',
+            default=0, help='Skip images with IDs up to this one')
+
+    def handle(self, *args, **options):
         days_old = options['days_old']
         dry_run = options['dry_run']
         verbosity = options['verbosity']
-        if verbosity >= '1':
+        batch_size = max(options['batch_size'], 1)
+        if verbosity >= 1:
             self.stdout.write('Removing rejected or orphaned images uploaded more than {0} days ago.\n'.format(
                 days_old))
 
-        # Get all the images which are either already approved, or not yet screened
-        # Exclude any images that are either already deleted or orphaned
+        # Images that have been screened and rejected, or orphaned, and
+        # are older than the user specified cutoff.  This includes images
+        # that are still pending or that failed processing, whose
+        # uploaded originals would otherwise be kept forever; images
+        # still waiting in the processing queue are left alone.
+        upload_cutoff = timezone.now() - timedelta(days=days_old)
+        stale_images = ScreenedImage.objects.filter(
+            Q(is_approved=False, screened__isnull=False) | Q(orphaned=True),
+            deleted=False, processing_job__isnull=True,
+            uploaded__lt=upload_cutoff)
+
+        # Images which are either already approved, or not yet screened,
+        # and are neither deleted nor orphaned.
         active_images = ScreenedImage.objects.exclude(deleted=True).exclude(
-                orphaned=True).exclude(is_approved=False, screened__isnull=False)
-        active_files = []
-        active_thumbs = []
-        for image in active_images:
-            active_files.append(image.image.url)
-            active_thumbs.append(image.thumb.url)
-
-        if verbosity >= '3':
-            self.stdout.write('Active Images:\n{0}\n'.format(active_files)) 
-            self.stdout.write('Active Thumbs:\n{0}\n'.format(active_thumbs)) 
-        
-        # Images that have been screened and rejected, and are older than user
-        # specified cutoff
-        upload_cutoff = datetime.now() - timedelta(days=days_old)
-        rejected_images = ScreenedImage.objects.filter(is_approved=False,
-                deleted=False, screened__isnull=False,
-                uploaded__lt=upload_cutoff)
-
-        orphaned_images = ScreenedImage.objects.filter(deleted=False, 
-                orphaned=True, uploaded__lt=upload_cutoff)
-
-        stale_images = rejected_images | orphaned_images
-
-        if verbosity >= '1':
-            self.stdout.write('Found {0} images to delete.\n'.format(len(stale_images)))
-
-        if verbosity >= '3':
-            self.stdout.write('{0}\n'.format([image.image.url for image in stale_images]))
-
-        # Make really REALLY sure we're not deleting something we shouldn't
-        for stale_image in stale_images:
-            conflict_image = stale_image.image.url in active_files
-            conflict_thumb = stale_image.thumb.url in active_thumbs
-            if conflict_image or conflict_thumb:
-                conflict_msg = 'CONFLICT: Stale file at {0} (thumb: {1}) matches an active file. Skipping deletion.\n'.format(stale_image.image.url, stale_image.thumb.url)
-                self.stdout.write(conflict_msg)
-            else:
-                if verbosity >= '3':
-                    self.stdout.write('Deleting image: {0}\n'.format(stale_image.image.url))
-                    self.stdout.write('Deleting thumbnail: {0}\n'.format(stale_image.thumb.url))
+            orphaned=True).exclude(is_approved=False, screened__isnull=False)
+
+        pool = ThreadPool(processes=max(options['workers'], 1))
+        deleters = {}
+
+        def deleter_for(storage):
+            if id(storage) not in deleters:
+                if dry_run:
+                    deleters[id(storage)] = DryRunDeleter(
+                        storage, self.stdout, verbosity)
+                else:
+                    deleters[id(storage)] = StorageDeleter(storage, pool)
+            return deleters[id(storage)]
+
+        last_id = options['start_after']
+        deleted_count = conflict_count = failure_count = 0
+        try:
+            while True:
+                chunk = list(stale_images.filter(id__gt=last_id)
+                             .order_by('id').only('id', 'image', 'original')
+                             [:batch_size])
+                if not chunk:
+                    break
+                last_id = chunk[-1].id
+
+                # Make really REALLY sure we're not deleting something we
+                # shouldn't: thumbnail names follow from image names, so
+                # an image file shared with an active row means conflict.
+                conflicts = set(active_images.filter(
+                    image__in=[image.image.name for image in chunk
+                               if image.image])
+                    .values_list('image', flat=True))
+
+                files = {}   # storage id -> (storage, [name, ...])
+                owners = {}   # name -> image id
+                to_flag = []
+                for image in chunk:
+                    if image.image and image.image.name in conflicts:
+                        conflict_msg = 'CONFLICT: Stale file at {0} matches an active file. Skipping deletion.\n'.format(image.image.name)
+                        self.stdout.write(conflict_msg)
+                        conflict_count += 1
+                        continue
+                    to_flag.append(image.id)
+                    # Unprocessed images have only an original, and
+                    # processed ones only an image and its thumbnails.
+                    image_files = [f for f in [image.original, image.image]
+                                   if f]
+                    if image.image:
+                        image_files.extend(getattr(image, name)
+                                           for name in IMAGE_DERIVATIVES)
+                    for f in image_files:
+                        files.setdefault(id(f.storage), (f.storage, []))[
+                            1].append(f.name)
+                        owners[f.name] = image.id
+
+                failed_ids = set()
+                for storage, names in files.values():
+                    for name in deleter_for(storage).delete(names):
+                        self.stdout.write('Error while attempting to delete: {0}\n'.format(name))
+                        failed_ids.add(owners[name])
+                to_flag = [image_id for image_id in to_flag
+                           if image_id not in failed_ids]
+                failure_count += len(failed_ids)
+
                 if not dry_run:
-                    try:
-                        stale_image.image.storage.delete(stale_image.image.name)
-                    except IOError as e:
-                        self.stdout.write('IOError while attempting to delete image: {0}'.format(
-                            stale_image.image.name))
-                    try:
-                        stale_image.thumb.storage.delete(stale_image.thumb.name)
-                    except IOError as e:
-                        self.stdout.write('IOError while attempting to delete thumb: {0}'.format(
-                            stale_image.thumb.name))
-
-                    try:
-                        stale_image.deleted = True
-                        stale_image.save()
-                    except:
-                        self.stdout.write('WARNING: Failed to flag ScreenedImage as deleted.')
-
-
-        if verbosity >= '1':
+                    ScreenedImage.objects.filter(id__in=to_flag).update(
+                        deleted=True)
+                deleted_count += len(to_flag)
+                if verbosity >= 2:
+                    self.stdout.write('{0} images through ID {1}\n'.format(
+                        deleted_count, last_id))
+        finally:
+            pool.close()
+            pool.join()
+
+        if verbosity >= 1:
+            self.stdout.write('{0} {1} images, skipped {2} conflicts, {3} failures.\n'.format(
+                'Would delete' if dry_run else 'Deleted',
+                deleted_count, conflict_count, failure_count))
             self.stdout.write('Cleanup complete.\n')
-        
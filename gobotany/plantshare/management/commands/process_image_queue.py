@@ -0,0 +1,61 @@
+import time
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from gobotany.plantshare.imagequeue import DEFAULT_BATCH_SIZE, process_queue
+
+def _process_queue(batch_size):
+    """Drain the queue alongside the other workers; runs in a worker."""
+    try:
+        return process_queue(batch_size=batch_size)
+    finally:
+        connections.close_all()
+
+class Command(BaseCommand):
+    """Resize uploaded PlantShare images and generate their thumbnails.
+
+    Uploads are queued by the image upload web service; this command
+    runs the queued jobs with a pool of worker processes, each claiming
+    a batch of jobs at a time until none are left.  With --interval it
+    keeps checking the queue, as the Procfile's "imagequeue" does:
+
+    dev/django process_image_queue --workers 4 --interval 5
+    """
+    help = 'Process queued PlantShare image uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, dest='workers',
+            default=1, help='Number of worker processes')
+        parser.add_argument('--batch-size', type=int, dest='batch_size',
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of jobs each worker claims at a time')
+        parser.add_argument('--interval', type=int, dest='interval',
+            default=None,
+            help='Keep running, checking the queue every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        batch_size = options['batch_size']
+        interval = options['interval']
+
+        # Worker processes must open their own database connections.
+        connections.close_all()
+        pool = Pool(processes=workers)
+        try:
+            while True:
+                start = time.time()
+                results = pool.map(_process_queue, [batch_size] * workers)
+                done = sum(result[0] for result in results)
+                failed = sum(result[1] for result in results)
+                if done or failed or not interval:
+                    self.stdout.write(
+                        '{} images processed, {} failures in {:.1f}s'
+                        .format(done, failed, time.time() - start))
+                if not interval:
+                    break
+                time.sleep(interval)
+        finally:
+            pool.close()
+            pool.join()
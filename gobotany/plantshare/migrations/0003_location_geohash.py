@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import math
+
+from django.db import migrations, models
+
+
+def fill_geohashes(apps, schema_editor):
+    from gobotany.plantshare.geohash import encode
+    Location = apps.get_model('plantshare', 'Location')
+    locations = Location.objects.filter(latitude__isnull=False,
+                                        longitude__isnull=False)
+    for location in locations.only('id', 'latitude', 'longitude'):
+        if math.isnan(location.latitude) or math.isnan(location.longitude):
+            continue
+        Location.objects.filter(id=location.id).update(
+            geohash=encode(location.latitude, location.longitude))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantshare', '0002_auto_20160413_1915'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(db_index=True, max_length=12, blank=True),
+        ),
+        migrations.RunPython(fill_geohashes, migrations.RunPython.noop),
+    ]
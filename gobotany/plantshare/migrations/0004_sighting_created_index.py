@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantshare', '0003_location_geohash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sighting',
+            name='created',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
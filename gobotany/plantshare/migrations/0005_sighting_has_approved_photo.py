@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_has_approved_photo(apps, schema_editor):
+    Sighting = apps.get_model('plantshare', 'Sighting')
+    sighting_ids = Sighting.objects.filter(
+        photos__is_approved=True, photos__deleted=False,
+        photos__orphaned=False).values('id')
+    Sighting.objects.filter(id__in=sighting_ids).update(
+        has_approved_photo=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantshare', '0004_sighting_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sighting',
+            name='has_approved_photo',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AlterIndexTogether(
+            name='sighting',
+            index_together=set([('has_approved_photo', 'created')]),
+        ),
+        migrations.RunPython(fill_has_approved_photo,
+                             migrations.RunPython.noop),
+    ]
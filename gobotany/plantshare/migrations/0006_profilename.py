@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_profile_names(apps, schema_editor):
+    UserProfile = apps.get_model('plantshare', 'UserProfile')
+    ProfileName = apps.get_model('plantshare', 'ProfileName')
+    names = []
+    profiles = UserProfile.objects.values_list(
+        'id', 'user__username', 'display_name')
+    for profile_id, username, display_name in profiles:
+        texts = [('USERNAME', username)]
+        if display_name:
+            texts.append(('DISPLAY', display_name))
+            for part in display_name.split(' '):
+                part = part.strip('.')
+                if len(part) >= 2:
+                    texts.append(('WORD', part))
+        names.extend(ProfileName(profile_id=profile_id, kind=kind,
+                                 text=text, name=text.lower())
+                     for kind, text in texts)
+    ProfileName.objects.bulk_create(names, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantshare', '0005_sighting_has_approved_photo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileName',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('USERNAME', 'username'), ('DISPLAY', 'display name'), ('WORD', 'word of display name')], max_length=8)),
+                ('text', models.CharField(max_length=150)),
+                ('name', models.CharField(db_index=True, max_length=150)),
+                ('profile', models.ForeignKey(related_name='names', to='plantshare.UserProfile')),
+            ],
+        ),
+        migrations.RunPython(fill_profile_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import imagekit.models.fields
+import gobotany.plantshare.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantshare', '0006_profilename'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='screenedimage',
+            name='original',
+            field=models.ImageField(blank=True, storage=gobotany.plantshare.models.upload_storage, upload_to=gobotany.plantshare.models.rename_original_by_type),
+        ),
+        migrations.AlterField(
+            model_name='screenedimage',
+            name='image',
+            field=imagekit.models.fields.ProcessedImageField(blank=True, storage=gobotany.plantshare.models.upload_storage, upload_to=gobotany.plantshare.models.rename_image_by_type),
+        ),
+        migrations.AddField(
+            model_name='screenedimage',
+            name='processing',
+            field=models.CharField(choices=[('PENDING', 'Waiting to be processed'), ('DONE', 'Processed'), ('FAILED', 'Could not be processed')], default='DONE', max_length=7),
+        ),
+        migrations.CreateModel(
+            name='ImageProcessingJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queued', models.DateTimeField(auto_now_add=True)),
+                ('claimed', models.DateTimeField(null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('image', models.OneToOneField(related_name='processing_job', to='plantshare.ScreenedImage')),
+            ],
+            options={
+                'verbose_name': 'image processing job',
+                'verbose_name_plural': 'image processing jobs',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plantshare', '0007_image_processing_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='screenedimage',
+            name='cached_thumb_url',
+            field=models.CharField(max_length=500, blank=True),
+        ),
+        migrations.AddField(
+            model_name='screenedimage',
+            name='cached_thumb_cropped_url',
+            field=models.CharField(max_length=500, blank=True),
+        ),
+    ]
@@ -1,6 +1,7 @@
 import sys
 import datetime
 import hashlib
+import math
 import os
 import urlparse
 
@@ -12,7 +13,8 @@ from django.contrib.sites.models import Site
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.files.storage import FileSystemStorage, Storage
 from django.db import IntegrityError, models
-from django.db.models.signals import post_save
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_save, pre_delete
 from django.dispatch import receiver
 from django.template.loader import render_to_string
 from django.utils import timezone
@@ -26,6 +28,7 @@ from PIL import Image
 from PIL.ExifTags import TAGS
 from storages.backends.s3boto import S3BotoStorage
 
+from gobotany.plantshare import geohash
 from gobotany.plantshare.emailconfirmation_models import (
     EmailAddressManager, EmailConfirmation, EmailConfirmationManager)
 from gobotany.plantshare.utils import restrictions
@@ -54,6 +57,14 @@ IMAGE_TYPES = (
     ('QUESTION', 'Question Photo'),
 )
 
+IMAGE_DERIVATIVES = ('thumb', 'thumb_cropped')
+
+IMAGE_PROCESSING_CHOICES = (
+    ('PENDING', 'Waiting to be processed'),
+    ('DONE', 'Processed'),
+    ('FAILED', 'Could not be processed'),
+)
+
 DEFAULT_AVATAR_URL = urlparse.urljoin(settings.STATIC_URL,
     'images/icons/generic-avatar.png')
 DEFAULT_AVATAR_THUMB = urlparse.urljoin(settings.STATIC_URL,
@@ -124,6 +135,10 @@ class Location(models.Model):
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
 
+    # Derived from the coordinates, so that the sightings in view on a
+    # map can be found through an index (see the geohash module).
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)
+
     def __unicode__(self):
         return self.user_input
 
@@ -140,8 +155,15 @@ class Location(models.Model):
                     self.city = parts[-2]
                     self.state = parts[-1]
 
+    def _update_geohash(self):
+        self.geohash = ''
+        if self.latitude is not None and self.longitude is not None:
+            if not (math.isnan(self.latitude) or math.isnan(self.longitude)):
+                self.geohash = geohash.encode(self.latitude, self.longitude)
+
     def save(self, *args, **kwargs):
         self._parse_user_input()
+        self._update_geohash()
         super(Location, self).save(*args, **kwargs)
 
 
@@ -186,13 +208,14 @@ class UserProfile(models.Model):
                 uploaded_by=self.user,
                 image_type='AVATAR',
                 deleted=False,
-                orphaned=False
+                orphaned=False,
+                processing='DONE'
                 ).order_by('-uploaded')
         if len(latest_avatars) > 0:
             this_avatar = latest_avatars[0]
             avatar_info = {
                 'url': this_avatar.image.url,
-                'thumb_url': this_avatar.thumb.url,
+                'thumb_url': this_avatar.thumb_url,
             }
         else:
             avatar_info = self.__class__.default_avatar_image()
@@ -208,7 +231,7 @@ class UserProfile(models.Model):
         if self.avatar:
             avatar_info = {
                 'url': self.avatar.image.url,
-                'thumb_url': self.avatar.thumb.url,
+                'thumb_url': self.avatar.thumb_url,
             }
         else:
             avatar_info = self.__class__.default_avatar_image()
@@ -256,6 +279,21 @@ class UserProfile(models.Model):
         """
         return self.user_display_name().split(' ')[0]
 
+    def update_names(self):
+        """Rebuild the names under which Find People finds this user."""
+        names = [('USERNAME', self.user.username)]
+        if self.display_name:
+            names.append(('DISPLAY', self.display_name))
+            for part in self.display_name.split(' '):
+                part = part.strip('.')   # for initials, abbreviations
+                if len(part) >= MIN_NAME_WORD_LENGTH:
+                    names.append(('WORD', part))
+        self.names.all().delete()
+        ProfileName.objects.bulk_create([
+            ProfileName(profile=self, kind=kind, text=text,
+                        name=text.lower())
+            for kind, text in names])
+
 @receiver(post_save, sender=User, dispatch_uid='create_profile_for_user')
 def create_user_profile(sender, **kwargs):
     user = kwargs['instance']
@@ -270,6 +308,63 @@ def create_user_profile(sender, **kwargs):
         membership = PodMembership(member=profile, pod=user_pod,
             is_owner=True, is_self_pod=True)
         membership.save()
+    else:
+        # Keep the username findable if it has changed.
+        ProfileName.objects.filter(
+            profile__user=user, kind='USERNAME').exclude(
+            text=user.username).update(
+            text=user.username, name=user.username.lower())
+
+
+PROFILE_NAME_KINDS = (
+    ('USERNAME', 'username'),
+    ('DISPLAY', 'display name'),
+    ('WORD', 'word of display name'),
+)
+MIN_NAME_WORD_LENGTH = 2
+
+
+class ProfileName(models.Model):
+    """A name under which Find People can find a user: their username,
+    their display name, or one word of their display name.
+
+    `name` is the lowercased text, indexed so that names beginning with
+    a query are found by a range scan rather than by testing each
+    profile in turn.
+    """
+    profile = models.ForeignKey(UserProfile, related_name='names')
+    kind = models.CharField(max_length=8, choices=PROFILE_NAME_KINDS)
+    text = models.CharField(max_length=150)
+    name = models.CharField(max_length=150, db_index=True)
+
+    def __unicode__(self):
+        return u'%s (%s)' % (self.text, self.kind)
+
+
+@receiver(post_save, sender=UserProfile, dispatch_uid='update_profile_names')
+def update_profile_names(sender, instance, **kwargs):
+    instance.update_names()
+
+
+def visible_profile_names_q(user):
+    """Return a Q object selecting the profile names `user` may see:
+    usernames, which show in profile links anyway, and display names
+    unless their owner has made their details private."""
+    if user.is_staff:
+        return Q()
+    return (Q(kind='USERNAME') | ~Q(profile__details_visibility='PRIVATE') |
+            Q(profile__user=user))
+
+
+def visible_sightings_q(user):
+    """Return a Q object selecting the sightings `user` may see in a set
+    of results (list, table, map markers, etc.)."""
+    if not user.is_authenticated():
+        return Q(visibility='PUBLIC')
+    if user.is_staff:
+        return Q(visibility__in=['PUBLIC', 'USERS', 'PRIVATE'])
+    return (Q(visibility__in=['PUBLIC', 'USERS']) |
+            Q(visibility='PRIVATE', user=user))
 
 
 class SightingManager(models.Manager):
@@ -277,11 +372,15 @@ class SightingManager(models.Manager):
         """Return sightings marked for public view."""
         return self.filter(visibility='PUBLIC')
 
+    def visible_to(self, user):
+        """Return the sightings that `user` may see."""
+        return self.filter(visible_sightings_q(user))
+
 
 class Sighting(models.Model):
     user = models.ForeignKey(User)
 
-    created = models.DateTimeField(blank=False)
+    created = models.DateTimeField(blank=False, db_index=True)
     identification = models.CharField(max_length=120, blank=True)
     notes = models.TextField(blank=True)
 
@@ -300,8 +399,14 @@ class Sighting(models.Model):
     # Add field for administrators indicating approval of a flagged sighting.
     approved = models.BooleanField(default=False)
 
+    # Whether any of approved_photos() exist, kept up to date as photos
+    # are attached and screened, so that the Recent Sightings galleries
+    # can read the newest sightings with photos straight from an index.
+    has_approved_photo = models.BooleanField(default=False, editable=False)
+
     class Meta:
         ordering = ['-created']
+        index_together = [('has_approved_photo', 'created')]
         verbose_name = 'sighting'
         verbose_name_plural = 'sightings'
 
@@ -323,7 +428,8 @@ class Sighting(models.Model):
         return self.photos.exclude(
                 screened__isnull=False,
                 is_approved=False
-                ).exclude(deleted=True).exclude(orphaned=True)
+                ).exclude(deleted=True).exclude(orphaned=True).filter(
+                processing='DONE')
 
     def approved_photos(self):
         '''Return only photos which have been screened and approved.
@@ -333,6 +439,19 @@ class Sighting(models.Model):
         return self.photos.filter(is_approved=True, deleted=False,
                 orphaned=False)
 
+    def update_has_approved_photo(self, excluding=None):
+        '''Recompute the has_approved_photo flag, saving it if it changed.
+        A photo about to be deleted can be left out with `excluding`.
+        '''
+        photos = self.approved_photos()
+        if excluding is not None:
+            photos = photos.exclude(pk=excluding.pk)
+        has_approved_photo = photos.exists()
+        if has_approved_photo != self.has_approved_photo:
+            self.has_approved_photo = has_approved_photo
+            Sighting.objects.filter(pk=self.pk).update(
+                has_approved_photo=has_approved_photo)
+
     objects = SightingManager()
 
 
@@ -367,6 +486,14 @@ def rename_image_by_type(instance, filename):
     return os.path.join(image_type, new_name)
 
 
+def rename_original_by_type(instance, filename):
+    """Name an uploaded original like its processed image, but keep it
+    in a directory of its own, with its own extension."""
+    name = os.path.splitext(rename_image_by_type(instance, filename))[0]
+    extension = os.path.splitext(filename)[1].lower() or '.jpg'
+    return os.path.join('originals', name + extension)
+
+
 class ExifGpsExtractor(object):
     """ Custom django-imagekit image processor to extract GPS coordinates
     from original image.
@@ -456,9 +583,22 @@ register.generator('plantshare:screenedimage:plantsharegpsimage',
 
 
 class ScreenedImage(models.Model):
+    # Uploads are stored as they arrive in `original`, and resized into
+    # `image` later by a worker; see gobotany.plantshare.imagequeue.
+    # Images assigned to `image` directly are processed immediately.
+    original = models.ImageField(upload_to=rename_original_by_type,
+                storage=upload_storage, blank=True)
     image = ProcessedImageField(upload_to=rename_image_by_type,
-                storage=upload_storage,
+                storage=upload_storage, blank=True,
                 spec_id='plantshare:screenedimage:plantsharegpsimage')
+    processing = models.CharField(max_length=7,
+                choices=IMAGE_PROCESSING_CHOICES, default='DONE')
+
+    # The URLs of the thumbnails, recorded when they are generated, so
+    # that pages can show them without asking the storage whether they
+    # exist yet; see derivative_url().
+    cached_thumb_url = models.CharField(max_length=500, blank=True)
+    cached_thumb_cropped_url = models.CharField(max_length=500, blank=True)
     thumb = ImageSpecField(source='image', format='JPEG',
                 options={'quality': 60},
                 processors=[ResizeToFit(128, 128, upscale=True)])
@@ -494,6 +634,97 @@ class ScreenedImage(models.Model):
     # indicates that the image binary itself has been removed from storage.
     deleted = models.BooleanField(default=False)
 
+    def record_derivatives(self, force=False):
+        """Generate any missing thumbnails, and record their URLs."""
+        urls = {}
+        for name in IMAGE_DERIVATIVES:
+            spec_file = getattr(self, name)
+            spec_file.generate(force=force)
+            urls['cached_%s_url' % name] = spec_file.url
+        for field_name, url in urls.items():
+            setattr(self, field_name, url)
+        if self.pk:
+            ScreenedImage.objects.filter(pk=self.pk).update(**urls)
+        return urls
+
+    def derivative_url(self, name):
+        """Return the URL of a thumbnail, generating it and recording the
+        URL if this is the first time that it has been needed."""
+        field_name = 'cached_%s_url' % name
+        url = getattr(self, field_name)
+        if not url:
+            url = self.record_derivatives()[field_name]
+        return url
+
+    @property
+    def thumb_url(self):
+        return self.derivative_url('thumb')
+
+    @property
+    def thumb_cropped_url(self):
+        return self.derivative_url('thumb_cropped')
+
+
+class ImageProcessingJob(models.Model):
+    """An uploaded image waiting to be resized and to have its thumbnails
+    generated; see gobotany.plantshare.imagequeue.
+    """
+    image = models.OneToOneField(ScreenedImage,
+                                 related_name='processing_job')
+    queued = models.DateTimeField(auto_now_add=True)
+    claimed = models.DateTimeField(null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'image processing job'
+        verbose_name_plural = 'image processing jobs'
+
+    def __unicode__(self):
+        return u'process image %s' % self.image_id
+
+
+@receiver(post_save, sender=ScreenedImage,
+          dispatch_uid='update_sightings_for_image')
+def update_sightings_for_image(sender, instance, **kwargs):
+    # Screening, orphaning, or deleting an image can change whether the
+    # sightings it belongs to have an approved photo.
+    for sighting in instance.sighting_set.all():
+        sighting.update_has_approved_photo()
+
+
+@receiver(pre_delete, sender=ScreenedImage,
+          dispatch_uid='update_sightings_for_deleted_image')
+def update_sightings_for_deleted_image(sender, instance, **kwargs):
+    # Deleting an image removes its rows from the sightings' photos
+    # table without sending m2m_changed, so recompute the flag now,
+    # while the sightings can still be found, leaving the image out.
+    for sighting in instance.sighting_set.all():
+        sighting.update_has_approved_photo(excluding=instance)
+
+
+@receiver(m2m_changed, sender=Sighting.photos.through,
+          dispatch_uid='update_sighting_photo_flag')
+def update_sighting_photo_flag(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    if action == 'pre_clear' and reverse:
+        # Clearing an image's sightings sends no pk_set, so note which
+        # sightings it belongs to while they can still be found.
+        instance._cleared_sighting_ids = list(
+            instance.sighting_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        instance.update_has_approved_photo()
+    else:
+        if action == 'post_clear':
+            pk_set = getattr(instance, '_cleared_sighting_ids', None)
+            instance._cleared_sighting_ids = None
+        if pk_set:
+            for sighting in Sighting.objects.filter(pk__in=pk_set):
+                sighting.update_has_approved_photo()
+
 
 class QuestionManager(models.Manager):
     def answered(self):
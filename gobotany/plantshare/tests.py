@@ -3,10 +3,15 @@
 import json
 import unittest
 
+from datetime import timedelta
+from StringIO import StringIO
+
 from django.conf import settings
 from django.contrib.auth.models import Group, User
+from django.core.management import call_command
 from django.test import TestCase
 from django.test.client import Client
+from django.utils import timezone
 
 from selenium.common.exceptions import NoSuchElementException
 
@@ -14,7 +19,12 @@ from gobotany.libtest import FunctionalCase
 
 from gobotany.core.models import (ConservationStatus, CommonName, Family,
     Genus, Synonym, Taxon)
-from gobotany.plantshare.models import Location
+from gobotany.core.rebuild import rebuild_posting_restrictions
+from gobotany.plantshare import geocoder, geohash, imagequeue
+from gobotany.plantshare.models import (Checklist, ChecklistCollaborator,
+    ChecklistEntry, ImageProcessingJob, Location, ProfileName, Question,
+    ScreenedImage, Sighting, UserProfile)
+from gobotany.plantshare.utils import restrictions
 
 @unittest.skip('Skipping tests that run against the real database')
 class PlantShareTests(FunctionalCase):
@@ -510,6 +520,8 @@ class SightingsRestrictionsTests(TestCase):
             allow_public_posting=False)
         conservation_status.save()
 
+        rebuild_posting_restrictions()
+
     def _get_restrictions(self, url_params, username=TEST_USERNAME,
             password=TEST_PASSWORD):
         """Get a sightings restrictions API response."""
@@ -615,3 +627,491 @@ class SightingsRestrictionsTests(TestCase):
         json_object = json.loads(response.content)
         self.assertFalse(json_object[0]['sightings_restricted'])
         self.assertFalse(json_object[0]['sightings_flagged'])
+
+    def test_restrictions_use_constant_number_of_queries(self):
+        # Under SQLite, one query to match names and one to fetch the
+        # restrictions, however many taxa match.
+        with self.assertNumQueries(2):
+            results = restrictions('upright false bindweed', 'Boston, MA')
+        self.assertEqual(results[0]['common_names'],
+                         ['upright false bindweed'])
+        self.assertEqual(results[0]['synonyms'], ['Convolvulus spithamaeus'])
+
+    def test_rebuilt_after_status_changes(self):
+        taxon = Taxon.objects.get(scientific_name='Calystegia spithamaea')
+        ConservationStatus.objects.filter(taxon=taxon, region='MA').update(
+            allow_public_posting=True)
+        rebuild_posting_restrictions([taxon.id])
+        response = self._get_restrictions(
+            'plant=calystegia+spithamaea&location=Boston,%20MA')
+        json_object = json.loads(response.content)
+        self.assertFalse(json_object[0]['sightings_restricted'])
+
+    def test_restricted_when_coordinates_in_restricted_state(self):
+        response = self._get_restrictions(
+            'plant=calystegia+spithamaea&location=42.3601,%20-71.0589')
+        json_object = json.loads(response.content)
+        self.assertTrue(json_object[0]['sightings_restricted'])
+
+
+class GeocoderTests(unittest.TestCase):
+
+    def test_points_inside_states(self):
+        self.assertEqual(geocoder.state_at(42.2793, -71.4162),
+                         'Massachusetts')
+        self.assertEqual(geocoder.state_at(41.7658, -72.6734), 'Connecticut')
+        self.assertEqual(geocoder.state_at(41.8240, -71.4128), 'Rhode Island')
+        self.assertEqual(geocoder.state_at(44.4759, -73.2121), 'Vermont')
+        self.assertEqual(geocoder.state_at(43.2081, -71.5376),
+                         'New Hampshire')
+        self.assertEqual(geocoder.state_at(46.8606, -68.0120), 'Maine')
+
+    def test_islands_and_coast(self):
+        self.assertEqual(geocoder.state_at(41.2835, -70.0995),
+                         'Massachusetts')   # Nantucket
+        self.assertEqual(geocoder.state_at(43.6591, -70.2568), 'Maine')
+
+    def test_points_outside_new_england(self):
+        self.assertIsNone(geocoder.state_at(42.6526, -73.7562))   # Albany
+        self.assertIsNone(geocoder.state_at(45.5017, -73.5673))   # Montreal
+        self.assertIsNone(geocoder.state_at(42.5, -69.5))   # the Atlantic
+        self.assertIsNone(geocoder.state_at(28.5383, -81.3792))   # Orlando
+
+
+class GeohashTests(unittest.TestCase):
+
+    def test_encode(self):
+        self.assertEqual(geohash.encode(57.64911, 10.40744, 11),
+                         'u4pruydqqvj')
+
+    def test_covering_contains_points_in_box(self):
+        cells = geohash.covering(42.0, -72.0, 42.5, -71.0)
+        self.assertTrue(len(cells) <= geohash.MAX_COVERING_CELLS)
+        for latitude, longitude in [(42.0, -72.0), (42.25, -71.5),
+                                    (42.5, -71.0)]:
+            hash = geohash.encode(latitude, longitude)
+            self.assertTrue(any(hash.startswith(cell) for cell in cells))
+
+
+class SightingsApiTests(TestCase):
+
+    URL = '/plantshare/api/sightings/'
+
+    def setUp(self):
+        self.user = User.objects.create_user('test', 'test@test.com',
+                                             'testpass')
+        now = timezone.now()
+        for identification, latitude, longitude, visibility in [
+                ('Acer rubrum', 42.36, -71.06, 'PUBLIC'),
+                ('Acer rubrum', 42.37, -71.07, 'PUBLIC'),
+                ('Acer saccharum', 42.38, -71.08, 'PRIVATE'),
+                ('Acer rubrum', 44.80, -68.77, 'PUBLIC'),
+                ]:
+            location = Location(user_input='%s, %s' % (latitude, longitude),
+                                latitude=latitude, longitude=longitude)
+            location.save()
+            Sighting(user=self.user, identification=identification,
+                     created=now, location=location,
+                     visibility=visibility).save()
+
+    def _get(self, params):
+        return json.loads(Client().get(self.URL, params).content)
+
+    def test_location_geohash_is_saved(self):
+        location = Location.objects.get(latitude=42.36)
+        self.assertEqual(location.geohash, geohash.encode(42.36, -71.06))
+
+    def test_visible_to_hides_private_sightings_from_others(self):
+        anonymous = Client().get(self.URL)
+        self.assertEqual(len(json.loads(anonymous.content)['sightings']), 3)
+        client = Client()
+        client.login(username='test', password='testpass')
+        response = client.get(self.URL)
+        self.assertEqual(len(json.loads(response.content)['sightings']), 4)
+
+    def test_bounding_box(self):
+        data = self._get({'bbox': '-71.5,42.0,-71.0,42.5'})
+        self.assertEqual(sorted(s['latitude'] for s in data['sightings']),
+                         [42.36, 42.37])
+
+    def test_clusters_when_zoomed_out(self):
+        data = self._get({'bbox': '-74.0,40.0,-66.0,48.0', 'zoom': '6'})
+        self.assertEqual(data['sightings'], [])
+        self.assertEqual(sorted(c['count'] for c in data['clusters']),
+                         [1, 2])
+
+    def test_bad_bounding_box(self):
+        response = Client().get(self.URL, {'bbox': 'north'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SightingsListTests(TestCase):
+
+    URL = '/plantshare/sightings/'
+
+    def setUp(self):
+        self.user = User.objects.create_user('test', 'test@test.com',
+                                             'testpass')
+        group, _ = Group.objects.get_or_create(
+            name=settings.AGREED_TO_TERMS_GROUP)
+        self.user.groups.add(group)
+        location = Location(user_input='Boston, MA')
+        location.save()
+        start = timezone.now() - timedelta(days=1)
+        for i in range(52):
+            visibility = 'PRIVATE' if i == 51 else 'PUBLIC'
+            Sighting(user=self.user, identification='Acer rubrum',
+                     created=start + timedelta(seconds=i),
+                     location=location, visibility=visibility).save()
+
+    def test_anonymous_users_do_not_see_private_sightings(self):
+        response = Client().get(self.URL)
+        ids = [s['id'] for s in response.context['sightings']]
+        self.assertFalse(Sighting.objects.filter(
+            id__in=ids, visibility='PRIVATE').exists())
+
+    def test_pages_follow_each_other_without_overlap(self):
+        client = Client()
+        first = client.get(self.URL)
+        self.assertEqual(len(first.context['sightings']), 50)
+        self.assertTrue(first.context['next_page'])
+        second = client.get(self.URL,
+                            {'before': first.context['next_page']})
+        self.assertEqual(len(second.context['sightings']), 1)
+        self.assertEqual(second.context['next_page'], None)
+        ids = [s['id'] for s in first.context['sightings']
+               + second.context['sightings']]
+        self.assertEqual(len(set(ids)), 51)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_owner_sees_own_private_sighting(self):
+        client = Client()
+        client.login(username='test', password='testpass')
+        response = client.get(self.URL)
+        self.assertEqual(response.context['sightings'][0]['id'],
+                         Sighting.objects.get(visibility='PRIVATE').id)
+
+    def test_bad_cursor(self):
+        response = Client().get(self.URL, {'before': 'yesterday'})
+        self.assertEqual(response.status_code, 404)
+
+
+class RecentSightingsTests(TestCase):
+
+    URL = '/plantshare/sightings/locator/'
+
+    def setUp(self):
+        self.user = User.objects.create_user('test', 'test@test.com',
+                                             'testpass')
+        group, _ = Group.objects.get_or_create(
+            name=settings.AGREED_TO_TERMS_GROUP)
+        self.user.groups.add(group)
+        self.sighting = Sighting(user=self.user, created=timezone.now(),
+                                 identification='Acer rubrum')
+        self.sighting.save()
+        self.photo = ScreenedImage(uploaded_by=self.user,
+                                   image_type='SIGHTING',
+                                   image='sighting/test.jpg')
+        self.photo.save()
+        self.sighting.photos.add(self.photo)
+
+    def _flag(self):
+        return Sighting.objects.get(pk=self.sighting.pk).has_approved_photo
+
+    def test_unscreened_photo_does_not_set_flag(self):
+        self.assertFalse(self._flag())
+
+    def test_approving_photo_sets_flag(self):
+        self.photo.is_approved = True
+        self.photo.save()
+        self.assertTrue(self._flag())
+
+    def test_removing_approved_photo_clears_flag(self):
+        self.photo.is_approved = True
+        self.photo.save()
+        self.sighting.photos.remove(self.photo)
+        self.assertFalse(self._flag())
+
+    def test_clearing_photo_sightings_clears_flag(self):
+        self.photo.is_approved = True
+        self.photo.save()
+        self.photo.sighting_set.clear()
+        self.assertFalse(self._flag())
+
+    def test_deleting_approved_photo_clears_flag(self):
+        self.photo.is_approved = True
+        self.photo.save()
+        self.photo.delete()
+        self.assertFalse(self._flag())
+
+    def test_only_owner_sees_unscreened_sighting(self):
+        response = Client().get(self.URL)
+        self.assertEqual(response.context['recent_sightings'], [])
+        client = Client()
+        client.login(username='test', password='testpass')
+        response = client.get(self.URL)
+        self.assertEqual([s.id for s in response.context['recent_sightings']],
+                         [self.sighting.id])
+
+    def test_private_sightings_are_not_shown_to_others(self):
+        self.photo.is_approved = True
+        self.photo.save()
+        response = Client().get(self.URL)
+        self.assertEqual(len(response.context['recent_sightings']), 1)
+        Sighting.objects.filter(pk=self.sighting.pk).update(
+            visibility='PRIVATE')
+        response = Client().get(self.URL)
+        self.assertEqual(response.context['recent_sightings'], [])
+
+
+class FindPeopleTests(TestCase):
+
+    def setUp(self):
+        group, _ = Group.objects.get_or_create(
+            name=settings.AGREED_TO_TERMS_GROUP)
+        for username, display_name, visibility in [
+                ('searcher', '', 'USERS'),
+                ('asmith', 'Alice J. Smith', 'USERS'),
+                ('bjones', 'Bob Smithers', 'PRIVATE'),
+                ]:
+            user = User.objects.create_user(username, 'test@test.com',
+                                            'testpass')
+            user.groups.add(group)
+            profile = UserProfile.objects.get(user=user)
+            profile.display_name = display_name
+            profile.details_visibility = visibility
+            profile.save()
+        self.client = Client()
+        self.client.login(username='searcher', password='testpass')
+
+    def _people(self, query):
+        response = self.client.get('/plantshare/people/', {'n': query})
+        return [person.user.username for person in response.context['people']]
+
+    def _suggestions(self, query):
+        response = self.client.get('/plantshare/api/people-suggestions/',
+                                   {'q': query})
+        return json.loads(response.content)
+
+    def test_names_are_rebuilt_on_save(self):
+        profile = UserProfile.objects.get(user__username='asmith')
+        self.assertEqual(sorted(profile.names.values_list('name', flat=True)),
+                         ['alice', 'alice j. smith', 'asmith', 'smith'])
+        profile.display_name = 'Alicia'
+        profile.save()
+        self.assertEqual(sorted(profile.names.values_list('name', flat=True)),
+                         ['alicia', 'alicia', 'asmith'])
+
+    def test_username_change_updates_names(self):
+        user = User.objects.get(username='asmith')
+        user.username = 'alices'
+        user.save()
+        self.assertTrue(ProfileName.objects.filter(
+            profile__user=user, kind='USERNAME', name='alices').exists())
+
+    def test_find_by_word_of_display_name(self):
+        self.assertEqual(self._people('smi'), ['asmith'])
+
+    def test_find_private_user_by_username_only(self):
+        self.assertEqual(self._people('bob'), [])
+        self.assertEqual(self._people('bjo'), ['bjones'])
+
+    def test_suggestions(self):
+        self.assertEqual(self._suggestions('a'),
+                         ['Alice', 'Alice J. Smith', 'asmith'])
+        self.assertEqual(self._suggestions('s'), ['Smith', 'searcher'])
+
+
+class ImageQueueTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('test', 'test@test.com',
+                                             'testpass')
+        self.image = ScreenedImage(uploaded_by=self.user,
+                                   image_type='SIGHTING',
+                                   original='originals/missing.jpg',
+                                   processing='PENDING')
+        self.image.save()
+        self.job = ImageProcessingJob.objects.create(image=self.image)
+
+    def test_jobs_are_claimed_once(self):
+        self.assertEqual(imagequeue.claim_jobs(), [self.job.id])
+        self.assertEqual(imagequeue.claim_jobs(), [])
+
+    def test_abandoned_claims_expire(self):
+        ImageProcessingJob.objects.filter(id=self.job.id).update(
+            claimed=timezone.now() - timedelta(hours=1))
+        self.assertEqual(imagequeue.claim_jobs(), [self.job.id])
+
+    def test_failing_job_is_retried_then_given_up(self):
+        self.assertEqual(imagequeue.process_queue(),
+                         (0, imagequeue.MAX_ATTEMPTS))
+        self.assertFalse(ImageProcessingJob.objects.exists())
+        self.assertEqual(ScreenedImage.objects.get(pk=self.image.pk)
+                         .processing, 'FAILED')
+
+    def test_status_of_pending_image(self):
+        client = Client()
+        client.login(username='test', password='testpass')
+        url = '/plantshare/api/image-status/%d' % self.image.pk
+        status = json.loads(client.get(url).content)
+        self.assertEqual(status['status'], 'pending')
+        self.assertEqual(status['status_url'], url)
+
+    def test_status_is_private_to_uploader(self):
+        User.objects.create_user('other', 'other@test.com', 'testpass')
+        client = Client()
+        client.login(username='other', password='testpass')
+        response = client.get(
+            '/plantshare/api/image-status/%d' % self.image.pk)
+        self.assertTrue(json.loads(response.content)['error'])
+
+
+class ImageDerivativeTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('test', 'test@test.com',
+                                             'testpass')
+        # The image file does not exist, so reaching for the storage to
+        # make its thumbnails would fail.
+        self.image = ScreenedImage(uploaded_by=self.user,
+            image_type='SIGHTING', image='sighting/missing.jpg',
+            is_approved=True,
+            cached_thumb_url='/thumbs/small.jpg',
+            cached_thumb_cropped_url='/thumbs/cropped.jpg')
+        self.image.save()
+
+    def test_recorded_urls_are_used(self):
+        image = ScreenedImage.objects.get(pk=self.image.pk)
+        self.assertEqual(image.thumb_url, '/thumbs/small.jpg')
+        self.assertEqual(image.thumb_cropped_url, '/thumbs/cropped.jpg')
+
+    def test_sightings_api_uses_recorded_urls(self):
+        sighting = Sighting(user=self.user, identification='Acer rubrum',
+                            created=timezone.now())
+        sighting.save()
+        sighting.photos.add(self.image)
+        data = json.loads(Client().get('/plantshare/api/sightings/').content)
+        self.assertEqual(data['sightings'][0]['photos'],
+                         ['/thumbs/cropped.jpg'])
+
+
+class CleanupUserImagesTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('test', 'test@test.com',
+                                             'testpass')
+        for name, is_approved, orphaned in [
+                ('sighting/rejected.jpg', False, False),
+                ('sighting/orphaned.jpg', True, True),
+                ('sighting/shared.jpg', False, False),
+                ('sighting/shared.jpg', True, False),
+                ]:
+            ScreenedImage(uploaded_by=self.user, image_type='SIGHTING',
+                          image=name, is_approved=is_approved,
+                          orphaned=orphaned,
+                          screened=timezone.now()).save()
+        ScreenedImage.objects.update(
+            uploaded=timezone.now() - timedelta(days=30))
+
+    def _cleanup(self, **options):
+        call_command('cleanup_user_images', stdout=StringIO(), batch_size=1,
+                     **options)
+        return sorted(ScreenedImage.objects.filter(deleted=True)
+                      .values_list('image', flat=True))
+
+    def test_dry_run_changes_nothing(self):
+        self.assertEqual(self._cleanup(dry_run=True), [])
+
+    def test_stale_images_are_flagged(self):
+        self.assertEqual(self._cleanup(),
+                         ['sighting/orphaned.jpg', 'sighting/rejected.jpg'])
+
+    def test_start_after_skips_earlier_images(self):
+        first = ScreenedImage.objects.order_by('id')[0]
+        self.assertEqual(self._cleanup(start_after=first.id),
+                         ['sighting/orphaned.jpg'])
+
+    def test_failed_uploads_are_flagged(self):
+        image = ScreenedImage(uploaded_by=self.user, image_type='SIGHTING',
+                              original='sighting/original.jpg',
+                              processing='FAILED', orphaned=True)
+        image.save()
+        ScreenedImage.objects.filter(id=image.id).update(
+            uploaded=timezone.now() - timedelta(days=30))
+        self._cleanup()
+        self.assertTrue(ScreenedImage.objects.get(id=image.id).deleted)
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('test', 'test@test.com',
+                                             'testpass')
+        group, _ = Group.objects.get_or_create(
+            name=settings.AGREED_TO_TERMS_GROUP)
+        self.user.groups.add(group)
+        self.checklist = Checklist.objects.create(name='Spring Walk',
+                                                  comments='Trail')
+        ChecklistCollaborator.objects.create(
+            collaborator=self.user.userprofile.get_user_pod(),
+            checklist=self.checklist, is_owner=True)
+        for i in range(3):
+            ChecklistEntry.objects.create(checklist=self.checklist,
+                                          plant_name='Plant %d' % i,
+                                          is_checked=(i == 0))
+        location = Location(user_input='Boston, MA')
+        location.save()
+        Sighting(user=self.user, identification='Acer rubrum',
+                 created=timezone.now(), location=location,
+                 visibility='PUBLIC').save()
+        self.client = Client()
+        self.client.login(username='test', password='testpass')
+
+    def _content(self, response):
+        self.assertFalse(hasattr(response, 'content'))
+        return ''.join(response.streaming_content)
+
+    def test_checklist_csv(self):
+        response = self.client.get(
+            '/plantshare/checklists/%d/export/' % self.checklist.id)
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="spring_walk.csv"')
+        lines = self._content(response).splitlines()
+        self.assertEqual(lines[0], 'Plant Checklist Title:,Spring Walk')
+        self.assertEqual(lines[3],
+            'Found?,Plant Name,Date Sighted,Location,Date Posted,Notes')
+        self.assertEqual(lines[4], 'Yes,Plant 0,N/A,,N/A,')
+        self.assertEqual(len(lines), 7)
+
+    def test_all_checklists(self):
+        response = self.client.get('/plantshare/checklists/export/',
+                                   {'format': 'json'})
+        entries = json.loads(self._content(response))
+        self.assertEqual([entry['checklist'] for entry in entries],
+                         ['Spring Walk'] * 3)
+
+    def test_sightings_json(self):
+        response = self.client.get('/plantshare/sightings/export/',
+                                   {'format': 'json'})
+        sightings = json.loads(self._content(response))
+        self.assertEqual(len(sightings), 1)
+        self.assertEqual(sightings[0]['location'], 'Boston, MA')
+
+    def test_unapproved_answers_are_not_exported(self):
+        Question.objects.create(question='What is it?', answer='A maple',
+                                asked_by=self.user)
+        response = self.client.get('/plantshare/questions/export/',
+                                   {'format': 'json'})
+        self.assertEqual(json.loads(self._content(response))[0]['answer'],
+                         '')
+        Question.objects.update(approved=True)
+        response = self.client.get('/plantshare/questions/export/',
+                                   {'format': 'json'})
+        self.assertEqual(json.loads(self._content(response))[0]['answer'],
+                         'A maple')
+
+    def test_unknown_format(self):
+        response = self.client.get('/plantshare/sightings/export/',
+                                   {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
@@ -25,6 +25,8 @@ urlpatterns = [
         name='ps-sightings-locator'),
 
     # Manage Your Sightings
+    url(r'^sightings/export/$', views.export_sightings_view,
+        name='ps-sightings-export'),
     url(r'^sightings/manage/$', views.manage_sightings_view,
         name='ps-manage-sightings'),
     url(r'^sightings/(?P<sighting_id>[0-9]+)/edit/$',
@@ -48,6 +50,8 @@ urlpatterns = [
     url(r'^questions/all/(?P<year>[0-9]{4})/$',
         views.all_questions_by_year_view,
         name='ps-all-questions-by-year'),
+    url(r'^questions/export/$', views.export_questions_view,
+        name='ps-questions-export'),
     url(r'^questions/all/$', views.all_questions_by_year_view,
         name='ps-all-questions'),
 
@@ -55,6 +59,8 @@ urlpatterns = [
     url(r'^checklists/$', views.checklist_index_view, name='ps-checklists'),
     url(r'^checklists/new/$', views.new_checklist_view,
         name='ps-checklist-new'),
+    url(r'^checklists/export/$', views.export_checklists_view,
+        name='ps-checklists-export'),
     url(r'^checklists/delete/$', views.delete_checklists_view,
         name='ps-checklists-delete'),
     url(r'^checklists/(?P<checklist_id>[0-9]+)/$', views.checklist_view,
@@ -83,6 +89,8 @@ urlpatterns = [
         name='ps-ajax-profile-edit'),
     url(r'^api/image-upload$', views.ajax_image_upload,
         name='ps-ajax-image-upload'),
+    url(r'^api/image-status/(?P<image_id>[0-9]+)$', views.ajax_image_status,
+        name='ps-ajax-image-status'),
     url(r'^api/image-reject/(?P<image_id>[0-9]+)$', views.ajax_image_reject,
         name='ps-ajax-image-reject'),
     url(r'^api/sightings/$', views.ajax_sightings, name='ps-ajax-sightings'),
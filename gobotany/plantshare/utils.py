@@ -1,13 +1,11 @@
 import json
 import re
-import urllib2
-
-from itertools import chain
 
 from django.conf import settings
 
-from gobotany.core.models import Taxon
-from gobotany.site.utils import query_regex
+from gobotany.core.models import PostingRestriction, PostingRestrictionName
+from gobotany.plantshare import geocoder
+from gobotany.site.fuzzy import matching
 
 def get_covered_state(location):
     """Return the name of the state covered by the site for a given
@@ -23,20 +21,14 @@ def get_covered_state(location):
                               '(-?\d{1,3}.?\d{1,6}?)$', location)
         if lat_long:
             # Determine the state name from latitude and longitude
-            # coordinates.
-            latitude = lat_long.group(1)
-            longitude = lat_long.group(2)
-            url = ('https://data.fcc.gov/api/block/find?format=json&'
-                   'latitude=%s&longitude=%s&showall=true') % (latitude,
-                                                               longitude)
+            # coordinates, using the bundled state boundaries.
             try:
-                data = urllib2.urlopen(url).read()
-                response = json.loads(data)
-                state = response['State']['name']
-            except urllib2.HTTPError, e:
-                print 'HTTP error: %d' % e.code
-            except urllib2.URLError, e:
-                print 'Network error: %s' % e.reason.args[1]
+                latitude = float(lat_long.group(1))
+                longitude = float(lat_long.group(2))
+            except ValueError:
+                pass
+            else:
+                state = geocoder.state_at(latitude, longitude)
         elif re.search(r'\d{5}(-\d{4})?$', location):
             # Determine the state name from a ZIP code.
             if re.search(r'06[0-9]{3}(-\d{4})?$', location):
@@ -77,40 +69,20 @@ def restrictions(plant_name, location=None):
     """Return a list of taxa matching a given plant name, along with any
     information on restrictions for sightings of rare plants, etc.
     """
-    plant_regex = query_regex(plant_name, anchor_at_start=True,
-        anchor_at_end=True)
     covered_state = get_covered_state(location)
     restrictions = []
 
     # Restrictions apply for all names for a plant: scientific name,
-    # synonyms, and common names.
-    scientific_name_taxa = Taxon.objects.filter(
-        scientific_name__iregex=plant_regex)
-    common_name_taxa = Taxon.objects.filter(
-        common_names__common_name__iregex=plant_regex)
-    synonym_taxa = Taxon.objects.filter(
-        synonyms__scientific_name__iregex=plant_regex)
-    taxa = list(
-        set(chain(scientific_name_taxa, common_name_taxa, synonym_taxa)))
+    # synonyms, and common names, all of which are in one table.
+    names = matching(PostingRestrictionName.objects.all(), 'name',
+                     plant_name, anchor_at_start=True, anchor_at_end=True)
+    taxa = PostingRestriction.objects.filter(
+        taxon_id__in=names.values('restriction_id'))
 
     for taxon in taxa:
-        common_names = [n.common_name for n in taxon.common_names.all()]
-        synonyms = [s.scientific_name for s in taxon.synonyms.all()]
-
-        allow_public_posting = {}
-        for status in taxon.conservation_statuses.all():
-            state_name = settings.STATE_NAMES[status.region.lower()]
-            # If a status entry has already set a state's "allow public
-            # posting" value to False, prevent another from overwriting it.
-            if (state_name not in allow_public_posting.keys() or
-                    allow_public_posting[state_name] != False):
-                allow_public_posting[state_name] = status.allow_public_posting
-        # Fill in any states that do not have conservation status
-        # records.
-        for key in settings.STATE_NAMES.keys():
-            state_name = settings.STATE_NAMES[key]
-            if state_name not in allow_public_posting.keys():
-                allow_public_posting[state_name] = True
+        common_names = json.loads(taxon.common_names)
+        synonyms = json.loads(taxon.synonyms)
+        allow_public_posting = json.loads(taxon.allow_public_posting)
 
         sightings_restricted = False
         sightings_flagged = False
@@ -1,4 +1,3 @@
-import csv
 import json
 import math
 
@@ -11,7 +10,9 @@ from django.contrib.auth.models import Group, User
 from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import reverse, reverse_lazy
-from django.db.models import Q
+from django.db.models import (Avg, Case, CharField, Count, F, Prefetch, Q,
+    Value, When)
+from django.db.models.functions import Substr
 from django.forms import widgets
 from django.forms.models import modelformset_factory
 from django.http import Http404, HttpResponse, HttpResponseRedirect
@@ -22,12 +23,14 @@ from django.utils.timezone import utc
 import emailconfirmation_views
 from emailconfirmation_models import EmailConfirmation
 
+from gobotany.plantshare import exports, geohash, imagequeue
 from gobotany.plantshare.forms import (ChangeEmailForm, ChecklistEntryForm,
     ChecklistForm, QuestionForm, ScreenedImageForm, SightingForm,
     UserProfileForm)
 from gobotany.plantshare.models import (Checklist, ChecklistCollaborator,
-    ChecklistEntry, Location, Question, ScreenedImage, Sighting,
-    SIGHTING_VISIBILITY_CHOICES, UserProfile)
+    ChecklistEntry, Location, ProfileName, Question, ScreenedImage,
+    Sighting, SIGHTING_VISIBILITY_CHOICES, UserProfile,
+    visible_profile_names_q, visible_sightings_q)
 from gobotany.plantshare.utils import prior_signup_detected, restrictions
 
 SIGHTINGS_MAP_DEFAULTS = {
@@ -37,6 +40,13 @@ SIGHTINGS_MAP_DEFAULTS = {
     'zoom': '7'
 }
 
+# Sightings on maps zoomed out this far or further are clustered.
+CLUSTER_MAX_ZOOM = 10
+CLUSTER_SIZE = 60   # pixels
+MAP_TILE_SIZE = 256   # pixels
+
+EPOCH = datetime(1970, 1, 1, tzinfo=utc)
+
 SIGHTING_DATE_FORMAT = '%B %e'
 SIGHTING_DATE_YEAR_FORMAT = SIGHTING_DATE_FORMAT + ' %Y'
 SIGHTING_SHORT_DATE_YEAR_FORMAT = '%e %b %Y'
@@ -142,28 +152,26 @@ def _get_recently_answered_questions(number_of_questions):
 
 def _get_recent_sightings(request, profile):
     MAX_RECENT_SIGHTINGS = 20
-    recent_sightings = []
 
-    # Get the sightings with approved photos.
+    # Get the newest visible sightings with approved photos, which the
+    # index on (has_approved_photo, created) hands over in order.
+    recent_sightings = list(Sighting.objects.filter(
+        visible_sightings_q(request.user), has_approved_photo=True)
+        .select_related('location').prefetch_related('photos')
+        .order_by('-created')[:MAX_RECENT_SIGHTINGS])
+
     if profile:
         # Also include any sightings the current user posted where the
         # photos may not have been screened and approved yet (because
         # it's always OK to show a user's own photos to that user).
-        sightings_with_photos = Sighting.objects.filter(
-            Q(photos__isnull=False, photos__is_approved=True) |
-            Q(photos__isnull=False, user=profile.user)).order_by(
-            '-created').distinct('created')
-    else:
-        sightings_with_photos = Sighting.objects.filter(
-            photos__isnull=False, photos__is_approved=True).order_by(
-            '-created').distinct('created')
-
-    for sighting in sightings_with_photos:
-        may_show_sighting = _may_show_sighting(sighting, request.user)
-        if may_show_sighting:
-            recent_sightings.append(sighting)
-            if len(recent_sightings) == MAX_RECENT_SIGHTINGS:
-                break
+        own_sightings = Sighting.objects.filter(
+            user=profile.user, has_approved_photo=False,
+            photos__processing='DONE').distinct().select_related(
+            'location').prefetch_related('photos').order_by(
+            '-created')[:MAX_RECENT_SIGHTINGS]
+        recent_sightings = sorted(recent_sightings + list(own_sightings),
+            key=lambda sighting: sighting.created,
+            reverse=True)[:MAX_RECENT_SIGHTINGS]
 
     return recent_sightings
 
@@ -212,26 +220,6 @@ def plantshare_view(request):
            })
 
 
-def _may_show_sighting(sighting, user):
-    """Determine whether a sighting may be shown to a user in a set of
-    results (list, table, map markers, etc.).
-    """
-    may_show_sighting = False
-
-    if sighting.visibility == 'PUBLIC':
-        may_show_sighting = True
-    if (sighting.visibility == 'USERS') and user.is_authenticated():
-        may_show_sighting = True
-    #elif:
-        # TODO: later when available, handle GROUPS visibility
-    elif sighting.visibility == 'PRIVATE':
-        if (((user.id == sighting.user.id) or user.is_staff) and
-                user.is_authenticated()):
-            may_show_sighting = True
-
-    return may_show_sighting
-
-
 def _get_photo_for_thumbnail(sighting, request):
     """Look for a photo that can be used for a thumbnail image for a
     sighting on the Recent Sightings page or sightings by year pages.
@@ -240,30 +228,58 @@ def _get_photo_for_thumbnail(sighting, request):
     for p in sighting.photos.all():
         # If the photo is approved, or the user viewing the page
         # is the owner of the sighting photo, show the photo.
+        if p.processing != 'DONE':
+            continue
         if p.is_approved or (sighting.user == request.user):
             photo = p
             break
     return photo
 
 
-def _get_display_names(sightings_queryset):
-    """Get a list of tuples of user ids and display names for a queryset
-    of sightings.
+def _get_display_names(sightings):
+    """Return a dict of display names by user id for a list of sightings.
     """
-    user_ids = set()
-    for sighting in sightings_queryset:
-        user_ids.add(sighting.user.id)
-    display_names = UserProfile.objects.filter(
-        user__id__in=user_ids).values_list('user__id', 'display_name')
-    return display_names
-
-def _get_user_display_name(display_names, sighting):
-    user_display_name = None
-    for display_name in display_names:
-        if int(display_name[0]) == sighting.user.id:
-            user_display_name = display_name[1]
-            break
-    return user_display_name
+    user_ids = set(sighting.user_id for sighting in sightings)
+    return dict(UserProfile.objects.filter(
+        user__id__in=user_ids).values_list('user__id', 'display_name'))
+
+
+def _sightings_cursor(sighting):
+    """Return the keyset pagination cursor for sightings after this one:
+    its creation time, in microseconds since the epoch, and its id."""
+    delta = sighting.created - EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 1000000 + \
+        delta.microseconds
+    return '%d.%d' % (microseconds, sighting.id)
+
+
+def _sightings_page(request, sightings, page_size):
+    """Return a page of the sightings visible to the user, newest first,
+    starting after the cursor in the `before` parameter, along with the
+    cursor for the next page (or None).
+
+    Rather than counting an offset through the table, each page starts
+    at the creation time and id of the last sighting on the page
+    before, which the index on `created` finds directly.
+    """
+    sightings = sightings.filter(visible_sightings_q(request.user))
+    before = request.GET.get('before')
+    if before:
+        try:
+            microseconds, sighting_id = [int(n) for n in before.split('.')]
+        except ValueError:
+            raise Http404
+        created = EPOCH + timedelta(microseconds=microseconds)
+        sightings = sightings.filter(
+            Q(created__lt=created) | Q(created=created, id__lt=sighting_id))
+    sightings = list(sightings.select_related('location', 'user')
+                     .prefetch_related('photos')
+                     .order_by('-created', '-id')[:page_size + 1])
+    next_page = None
+    if len(sightings) > page_size:
+        sightings = sightings[:page_size]
+        next_page = _sightings_cursor(sightings[-1])
+    return sightings, next_page
 
 
 @terms_agreed_on_login
@@ -322,31 +338,25 @@ def sightings_view(request):
             return HttpResponse(status=401)   # 401 Unauthorized
     elif request.method == 'GET':
         # Return a representation of the collection of sightings.
-        sightings_queryset = Sighting.objects.select_related().all().\
-            prefetch_related('location', 'photos', 'user')
-        display_names = _get_display_names(sightings_queryset)
+        page, next_page = _sightings_page(request, Sighting.objects.all(),
+                                          MAX_RECENT_SIGHTINGS)
+        display_names = _get_display_names(page)
 
         sightings = []
-        for sighting in sightings_queryset:
-            may_show_sighting = _may_show_sighting(sighting, request.user)
-            if may_show_sighting:
-                photo = _get_photo_for_thumbnail(sighting, request)
-                created = sighting.created.strftime(SIGHTING_DATE_FORMAT)
-                year = sighting.created.strftime('%Y')
-                user_display_name = _get_user_display_name(display_names,
-                    sighting)
-                sightings.append({
-                    'id': sighting.id,
-                    'photo': photo,
-                    'identification': sighting.identification,
-                    'location': sighting.location,
-                    'user': sighting.user,
-                    'user_display_name': user_display_name,
-                    'created': created,
-                    'year': year,
-                })
-                if len(sightings) == MAX_RECENT_SIGHTINGS:
-                    break
+        for sighting in page:
+            photo = _get_photo_for_thumbnail(sighting, request)
+            created = sighting.created.strftime(SIGHTING_DATE_FORMAT)
+            year = sighting.created.strftime('%Y')
+            sightings.append({
+                'id': sighting.id,
+                'photo': photo,
+                'identification': sighting.identification,
+                'location': sighting.location,
+                'user': sighting.user,
+                'user_display_name': display_names.get(sighting.user_id),
+                'created': created,
+                'year': year,
+            })
 
         years = [dt.year for dt in
             Sighting.objects.datetimes('created', 'year', order='DESC')]
@@ -354,6 +364,7 @@ def sightings_view(request):
         return render(request, 'sightings.html', {
                     'sightings': sightings,
                     'years': years,
+                    'next_page': next_page,
                })
     else:
         # For an unsupported HTTP method, return Method Not Allowed.
@@ -362,28 +373,25 @@ def sightings_view(request):
 
 @terms_agreed_on_login
 def sightings_by_year_view(request, year):
-    sightings_queryset = Sighting.objects.select_related().\
-        filter(created__year=year).prefetch_related('location', 'photos',
-        'user')
-    display_names = _get_display_names(sightings_queryset)
+    MAX_SIGHTINGS_PER_PAGE = 100
+
+    page, next_page = _sightings_page(request,
+        Sighting.objects.filter(created__year=year), MAX_SIGHTINGS_PER_PAGE)
+    display_names = _get_display_names(page)
 
     sightings = []
-    for sighting in sightings_queryset:
-        may_show_sighting = _may_show_sighting(sighting, request.user)
-        if may_show_sighting:
-            photo = _get_photo_for_thumbnail(sighting, request)
-            created = sighting.created.strftime(SIGHTING_DATE_FORMAT)
-            user_display_name = _get_user_display_name(display_names,
-                sighting)
-            sightings.append({
-                'id': sighting.id,
-                'photo': photo,
-                'identification': sighting.identification,
-                'location': sighting.location,
-                'user': sighting.user,
-                'user_display_name': user_display_name,
-                'created': created,
-            })
+    for sighting in page:
+        photo = _get_photo_for_thumbnail(sighting, request)
+        created = sighting.created.strftime(SIGHTING_DATE_FORMAT)
+        sightings.append({
+            'id': sighting.id,
+            'photo': photo,
+            'identification': sighting.identification,
+            'location': sighting.location,
+            'user': sighting.user,
+            'user_display_name': display_names.get(sighting.user_id),
+            'created': created,
+        })
 
     years = [str(dt.year) for dt in
         Sighting.objects.datetimes('created', 'year', order='DESC')]
@@ -393,6 +401,7 @@ def sightings_by_year_view(request, year):
                     'year': year,
                     'sightings': sightings,
                     'years': years,
+                    'next_page': next_page,
                })
     else:
         raise Http404
@@ -816,31 +825,89 @@ def delete_checklist_view(request, checklist_id):
         return HttpResponse(status=405)
 
 
+CHECKLIST_EXPORT_COLUMNS = (
+    ('Found?', 'found', 'is_checked'),
+    ('Plant Name', 'plant_name', 'plant_name'),
+    ('Date Sighted', 'date_sighted', 'date_found'),
+    ('Location', 'location', 'location'),
+    ('Date Posted', 'date_posted', 'date_posted'),
+    ('Notes', 'notes', 'note'),
+)
+
+def _export_format(request):
+    """Return the export format asked for, defaulting to CSV."""
+    format = request.GET.get('format', 'csv')
+    if format not in exports.FORMATS:
+        raise Http404
+    return format
+
+
 @login_required
 @terms_agreed_on_login
 def export_checklist_view(request, checklist_id):
-    response = HttpResponse(content_type='text/csv')
+    """Stream a checklist's entries as a CSV file, or with ?format=json,
+    as a JSON array."""
+    format = _export_format(request)
     checklist = get_object_or_404(Checklist, pk=checklist_id)
-    filename = checklist.name.lower().replace(' ', '_') + '.csv'
-    response['Content-Disposition'] = 'attachment; filename="{0}"'.format(
-        filename)
-
-    writer = csv.writer(response)
-    writer.writerow(('Plant Checklist Title:', checklist.name))
-    writer.writerow(('Comments:', checklist.comments))
-    writer.writerow([])
-    writer.writerow(('Found?', 'Plant Name', 'Date Sighted', 'Location',
-        'Date Posted', 'Notes'))
-    for entry in checklist.entries.all():
-        found = 'Yes' if entry.is_checked else 'No'
-        sighted = (entry.date_found.strftime('%d/%m/%Y')
-            if entry.date_found else 'N/A')
-        posted = (entry.date_posted.strftime('%d/%m/%Y')
-            if entry.date_posted else 'N/A')
-        writer.writerow((found, entry.plant_name, sighted, entry.location,
-            posted, entry.note))
-
-    return response
+    filename = checklist.name.lower().replace(' ', '_')
+    preamble = (
+        ('Plant Checklist Title:', checklist.name),
+        ('Comments:', checklist.comments),
+        (),
+    )
+    return exports.export_response(checklist.entries.all(),
+        CHECKLIST_EXPORT_COLUMNS, filename, format, preamble)
+
+
+@login_required
+@terms_agreed_on_login
+def export_checklists_view(request):
+    """Stream the entries of all of a user's checklists."""
+    format = _export_format(request)
+    checklist_ids = request.user.userprofile.checklists.values('id')
+    entries = ChecklistEntry.objects.filter(checklist__in=checklist_ids)
+    columns = (('Plant Checklist Title', 'checklist', 'checklist__name'),
+               ) + CHECKLIST_EXPORT_COLUMNS
+    return exports.export_response(entries, columns, 'checklists', format)
+
+
+@login_required
+@terms_agreed_on_login
+def export_sightings_view(request):
+    """Stream all of a user's sightings."""
+    format = _export_format(request)
+    sightings = Sighting.objects.filter(user=request.user)
+    columns = (
+        ('ID', 'id', 'id'),
+        ('Date Posted', 'created', 'created'),
+        ('Identification', 'identification', 'identification'),
+        ('Location', 'location', 'location__user_input'),
+        ('Latitude', 'latitude', 'location__latitude'),
+        ('Longitude', 'longitude', 'location__longitude'),
+        ('Location Notes', 'location_notes', 'location_notes'),
+        ('Notes', 'notes', 'notes'),
+        ('Visibility', 'visibility', 'visibility'),
+    )
+    return exports.export_response(sightings, columns, 'sightings', format)
+
+
+@login_required
+@terms_agreed_on_login
+def export_questions_view(request):
+    """Stream all of a user's questions, with the answers that have been
+    approved."""
+    format = _export_format(request)
+    questions = Question.objects.filter(asked_by=request.user).annotate(
+        approved_answer=Case(When(approved=True, then=F('answer')),
+                             default=Value(''), output_field=CharField()))
+    columns = (
+        ('ID', 'id', 'id'),
+        ('Date Asked', 'asked', 'asked'),
+        ('Question', 'question', 'question'),
+        ('Answer', 'answer', 'approved_answer'),
+    )
+    return exports.export_response(questions, columns, 'questions', format)
+
 
 @login_required
 @terms_agreed_on_login
@@ -902,50 +969,24 @@ def checklist_view(request, checklist_id):
         return HttpResponse(status=405)
 
 
-def _may_show_display_name(request, user_profile):
-    """Determine if a user's display name may be shown to the current user:
-    Show if the user's visibility is not set to private, or if the name
-    belongs to the current user, or if the current user is a 'staff' user.
-    TODO: later when available, take into account a 'GROUPS' setting.
-    """
-    may_show = ((user_profile.details_visibility != 'PRIVATE') or
-                (user_profile.user.id == request.user.id) or
-                (request.user.is_staff == True))
-    return may_show
-
-
 @login_required
 @terms_agreed_on_login
 def find_people_view(request):
     """View for the Find People results page."""
     MIN_QUERY_LENGTH = 2
+    MAX_PEOPLE = 100
     query = request.GET.get('n', '')
     query_l = query.lower()
     people = []
     if len(query) >= MIN_QUERY_LENGTH:
-        candidates = UserProfile.objects.filter(
-            Q(display_name__icontains=query_l) |
-            Q(user__username__istartswith=query_l)).order_by('display_name')
-        for candidate in candidates:
-            is_match = False
-            may_show_display_name = _may_show_display_name(request, candidate)
-
-            # If a user has specified a display name, check it.
-            if may_show_display_name and candidate.display_name != '':
-                # Check the beginning of any parts of the display name.
-                parts = candidate.display_name.lower().split(' ')
-                for part in parts:
-                    if part.startswith(query_l):
-                        is_match = True
-                        break
-                # Also check the entire display name.
-                if candidate.display_name.lower().startswith(query_l):
-                    is_match = True
-            # Check the beginning of the username.
-            if candidate.user.username.lower().startswith(query_l):
-                is_match = True
-            if is_match:
-                people.append(candidate)
+        # Match the beginning of the username, the display name, or any
+        # word of the display name, where the display name may be shown.
+        names = ProfileName.objects.filter(
+            visible_profile_names_q(request.user), name__startswith=query_l)
+        people = UserProfile.objects.filter(
+            id__in=names.values('profile_id')).select_related(
+            'user', 'location', 'avatar').order_by(
+            'display_name')[:MAX_PEOPLE]
 
     return render(request, 'find_people.html', {
             'min_query_length': MIN_QUERY_LENGTH,
@@ -1115,7 +1156,7 @@ def screen_images(request):
                 profile.save()
 
     unscreened_images = ScreenedImage.objects.filter(screened=None,
-        deleted=False, orphaned=False).exclude(
+        deleted=False, orphaned=False, processing='DONE').exclude(
             image_type='QUESTION')   # No screening here for question images
     formset = ScreeningFormSet(queryset=unscreened_images)
 
@@ -1171,7 +1212,7 @@ def ajax_image_upload(request):
         if form.is_valid():
             new_image = form.save(commit=False)
             new_image.uploaded_by = request.user
-            new_image.save()
+            imagequeue.store_upload(new_image, form.cleaned_data['image'])
 
             if new_image.image_type == 'AVATAR':
                 # Since we're technically editing the user's profile by 
@@ -1198,27 +1239,59 @@ def ajax_image_upload(request):
                     )
                     previous_avatars.update(orphaned=True)
 
-            # Return basic information in the response, as well as
-            # latitude and longitude if the original image contained GPS
-            # coordinates in its metadata.
-            latitude = None
-            longitude = None
-            if new_image.latitude is not None:
-                latitude = float(new_image.latitude) # convert so serializable
-            if new_image.longitude is not None:
-                longitude = float(new_image.longitude)
-            response.update({
-                'id': new_image.pk,
-                'thumb': new_image.thumb.url,
-                'url': new_image.image.url,
-                'latitude': latitude,
-                'longitude': longitude
-            })
+            # Return basic information in the response, including the
+            # status web service to poll until the image is processed.
+            response.update(_image_status(new_image))
 
     return HttpResponse(json.dumps(response),
                         content_type='application/json')
 
 
+def _image_status(image):
+    """Return information about an uploaded image for the upload form:
+    while it is waiting to be processed, where to check on it, and once
+    it is ready, its URLs, along with the latitude and longitude if the
+    original image contained GPS coordinates in its metadata.
+    """
+    latitude = None
+    longitude = None
+    if image.latitude is not None:
+        latitude = float(image.latitude) # convert so serializable
+    if image.longitude is not None:
+        longitude = float(image.longitude)
+    status = {
+        'success': image.processing != 'FAILED',
+        'id': image.pk,
+        'status': image.processing.lower(),
+        'latitude': latitude,
+        'longitude': longitude,
+    }
+    if image.processing == 'PENDING':
+        status['status_url'] = reverse('ps-ajax-image-status',
+                                       args=[image.pk])
+    elif image.processing == 'DONE':
+        status['thumb'] = image.thumb_url
+        status['url'] = image.image.url
+    else:
+        status['info'] = 'The image could not be processed'
+    return status
+
+
+def ajax_image_status(request, image_id):
+    """Report whether an uploaded image has been processed yet."""
+    image = get_object_or_404(ScreenedImage, pk=image_id)
+
+    # Only staff or the user who uploaded the image may check on it.
+    if not (request.user.is_staff or request.user == image.uploaded_by):
+        return HttpResponse(json.dumps({
+            'error': True,
+            'info': 'Authentication error'
+        }), content_type='application/json')
+
+    return HttpResponse(json.dumps(_image_status(image)),
+                        content_type='application/json')
+
+
 def ajax_image_reject(request, image_id):
     """ Reject an image that was previously uploaded. """
     if not request.user.is_authenticated():
@@ -1249,68 +1322,122 @@ def ajax_image_reject(request, image_id):
     return HttpResponse(json.dumps(response), content_type='application/json')
 
 
+def _approved_photos_prefetch():
+    """Prefetch the photos that `Sighting.approved_photos()` returns."""
+    return Prefetch('photos', to_attr='approved_photo_list',
+        queryset=ScreenedImage.objects.filter(is_approved=True,
+            deleted=False, orphaned=False))
+
+
+def _sighting_json(sighting):
+    photos = [photo.thumb_cropped_url
+              for photo in sighting.approved_photo_list]
+
+    # If the location coordinates are not valid numbers,
+    # set them to None, which converts to null in the JSON.
+    latitude = None
+    longitude = None
+    location_user_input = None
+    if sighting.location and sighting.location.latitude and \
+        sighting.location.longitude:
+
+        latitude = sighting.location.latitude
+        if math.isnan(latitude):
+            latitude = None
+        longitude = sighting.location.longitude
+        if math.isnan(longitude):
+            longitude = None
+        location_user_input = sighting.location.user_input
+
+    return {
+        'id': sighting.id,
+        'identification': sighting.identification,
+        'created': unicode(sighting.created.strftime(
+                           SIGHTING_SHORT_DATE_YEAR_FORMAT)),
+        'location': location_user_input,
+        'latitude': latitude,
+        'longitude': longitude,
+        'user': sighting.user.username, # TODO: fast way of getting
+                                        #       user display name
+        'description': sighting.notes,
+        'photos': photos,
+    }
+
+
+def _sightings_in_box(sightings, south, west, north, east):
+    """Filter sightings to those inside a bounding box.
+
+    The geohash prefixes of the cells covering the box narrow the search
+    through the index on `Location.geohash`, then the coordinates are
+    compared exactly.
+    """
+    cells = Q()
+    for prefix in geohash.covering(south, west, north, east):
+        cells |= Q(location__geohash__startswith=prefix)
+    sightings = sightings.filter(cells).filter(
+        location__latitude__range=(south, north))
+    if west <= east:
+        return sightings.filter(location__longitude__range=(west, east))
+    else:   # the box crosses the 180th meridian
+        return sightings.filter(Q(location__longitude__gte=west) |
+                                Q(location__longitude__lte=east))
+
+
+def _sighting_clusters(sightings, zoom):
+    """Group sightings into clusters about CLUSTER_SIZE pixels across."""
+    width = CLUSTER_SIZE * 360.0 / (MAP_TILE_SIZE * 2 ** zoom)
+    precision = geohash.precision_for_width(width)
+    clusters = sightings.order_by().annotate(
+        cell=Substr('location__geohash', 1, precision)).values(
+        'cell').annotate(count=Count('id'),
+                         latitude=Avg('location__latitude'),
+                         longitude=Avg('location__longitude'))
+    return [{
+        'geohash': cluster['cell'],
+        'count': cluster['count'],
+        'latitude': cluster['latitude'],
+        'longitude': cluster['longitude'],
+    } for cluster in clusters]
+
+
 def ajax_sightings(request):
     """Return sightings data: the most recent sightings, or the most
     recent sightings for a plant name, or a recent sighting by sighting id.
+
+    Any of these can be limited to the sightings within a bounding box,
+    given as `bbox=west,south,east,north`.  With a map `zoom` level of
+    CLUSTER_MAX_ZOOM or less, the sightings in the box are returned as
+    `clusters` of nearby sightings instead.
     """
 
     MAX_TO_RETURN = 100
     plant_name = request.GET.get('plant')
     sighting_id = request.GET.get('id')
 
-    sightings = Sighting.objects.select_related().all().\
-        prefetch_related('location').order_by('-created')
+    sightings = Sighting.objects.visible_to(request.user)
     if plant_name:
         sightings = sightings.filter(identification__iexact=plant_name)
     elif sighting_id:
         sightings = sightings.filter(id=sighting_id)
 
-    sightings_json = []
-    for sighting in sightings:
-
-        may_show_sighting = _may_show_sighting(sighting, request.user)
-
-        if may_show_sighting:
-            photos = []
-            for photo in sighting.approved_photos():
-                photos.append(photo.thumb_cropped.url)
-
-            # If the location coordinates are not valid numbers,
-            # set them to None, which converts to null in the JSON.
-            latitude = None
-            longitude = None
-            location_user_input = None
-            if sighting.location and sighting.location.latitude and \
-                sighting.location.longitude:
-
-                latitude = sighting.location.latitude
-                if math.isnan(latitude):
-                    latitude = None
-                longitude = sighting.location.longitude
-                if math.isnan(longitude):
-                    longitude = None
-                location_user_input = sighting.location.user_input
-
-            sightings_json.append({
-                'id': sighting.id,
-                'identification': sighting.identification,
-                'created': unicode(sighting.created.strftime(
-                                   SIGHTING_SHORT_DATE_YEAR_FORMAT)),
-                'location': location_user_input,
-                'latitude': latitude,
-                'longitude': longitude,
-                'user': sighting.user.username, # TODO: fast way of getting
-                                                #       user display name
-                'description': sighting.notes,
-                'photos': photos,
-            })
-
-            if len(sightings_json) == MAX_TO_RETURN:
-                break
-
-    output = {
-        'sightings': sightings_json
-    }
+    output = {}
+    if 'bbox' in request.GET:
+        try:
+            west, south, east, north = [
+                float(value) for value in request.GET['bbox'].split(',')]
+            zoom = int(request.GET.get('zoom', CLUSTER_MAX_ZOOM + 1))
+        except ValueError:
+            return HttpResponse(status=400)   # 400 Bad Request
+        sightings = _sightings_in_box(sightings, south, west, north, east)
+        if zoom <= CLUSTER_MAX_ZOOM:
+            output['clusters'] = _sighting_clusters(sightings, zoom)
+            output['sightings'] = []
+
+    if 'sightings' not in output:
+        sightings = sightings.select_related('location', 'user').\
+            prefetch_related(_approved_photos_prefetch()).order_by('-created')
+        output['sightings'] = [_sighting_json(sighting)
+                               for sighting in sightings[:MAX_TO_RETURN]]
 
     return HttpResponse(json.dumps(output),
                         content_type='application/json; charset=utf-8')
@@ -1322,65 +1449,20 @@ def ajax_people_suggestions(request):
     """Return suggestions with names to help users find other users."""
     MIN_QUERY_LENGTH = 1
     MAX_RESULTS = 10
-    MIN_SUGGESTION_LENGTH = 2
     query = request.GET.get('q', '').lower()
     suggestions = []
-    ordered_suggestions = []
 
     if len(query) >= MIN_QUERY_LENGTH:
-        # Get all potentially matching display names and usernames.
-        names = UserProfile.objects.filter(
-                    Q(display_name__icontains=query) |
-                    Q(user__username__istartswith=query))
-
-        for name in names:
-            if len(suggestions) == MAX_RESULTS:
-                break
-
-            may_show_display_name = _may_show_display_name(request, name)
-            display_name = name.display_name
-            if may_show_display_name and display_name != '':
-                # Add each part (first, last, etc.) of the display name.
-                parts = display_name.split(' ')
-                for part in parts:
-                    part = part.strip('.')   # for initials, abbreviations
-                    if len(part) < MIN_SUGGESTION_LENGTH:
-                        continue
-                    if (part.lower().startswith(query) and
-                        part not in suggestions):
-                            suggestions.append(part)
-                            if len(suggestions) < MAX_RESULTS:
-                                break
-                # Also match against the entire display name.
-                if (display_name.lower().startswith(query) and
-                    display_name not in suggestions):
-
-                    suggestions.append(display_name)
-
-        # If there is room in the suggestions list, add usernames.
-        # Although username does not show on pages if a display name takes
-        # its place, it does show in the profile link URL. Users might know
-        # or exchange usernames informally and expect to see them listed.
-        if len(suggestions) < MAX_RESULTS:
-            for name in names:
-                username = name.user.username
-                if (username.lower().find(query) > -1 and
-                    username not in suggestions):
-
-                    suggestions.append(username)
-                    if len(suggestions) == MAX_RESULTS:
-                        break
-
-        # Order the suggestions so any that start with the query string
-        # appear first.
-        suggestions = sorted(suggestions)
-        for suggestion in reversed(suggestions):
-            if suggestion.startswith(query):
-                ordered_suggestions.insert(0, suggestion)
-            else:
-                ordered_suggestions.append(suggestion)
-
-    return HttpResponse(json.dumps(ordered_suggestions),
+        # Suggest display names and their words (first, last, etc.), and
+        # also usernames: although a username does not show on pages if
+        # a display name takes its place, it does show in the profile
+        # link URL, and users might exchange usernames informally.
+        names = ProfileName.objects.filter(
+            visible_profile_names_q(request.user), name__startswith=query)
+        suggestions = list(names.order_by('text').values_list(
+            'text', flat=True).distinct()[:MAX_RESULTS])
+
+    return HttpResponse(json.dumps(suggestions),
                         content_type='application/json; charset=utf-8')
 
 
@@ -0,0 +1,408 @@
+"""An embedded Haystack search backend that needs no Solr server.
+
+Documents are kept in an inverted index of IndexedDocument and
+IndexedTerm rows in the site's own database, built from the same
+search_indexes.py definitions that feed Solr.  Queries are scored in
+Python with TF-IDF weighting, multiplied by each document's boost, so
+that the usual boosts, the `name__exact` promotion of the search view,
+and spelling suggestions all behave much as they do with Solr.
+
+To use it, point a Haystack connection at
+'gobotany.search.backends.EmbeddedSearchEngine'; settings.py makes it
+the default connection, in place of Solr, when $SEARCH_ENGINE is set to
+'embedded'.
+
+"""
+import difflib
+import json
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+from haystack.backends import (BaseEngine, BaseSearchBackend,
+                               BaseSearchQuery, SearchNode, log_query)
+from haystack.backends.solr_backend import SolrEngine, SolrSearchBackend
+from haystack.constants import DJANGO_CT, DJANGO_ID, ID
+from haystack.exceptions import SkipDocument
+from haystack.models import SearchResult
+from haystack.utils import get_identifier, get_model_ct
+
+from gobotany.search.models import IndexedDocument, IndexedTerm
+from gobotany.search.resultcache import bump_index_version
+
+# A document whose name is exactly what the user searched for scores
+# far above any document that merely mentions the query words.
+
+EXACT_MATCH_SCORE = 1000.0
+
+MAX_TERM_LENGTH = 100
+MORE_LIKE_THIS_TERMS = 25
+SPELLING_CUTOFF = 0.75
+
+word_re = re.compile(r'\w+', re.UNICODE)
+
+def tokenize(text):
+    """Split text into the lowercase terms stored in the index."""
+    return [word for word in word_re.findall(text.lower())
+            if len(word) <= MAX_TERM_LENGTH]
+
+# Queries are compiled into a small tree of clauses and terms, which the
+# backend evaluates against the inverted index.
+
+class Clause(object):
+    def __init__(self, connector, negated, children):
+        self.connector = connector
+        self.negated = negated
+        self.children = children
+
+    def content_words(self):
+        words = []
+        for child in self.children:
+            if not child.negated:
+                words.extend(child.content_words())
+        return words
+
+class Term(object):
+    def __init__(self, field, filter_type, value, negated=False):
+        self.field = field
+        self.filter_type = filter_type
+        self.value = value
+        self.negated = negated
+
+    def content_words(self):
+        if self.filter_type == 'exact':
+            return []
+        return [word for word, negated in self.words() if not negated]
+
+    def words(self):
+        """Return (word, negated) pairs, honoring "-word" exclusions."""
+        text = getattr(self.value, 'query_string', self.value)
+        if not isinstance(text, basestring):
+            text = unicode(text)
+        pairs = []
+        for token in text.split():
+            negated = token.startswith('-') and len(token) > 1
+            pairs.extend((word, negated) for word in tokenize(token))
+        return pairs
+
+class IndexVersionMixin(object):
+    """Bump the search index version whenever a backend changes the
+    index, so that cached pages of search results are dropped however
+    the index was changed, including by Haystack's own rebuild_index
+    and update_index commands."""
+
+    def update(self, index, iterable, commit=True):
+        super(IndexVersionMixin, self).update(index, iterable, commit=commit)
+        bump_index_version()
+
+    def remove(self, obj_or_string, commit=True):
+        super(IndexVersionMixin, self).remove(obj_or_string, commit=commit)
+        bump_index_version()
+
+    def clear(self, models=None, commit=True):
+        super(IndexVersionMixin, self).clear(models=models, commit=commit)
+        bump_index_version()
+
+class VersionedSolrSearchBackend(IndexVersionMixin, SolrSearchBackend):
+    pass
+
+class VersionedSolrEngine(SolrEngine):
+    backend = VersionedSolrSearchBackend
+
+class EmbeddedSearchBackend(BaseSearchBackend):
+
+    def update(self, index, iterable, commit=True):
+        content_field = index.get_content_field()
+        with transaction.atomic():
+            for obj in iterable:
+                try:
+                    data = index.full_prepare(obj)
+                except SkipDocument:
+                    continue
+                self._store(data, content_field)
+        bump_index_version()
+
+    def _store(self, data, content_field):
+        identifier = data.pop(ID)
+        boost = float(data.pop('boost', 1.0))
+        data.pop('textSpell', None)
+        IndexedDocument.objects.filter(identifier=identifier).delete()
+        document = IndexedDocument.objects.create(
+            identifier=identifier,
+            django_ct=data[DJANGO_CT],
+            django_id=data[DJANGO_ID],
+            name=(data.get('name') or u'').lower(),
+            boost=boost,
+            fields=json.dumps(data, default=unicode),
+            )
+        counts = Counter(tokenize(data.get(content_field) or u''))
+        IndexedTerm.objects.bulk_create(
+            IndexedTerm(document=document, term=term, frequency=frequency)
+            for term, frequency in counts.items())
+
+    def remove(self, obj_or_string, commit=True):
+        IndexedDocument.objects.filter(
+            identifier=get_identifier(obj_or_string)).delete()
+        bump_index_version()
+
+    def clear(self, models=None, commit=True):
+        documents = IndexedDocument.objects.all()
+        if models:
+            documents = documents.filter(
+                django_ct__in=[get_model_ct(model) for model in models])
+        IndexedTerm.objects.filter(document__in=documents).delete()
+        documents.delete()
+        bump_index_version()
+
+    @log_query
+    def search(self, query, start_offset=0, end_offset=None, models=None,
+               result_class=None, spelling_query=None, **kwargs):
+        if result_class is None:
+            result_class = SearchResult
+        self._document_count = None
+        self._term_cache = {}
+
+        if query is None:
+            scores = self._all_documents()
+        else:
+            scores = self._evaluate(query)
+
+        hits, results = self._results(scores, start_offset, end_offset,
+                                      models, result_class)
+
+        response = {'results': results, 'hits': hits, 'facets': {}}
+        if self.include_spelling:
+            if spelling_query is not None:
+                words = tokenize(spelling_query)
+            elif query is not None:
+                words = query.content_words()
+            else:
+                words = []
+            response['spelling_suggestion'] = self._suggest(words)
+        return response
+
+    def more_like_this(self, model_instance, additional_query_string=None,
+                       start_offset=0, end_offset=None, models=None,
+                       limit_to_registered_models=None, result_class=None,
+                       **kwargs):
+        """Find the documents sharing the most distinctive terms of an
+        object's document."""
+        if result_class is None:
+            result_class = SearchResult
+        self._document_count = None
+        self._term_cache = {}
+
+        identifier = get_identifier(model_instance)
+        frequencies = dict(IndexedTerm.objects.filter(
+            document__identifier=identifier).values_list('term', 'frequency'))
+        document_counts = dict(IndexedTerm.objects.filter(
+            term__in=list(frequencies)).values_list('term').annotate(
+            Count('id')))
+        total = float(self._count_documents())
+
+        def weight(term):
+            idf = math.log(1.0 + total / document_counts.get(term, 1))
+            return (1.0 + math.log(frequencies[term])) * idf
+
+        terms = sorted(frequencies, key=lambda term: (-weight(term), term))
+        scores = {}
+        for term in terms[:MORE_LIKE_THIS_TERMS]:
+            scores = self._combine('OR', scores, self._term_scores(term))
+        if additional_query_string:
+            scores = self._combine('AND', scores, self._evaluate_words(
+                [(word, False) for word in
+                 tokenize(additional_query_string)]))
+        for document_id in IndexedDocument.objects.filter(
+                identifier=identifier).values_list('id', flat=True):
+            scores.pop(document_id, None)
+
+        hits, results = self._results(scores, start_offset, end_offset,
+                                      models, result_class)
+        return {'results': results, 'hits': hits, 'facets': {}}
+
+    def _results(self, scores, start_offset, end_offset, models,
+                 result_class):
+        """Rank scored documents, and return the number of them along
+        with one page of them as results."""
+        if models:
+            cts = set(get_model_ct(model) for model in models)
+            scores = dict((document_id, (score, ct))
+                          for document_id, (score, ct) in scores.items()
+                          if ct in cts)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1][0], item[0]))
+        page = ranked[start_offset:end_offset]
+        documents = IndexedDocument.objects.in_bulk(
+            [document_id for document_id, score in page])
+
+        results = []
+        for document_id, (score, ct) in page:
+            document = documents.get(document_id)
+            if document is None:
+                continue
+            app_label, model_name = document.django_ct.split('.')
+            fields = json.loads(document.fields)
+            for key in (DJANGO_CT, DJANGO_ID):
+                fields.pop(key, None)
+            fields = dict((str(key), value) for key, value in fields.items())
+            results.append(result_class(app_label, model_name,
+                                        document.django_id, score, **fields))
+        return len(scores), results
+
+    # Scoring.  Each evaluation returns a dict that maps document ids to
+    # (score, django_ct) tuples.
+
+    def _count_documents(self):
+        if self._document_count is None:
+            self._document_count = IndexedDocument.objects.count()
+        return self._document_count
+
+    def _all_documents(self):
+        return dict(
+            (document_id, (boost, ct)) for document_id, boost, ct in
+            IndexedDocument.objects.values_list('id', 'boost', 'django_ct'))
+
+    def _term_scores(self, word):
+        scores = self._term_cache.get(word)
+        if scores is None:
+            rows = list(IndexedTerm.objects.filter(term=word).values_list(
+                'document_id', 'frequency', 'document__boost',
+                'document__django_ct'))
+            scores = {}
+            if rows:
+                idf = math.log(1.0 + self._count_documents() / float(len(rows)))
+                for document_id, frequency, boost, ct in rows:
+                    tf = 1.0 + math.log(frequency)
+                    scores[document_id] = (tf * idf * boost, ct)
+            self._term_cache[word] = scores
+        return scores
+
+    def _exact_scores(self, term):
+        value = unicode(getattr(term.value, 'query_string', term.value))
+        value = value.strip().lower()
+        if term.field == 'name':
+            rows = IndexedDocument.objects.filter(name=value).values_list(
+                'id', 'boost', 'django_ct')
+        else:
+            # Other fields are only stored, so they are compared one
+            # document at a time.
+            rows = []
+            for document_id, boost, ct, fields in (
+                    IndexedDocument.objects.values_list(
+                        'id', 'boost', 'django_ct', 'fields').iterator()):
+                stored = json.loads(fields).get(term.field)
+                if not isinstance(stored, list):
+                    stored = [stored]
+                if any(item is not None and
+                       unicode(item).strip().lower() == value
+                       for item in stored):
+                    rows.append((document_id, boost, ct))
+        return dict((document_id, (EXACT_MATCH_SCORE * boost, ct))
+                    for document_id, boost, ct in rows)
+
+    def _evaluate(self, node):
+        if isinstance(node, Term):
+            if node.filter_type == 'exact':
+                scores = self._exact_scores(node)
+            else:
+                scores = self._evaluate_words(node.words())
+        else:
+            scores = self._evaluate_clause(node)
+        if node.negated:
+            scores = self._complement(scores)
+        return scores
+
+    def _evaluate_words(self, pairs):
+        """All of the words must appear, and none of the negated words."""
+        scores = None
+        excluded = set()
+        for word, negated in pairs:
+            word_scores = self._term_scores(word)
+            if negated:
+                excluded.update(word_scores)
+            else:
+                scores = self._combine('AND', scores, word_scores)
+        if scores is None:
+            scores = self._all_documents() if excluded else {}
+        for document_id in excluded:
+            scores.pop(document_id, None)
+        return scores
+
+    def _evaluate_clause(self, clause):
+        scores = None
+        for child in clause.children:
+            scores = self._combine(clause.connector, scores,
+                                   self._evaluate(child))
+        return scores or {}
+
+    def _combine(self, connector, scores, other):
+        if scores is None:
+            return dict(other)
+        combined = {}
+        if connector == 'OR':
+            for document_id in set(scores) | set(other):
+                score, ct = scores.get(document_id, (0.0, None))
+                other_score, other_ct = other.get(document_id, (0.0, ct))
+                combined[document_id] = (score + other_score, ct or other_ct)
+        else:
+            for document_id in set(scores) & set(other):
+                score, ct = scores[document_id]
+                combined[document_id] = (score + other[document_id][0], ct)
+        return combined
+
+    def _complement(self, scores):
+        return dict((document_id, (0.0, ct)) for document_id, (boost, ct)
+                    in self._all_documents().items()
+                    if document_id not in scores)
+
+    # Spelling.
+
+    def _suggest(self, words):
+        """Replace each unknown word with the closest indexed term."""
+        suggestion = []
+        for word in words:
+            if self._term_scores(word):
+                suggestion.append(word)
+                continue
+            candidates = (IndexedTerm.objects.filter(term__startswith=word[0])
+                          .values_list('term', flat=True).distinct())
+            matches = difflib.get_close_matches(word, list(candidates), 1,
+                                                SPELLING_CUTOFF)
+            suggestion.append(matches[0] if matches else word)
+        if suggestion == list(words):
+            return None
+        return u' '.join(suggestion)
+
+class EmbeddedSearchQuery(BaseSearchQuery):
+
+    def build_query(self):
+        """Compile the filters into a tree for the backend to evaluate.
+
+        Returns None when there are no filters, which matches every
+        document.
+
+        """
+        if not self.query_filter:
+            return None
+        return self._compile(self.query_filter)
+
+    def _compile(self, node):
+        children = []
+        for child in node.children:
+            if isinstance(child, SearchNode):
+                children.append(self._compile(child))
+            else:
+                expression, value = child
+                field, filter_type = node.split_expression(expression)
+                children.append(Term(field, filter_type, value))
+        return Clause(node.connector, node.negated, children)
+
+    def build_query_fragment(self, field, filter_type, value):
+        return u'{}__{}={}'.format(field, filter_type,
+                                   getattr(value, 'query_string', value))
+
+class EmbeddedSearchEngine(BaseEngine):
+    backend = EmbeddedSearchBackend
+    query = EmbeddedSearchQuery
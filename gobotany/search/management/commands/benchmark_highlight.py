@@ -0,0 +1,58 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from haystack import connections
+from haystack.utils import Highlighter
+
+from gobotany.core.models import Taxon
+from gobotany.search.highlight import ExtendedHighlighter
+
+DEFAULT_QUERIES = [
+    'leaves', 'red maple', 'leaves opposite toothed', 'fern', 'wetland',
+    ]
+
+def species_texts(count):
+    """Return the indexed text of the species with the longest documents."""
+    taxa = (Taxon.objects.annotate(value_count=Count('character_values'))
+            .order_by('-value_count')[:count])
+    index = connections['default'].get_unified_index().get_index(Taxon)
+    return [(taxon.scientific_name, index.full_prepare(taxon)['text'])
+            for taxon in taxa]
+
+class Command(BaseCommand):
+    """Time excerpt highlighting on long species descriptions.
+
+    Compares Haystack's own Highlighter with our ExtendedHighlighter:
+
+    dev/django benchmark_highlight [--species 10] [query ...]
+    """
+    help = 'Time search excerpt highlighting on long species text'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*',
+            help='Queries to highlight (default: a set of typical queries)')
+        parser.add_argument('--species', type=int, dest='species',
+            default=10, help='Number of species texts to highlight')
+        parser.add_argument('--repeat', type=int, dest='repeat', default=20,
+            help='Number of times to highlight each text')
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or DEFAULT_QUERIES
+        texts = species_texts(options['species'])
+        repeat = max(options['repeat'], 1)
+
+        self.stdout.write(u'{:<30} {:>7} {:<24} {:>11} {:>11}'.format(
+            'Species', 'Chars', 'Query', 'Haystack ms', 'Ours ms'))
+        for name, text in texts:
+            for query in queries:
+                times = []
+                for highlighter_class in (Highlighter, ExtendedHighlighter):
+                    highlighter = highlighter_class(query)
+                    times.append(min(timeit.repeat(
+                        lambda: highlighter.highlight(text),
+                        number=1, repeat=repeat)))
+                self.stdout.write(
+                    u'{:<30} {:>7} {:<24} {:>11.3f} {:>11.3f}'.format(
+                        name[:30], len(text), query[:24],
+                        times[0] * 1000.0, times[1] * 1000.0))
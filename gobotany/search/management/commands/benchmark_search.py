@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from haystack.query import SearchQuerySet
+
+DEFAULT_QUERIES = [
+    'acer', 'red maple', 'christmas fern', 'carex', 'sapindaceae',
+    'leaves opposite', 'aster', 'trees', 'dichotomous key', 'wetland',
+    ]
+
+def run_query(using, query, page_size):
+    """Run a query the way the search page does; return the hit count."""
+    sqs = SearchQuerySet(using=using).auto_query(query).filter_or(
+        name__exact=query.lower())
+    list(sqs[:page_size])
+    return sqs.count()
+
+class Command(BaseCommand):
+    """Time the same queries against several Haystack connections.
+
+    For example, to compare Solr with the embedded search index:
+
+    dev/django benchmark_search --using solr --using embedded
+    """
+    help = 'Compare query times across search backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*',
+            help='Queries to run (default: a set of typical queries)')
+        parser.add_argument('--using', action='append', dest='using',
+            help='Haystack connection to time; may be repeated')
+        parser.add_argument('--repeat', type=int, dest='repeat', default=5,
+            help='Number of times to run each query')
+        parser.add_argument('--page-size', type=int, dest='page_size',
+            default=settings.HAYSTACK_SEARCH_RESULTS_PER_PAGE,
+            help='Number of results to fetch for each query')
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or DEFAULT_QUERIES
+        aliases = options['using'] or sorted(settings.HAYSTACK_CONNECTIONS)
+        repeat = max(options['repeat'], 1)
+
+        for using in aliases:
+            total = 0.0
+            for query in queries:
+                times = []
+                for i in range(repeat):
+                    start = time.time()
+                    hits = run_query(using, query, options['page_size'])
+                    times.append(time.time() - start)
+                best = min(times)
+                total += best
+                self.stdout.write(u'{:<10} {:<20} {:>6} hits {:>9.1f} ms'
+                                  .format(using, query, hits, best * 1000.0))
+            self.stdout.write(u'{:<10} {:<20} {:>16.1f} ms'.format(
+                using, 'total', total * 1000.0))
@@ -0,0 +1,96 @@
+import time
+from multiprocessing import Pool, cpu_count
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections as db_connections
+from haystack import connections
+
+from gobotany.search.resultcache import bump_index_version
+
+DEFAULT_BATCH_SIZE = 250
+
+def _model_label(model):
+    return '{}.{}'.format(model._meta.app_label, model._meta.model_name)
+
+def id_ranges(ids, batch_size):
+    """Split a sorted list of ids into inclusive (first, last) ranges."""
+    return [(ids[i], ids[min(i + batch_size, len(ids)) - 1])
+            for i in range(0, len(ids), batch_size)]
+
+def _index_range(args):
+    """Render and send one ID range of one index; runs in a worker."""
+    using, model_label, first_id, last_id = args
+    model = apps.get_model(model_label)
+    index = connections[using].get_unified_index().get_index(model)
+    objects = list(index.index_queryset(using=using)
+                   .filter(pk__gte=first_id, pk__lte=last_id))
+    if objects:
+        connections[using].get_backend().update(index, objects)
+    return len(objects)
+
+class Command(BaseCommand):
+    """Rebuild search indexes using several worker processes.
+
+    Each index's queryset is split into ranges of object IDs, and each
+    worker process renders the documents for one range at a time from
+    the prefetching index queryset and sends them to the backend as a
+    batch.  Reports the documents per second achieved for each index:
+
+    dev/django parallel_update_index --clear --workers 4
+    """
+    help = 'Rebuild search indexes in parallel, in batches of object IDs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('models', nargs='*', metavar='app_label.model',
+            help='Models whose indexes to rebuild (default: all)')
+        parser.add_argument('--workers', type=int, dest='workers',
+            default=cpu_count(), help='Number of worker processes')
+        parser.add_argument('--batch-size', type=int, dest='batch_size',
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of objects to send to the backend at a time')
+        parser.add_argument('--clear', action='store_true', dest='clear',
+            default=False, help='Remove existing documents first')
+        parser.add_argument('--using', dest='using', default='default',
+            help='Haystack connection to update')
+
+    def handle(self, *args, **options):
+        using = options['using']
+        unified_index = connections[using].get_unified_index()
+        indexes = unified_index.get_indexes()
+
+        models = sorted(indexes, key=_model_label)
+        if options['models']:
+            wanted = set(label.lower() for label in options['models'])
+            models = [model for model in models
+                      if _model_label(model) in wanted]
+
+        if options['clear']:
+            connections[using].get_backend().clear(models=models)
+
+        # Worker processes must open their own database connections.
+        db_connections.close_all()
+        pool = Pool(processes=max(options['workers'], 1))
+        try:
+            for model in models:
+                self._update_index(pool, using, model, indexes[model],
+                                   options['batch_size'])
+        finally:
+            pool.close()
+            pool.join()
+        bump_index_version()
+
+    def _update_index(self, pool, using, model, index, batch_size):
+        label = _model_label(model)
+        ids = list(index.index_queryset(using=using).prefetch_related(None)
+                   .order_by('pk').values_list('pk', flat=True))
+        tasks = [(using, label, first_id, last_id)
+                 for first_id, last_id in id_ranges(ids, batch_size)]
+
+        start = time.time()
+        count = sum(pool.imap_unordered(_index_range, tasks))
+        elapsed = time.time() - start
+
+        rate = count / elapsed if elapsed > 0 else 0.0
+        self.stdout.write('{}: {} documents in {:.1f}s ({:.1f}/s)'.format(
+            label, count, elapsed, rate))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gobotany.search.signals import DEFAULT_BATCH_SIZE, flush_queue
+
+class Command(BaseCommand):
+    """Send queued search index updates to the search backend.
+
+    Saves and deletes of indexed models are queued by the
+    QueuedSignalProcessor; this command flushes them in batches.  With
+    --interval it keeps flushing the queue, as the Procfile's
+    "searchqueue" does:
+
+    dev/django process_search_queue --interval 5
+    """
+    help = 'Send queued search index updates to the search backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, dest='batch_size',
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of queued updates to process at a time')
+        parser.add_argument('--using', dest='using', default='default',
+            help='Haystack connection to update')
+        parser.add_argument('--interval', type=int, dest='interval',
+            default=None,
+            help='Keep running, flushing the queue every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            counts = flush_queue(batch_size=options['batch_size'],
+                                 using=options['using'])
+            for model_name, count in sorted(counts.items()):
+                self.stdout.write('{}: {} documents'.format(model_name, count))
+            if not interval:
+                if not counts:
+                    self.stdout.write('The search index queue is empty.')
+                break
+            time.sleep(interval)
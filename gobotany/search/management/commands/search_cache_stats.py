@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from gobotany.search import resultcache
+
+class Command(BaseCommand):
+    """Report how often pages of search results are served from cache.
+
+    The counts are shared by every process using the cache:
+
+    dev/django search_cache_stats [--reset]
+    """
+    help = 'Report the hit rate of the search result cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', dest='reset',
+            default=False, help='Start counting again from zero')
+
+    def handle(self, *args, **options):
+        stats = resultcache.stats()
+        self.stdout.write('hits: {hits}\nmisses: {misses}\n'
+                          'hit rate: {hit_rate:.1%}'.format(**stats))
+        if options['reset']:
+            resultcache.reset_stats()
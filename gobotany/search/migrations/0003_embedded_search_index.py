@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_queuedindexupdate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexedDocument',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('identifier', models.CharField(unique=True, max_length=255)),
+                ('django_ct', models.CharField(max_length=100, db_index=True)),
+                ('django_id', models.CharField(max_length=100)),
+                ('name', models.TextField(db_index=True, blank=True)),
+                ('boost', models.FloatField(default=1.0)),
+                ('fields', models.TextField()),
+            ],
+            options={
+                'verbose_name': 'indexed document',
+                'verbose_name_plural': 'indexed documents',
+            },
+        ),
+        migrations.CreateModel(
+            name='IndexedTerm',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('term', models.CharField(max_length=100, db_index=True)),
+                ('frequency', models.PositiveIntegerField()),
+                ('document', models.ForeignKey(related_name='terms', to='search.IndexedDocument')),
+            ],
+            options={
+                'verbose_name': 'indexed term',
+                'verbose_name_plural': 'indexed terms',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0003_embedded_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queuedindexupdate',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,5 +1,6 @@
 import re
 
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 
 from gobotany.core.models import Pile, PileGroup
@@ -128,3 +129,58 @@ class SubgroupResultsPage(models.Model):
             [self.subgroup.friendly_name, self.subgroup.friendly_title])
 
         return suggestions
+
+
+class QueuedIndexUpdate(models.Model):
+    """A model instance whose search index document needs refreshing.
+
+    Saves and deletes only record one of these rows, instead of posting
+    to Solr inside the request; see gobotany.search.signals.
+    """
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField()
+    deleted = models.BooleanField(default=False)
+    queued = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'queued index update'
+        verbose_name_plural = 'queued index updates'
+
+    def __unicode__(self):
+        return u'%s %s.%s' % ('delete' if self.deleted else 'update',
+                              self.content_type.model, self.object_id)
+
+
+# An inverted index for the embedded search backend, which lets the site
+# search without a Solr server; see gobotany.search.backends.
+
+class IndexedDocument(models.Model):
+    """A search document stored by the embedded search backend."""
+    identifier = models.CharField(max_length=255, unique=True)
+    django_ct = models.CharField(max_length=100, db_index=True)
+    django_id = models.CharField(max_length=100)
+    name = models.TextField(blank=True, db_index=True)
+    boost = models.FloatField(default=1.0)
+    fields = models.TextField()
+
+    class Meta:
+        verbose_name = 'indexed document'
+        verbose_name_plural = 'indexed documents'
+
+    def __unicode__(self):
+        return self.identifier
+
+
+class IndexedTerm(models.Model):
+    """How many times a term appears in the text of a search document."""
+    document = models.ForeignKey(IndexedDocument, related_name='terms')
+    term = models.CharField(max_length=100, db_index=True)
+    frequency = models.PositiveIntegerField()
+
+    class Meta:
+        verbose_name = 'indexed term'
+        verbose_name_plural = 'indexed terms'
+
+    def __unicode__(self):
+        return u'%s: %s' % (self.term, self.frequency)
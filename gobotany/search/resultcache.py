@@ -0,0 +1,83 @@
+"""Cache the rendered results of popular searches.
+
+Without a cache, each request for the search page queries Solr and runs
+the highlighter over the text of every result on the page.  The search
+view instead stores the rendered list of results for each page of each
+query, keyed by the normalized query and the page number, under a cache
+version that is bumped whenever the search index changes.  The search
+backends bump it themselves each time they update, remove or clear
+documents, so that Haystack's own `rebuild_index` and `update_index`
+commands, as run by bin/load, drop stale pages too; it is also bumped
+when queued index updates are flushed and after `parallel_update_index`.
+
+Hits and misses are counted in the cache itself, so that the hit rate
+across every process can be checked with `dev/django search_cache_stats`
+when deciding how large the cache needs to be.
+
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+INDEX_VERSION_KEY = 'search-index-version'
+HITS_KEY = 'search-cache-hits'
+MISSES_KEY = 'search-cache-misses'
+
+whitespace_re = re.compile(r'\s+', re.UNICODE)
+
+def normalize_query(query):
+    """Reduce a query to the form under which its results are cached."""
+    return whitespace_re.sub(u' ', query).strip().lower()
+
+def page_key(query, page_number):
+    """Return the cache key for one page of results for `query`."""
+    digest = hashlib.md5(normalize_query(query).encode('utf-8')).hexdigest()
+    return 'search-results:{}:{}'.format(digest, page_number)
+
+def index_version():
+    """Return the current version of the search index."""
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        version = 0
+    return version
+
+def bump_index_version():
+    """Tell every process that its cached search results are stale."""
+    _increment(INDEX_VERSION_KEY)
+
+def lookup(key, version):
+    """Return the cached results for `key`, or None, counting the outcome."""
+    timeout = settings.SEARCH_RESULT_CACHE_TIMEOUT
+    if not timeout:
+        return None
+    value = cache.get(key, version=version)
+    _increment(MISSES_KEY if value is None else HITS_KEY)
+    return value
+
+def store(key, value, version):
+    timeout = settings.SEARCH_RESULT_CACHE_TIMEOUT
+    if timeout:
+        cache.set(key, value, timeout, version=version)
+
+def stats():
+    """Return the hit and miss counts, and the hit rate, of the cache."""
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counts.get(HITS_KEY, 0)
+    misses = counts.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / float(lookups) if lookups else 0.0,
+        }
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
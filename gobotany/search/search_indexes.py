@@ -30,10 +30,11 @@ class CharacterCharField(indexes.CharField):
         return self.convert(self.lookup_character_value(obj) or self.default)
 
     def lookup_character_value(self, obj):
-        cvs = obj.character_values.filter(
-            character__short_name=self.character_name)
-        if len(cvs) > 0:
-            return cvs[0].value
+        # Scan all() instead of filtering, so that the character values
+        # prefetched by the index queryset are used without a query.
+        for cv in obj.character_values.all():
+            if cv.character.short_name == self.character_name:
+                return cv.value
         return None
 
 
@@ -102,6 +103,7 @@ class TaxonIndex(BaseIndex, indexes.Indexable):
                 .prefetch_related(
                     'character_values__character',
                     'common_names',
+                    'conservation_statuses',
                     'lookalikes',
                     'piles__pilegroup',
                     'synonyms'))
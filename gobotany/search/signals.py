@@ -0,0 +1,207 @@
+"""Queue search index updates instead of sending them to Solr at once.
+
+Haystack's RealtimeSignalProcessor posts each saved object to Solr from
+inside the request that saved it, which makes bulk edits in the admin
+and the editor slow.  The QueuedSignalProcessor here instead records a
+QueuedIndexUpdate row for each save or delete of an indexed model.  The
+queue is flushed in batches by `dev/django process_search_queue`, or by
+a background thread in each process when SEARCH_QUEUE_INTERVAL is set.
+Repeated updates of the same object collapse into a single document
+update when the queue is flushed.
+
+Sites that still want immediate updates can instead use the
+RealtimeSignalProcessor here, which is Haystack's own extended so that,
+like the queue, it invalidates the cached pages of search results in
+`gobotany.search.resultcache` whenever it changes the index.
+
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import F
+from haystack import connections
+from haystack import signals as haystack_signals
+from haystack.exceptions import NotHandled
+from haystack.signals import BaseSignalProcessor
+
+from gobotany.search.models import QueuedIndexUpdate
+from gobotany.search.resultcache import bump_index_version
+
+log = logging.getLogger('gobotany.search')
+
+DEFAULT_BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """Record saves and deletes of indexed models in the index queue."""
+
+    def handle_save(self, sender, instance, **kwargs):
+        self._enqueue(sender, instance, deleted=False)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        self._enqueue(sender, instance, deleted=True)
+
+    def _enqueue(self, sender, instance, deleted):
+        usings = self.connection_router.for_write(instance=instance)
+        if not any(sender in self.connections[using].get_unified_index()
+                   .get_indexed_models() for using in usings):
+            return
+        QueuedIndexUpdate.objects.create(
+            content_type=ContentType.objects.get_for_model(sender),
+            object_id=instance.pk, deleted=deleted)
+        start_worker()
+
+class RealtimeSignalProcessor(haystack_signals.RealtimeSignalProcessor):
+    """Haystack's realtime processor, also invalidating cached results."""
+
+    def handle_save(self, sender, instance, **kwargs):
+        super(RealtimeSignalProcessor, self).handle_save(
+            sender, instance, **kwargs)
+        self._invalidate(sender, instance)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        super(RealtimeSignalProcessor, self).handle_delete(
+            sender, instance, **kwargs)
+        self._invalidate(sender, instance)
+
+    def _invalidate(self, sender, instance):
+        usings = self.connection_router.for_write(instance=instance)
+        if any(sender in self.connections[using].get_unified_index()
+               .get_indexed_models() for using in usings):
+            bump_index_version()
+
+def flush_queue(batch_size=DEFAULT_BATCH_SIZE, using='default'):
+    """Send every queued update to the search backend, in batches.
+
+    If updating the documents of a model fails, its queued updates are
+    kept for the next flush, while the rest of the batch is sent and
+    dropped from the queue as usual.  Updates that have failed
+    MAX_ATTEMPTS times are dropped too, so that one document that cannot
+    be indexed does not hold up the queue forever.
+
+    Returns a dict mapping each model name to the number of documents
+    updated or removed for it.
+
+    """
+    backend = connections[using].get_backend()
+    unified_index = connections[using].get_unified_index()
+    counts = defaultdict(int)
+    last_id = 0
+
+    while True:
+        rows = list(QueuedIndexUpdate.objects.filter(id__gt=last_id)
+                    .order_by('id').values_list(
+                        'id', 'content_type_id', 'object_id', 'deleted',
+                        'attempts')[:batch_size])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        # Later entries for the same object supersede earlier ones.
+        latest = OrderedDict()
+        for id, content_type_id, object_id, deleted, attempts in rows:
+            latest.pop((content_type_id, object_id), None)
+            latest[content_type_id, object_id] = deleted
+
+        updates = defaultdict(list)
+        removals = defaultdict(list)
+        for (content_type_id, object_id), deleted in latest.items():
+            if deleted:
+                removals[content_type_id].append(object_id)
+            else:
+                updates[content_type_id].append(object_id)
+
+        failed_content_type_ids = set()
+        for content_type_id in set(updates) | set(removals):
+            content_type = ContentType.objects.get_for_id(content_type_id)
+            try:
+                counts[content_type.model] += _send_updates(
+                    backend, unified_index, using, content_type,
+                    updates[content_type_id], removals[content_type_id])
+            except Exception:
+                log.exception('Cannot update the search index for %s',
+                              content_type.model)
+                failed_content_type_ids.add(content_type_id)
+
+        retry_ids = []
+        for id, content_type_id, object_id, deleted, attempts in rows:
+            if content_type_id not in failed_content_type_ids:
+                continue
+            if attempts + 1 < MAX_ATTEMPTS:
+                retry_ids.append(id)
+            else:
+                log.error('Giving up on the search index update of %s.%s',
+                          content_type_id, object_id)
+        QueuedIndexUpdate.objects.filter(id__in=retry_ids).update(
+            attempts=F('attempts') + 1)
+        QueuedIndexUpdate.objects.filter(
+            id__in=[row[0] for row in rows]).exclude(
+            id__in=retry_ids).delete()
+
+    if counts:
+        bump_index_version()
+    return dict(counts)
+
+def _send_updates(backend, unified_index, using, content_type, object_ids,
+                  removed_ids):
+    """Update and remove the documents of one model, returning how many
+    documents were sent."""
+    model = content_type.model_class()
+    try:
+        index = unified_index.get_index(model)
+    except NotHandled:
+        return 0
+
+    # Objects that no longer belong in the index, like sightings that
+    # have been made private, are removed from it.
+    objects = list(index.index_queryset(using=using)
+                   .filter(pk__in=object_ids)) if object_ids else []
+    if objects:
+        backend.update(index, objects)
+    found_ids = set(obj.pk for obj in objects)
+    stale_ids = removed_ids + [object_id for object_id in object_ids
+                               if object_id not in found_ids]
+    for object_id in stale_ids:
+        backend.remove(u'{}.{}.{}'.format(
+            content_type.app_label, content_type.model, object_id))
+    return len(objects) + len(stale_ids)
+
+# An optional background thread that flushes the queue periodically.
+
+_worker_lock = threading.Lock()
+_worker = [None]
+
+def start_worker():
+    """Start this process's flushing thread, if configured and not running.
+
+    The thread is started lazily from the first queued update, so that
+    it runs inside each web worker process rather than in a parent
+    process that later forks.
+
+    """
+    interval = getattr(settings, 'SEARCH_QUEUE_INTERVAL', None)
+    if not interval:
+        return
+    with _worker_lock:
+        if _worker[0] is not None and _worker[0].is_alive():
+            return
+        thread = threading.Thread(target=_run_worker, args=(interval,),
+                                  name='search-queue-worker')
+        thread.daemon = True
+        thread.start()
+        _worker[0] = thread
+
+def _run_worker(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush_queue()
+        except Exception:
+            log.exception('Cannot flush the search index queue')
+        finally:
+            connection.close()
@@ -5,20 +5,22 @@ from django.utils.safestring import mark_safe
 
 from haystack.templatetags.highlight import HighlightNode
 
-from gobotany.search.highlight import ExtendedHighlighter
+from gobotany.search.highlight import ExtendedHighlighter, cached_pattern
 
 register = template.Library()
 
-html_escape_dict = {
-    '&': '&amp;',
-    '"': '&quot;',
-    "'": '&#39;',
-    '>': '&gt;',
-    '<': '&lt;',
-    }
+html_escapes = (
+    ('&', '&amp;'),   # first, so as not to re-escape the other entities
+    ('"', '&quot;'),
+    ("'", '&#39;'),
+    ('>', '&gt;'),
+    ('<', '&lt;'),
+    )
 
 def html_escape(text):
-    return "".join(html_escape_dict.get(c,c) for c in text)
+    for character, entity in html_escapes:
+        text = text.replace(character, entity)
+    return text
 
 
 class ExtendedHighlightNode(HighlightNode):
@@ -164,6 +166,13 @@ def search_highlight(parser, token):
 
 element_re = re.compile('(<[^>]*>)')
 
+_quick_patterns = {}
+
+def _compile_quick(words):
+    escaped_words = (re.escape(word) for word in words)
+    word_match = u'|'.join(ur'\b{}\b'.format(word) for word in escaped_words)
+    return re.compile(word_match, flags=re.I)
+
 @register.filter
 def quick_highlight(text, query):
     """Quick highlighter, for situations where complexity causes trouble.
@@ -184,9 +193,8 @@ def quick_highlight(text, query):
     # Otherwise, we prepare to highlight any query word that we happen
     # to find within the text.
 
-    escaped_words = (re.escape(word) for word in words)
-    word_match = u'|'.join(ur'\b{}\b'.format(word) for word in escaped_words)
-    words_re = re.compile(word_match, flags=re.I)
+    words_re = cached_pattern(_quick_patterns, tuple(words),
+                              lambda: _compile_quick(words))
 
     # We step across the even-numbered elements in our list, to only
     # highlight within non-element stretches of text.
@@ -1,11 +1,25 @@
 import requests
 import unittest
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test.client import RequestFactory
+from django.test.signals import template_rendered
 from django.test.testcases import TestCase
+from django.test.utils import override_settings
+from haystack import connections
+from haystack.forms import HighlightedSearchForm
+from haystack.query import SearchQuerySet
 from haystack.utils import Highlighter
 from highlight import ExtendedHighlighter
 
+from gobotany.core.models import Family
 from gobotany.libtest import FunctionalCase
+from gobotany.search import highlight, resultcache, signals
+from gobotany.search.management.commands.parallel_update_index import (
+    id_ranges)
+from gobotany.search.models import PlainPage, QueuedIndexUpdate
+from gobotany.search.views import GoBotanySearchView
 
 
 @unittest.skip('Skipping tests that run against the real database')
@@ -816,6 +830,266 @@ class ExtendedHighlighterTestCase(HaystackHighlighterTestCase):
                     '<span class="highlighted">highlight</span>.')
         self.assertEqual(expected, highlighter.highlight(text))
 
+    def test_overlapping_words_are_found_like_haystack(self):
+        text = 'Highlighting the highlights of a high hill.'
+        query = 'high highlight hi'
+        ours = self.new_highlighter(query)
+        ours.text_block = text
+        theirs = Highlighter(query)
+        theirs.text_block = text
+        self.assertEqual(ours.find_highlightable_words(),
+                         theirs.find_highlightable_words())
+
+    def test_densest_window_matches_haystack(self):
+        text = ('one leaf here. ' + 'filler ' * 40 +
+                'leaf leaf opposite leaf. ' + 'filler ' * 40 + 'leaf')
+        query = 'leaf opposite'
+        locations = Highlighter(query)
+        locations.text_block = text
+        locations = locations.find_highlightable_words()
+        self.assertEqual(
+            self.new_highlighter(query).find_window(locations),
+            Highlighter(query).find_window(locations))
+
+    def test_query_patterns_are_cached(self):
+        first = self.new_highlighter('red maple')
+        second = self.new_highlighter('Maple RED')
+        first.highlight('Acer rubrum, the red maple.')
+        pattern_count = len(highlight._word_patterns)
+        second.highlight('A red maple.')
+        self.assertEqual(len(highlight._word_patterns), pattern_count)
+
+
+class _FakeBackend(object):
+    def __init__(self):
+        self.updated = []
+        self.removed = []
+
+    def update(self, index, iterable, commit=True):
+        self.updated.extend(iterable)
+
+    def remove(self, obj_or_string, commit=True):
+        self.removed.append(obj_or_string)
+
+
+class _FakeConnection(object):
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get_backend(self):
+        return self.backend
+
+    def get_unified_index(self):
+        return connections['default'].get_unified_index()
+
+
+class QueuedSignalProcessorTestCase(TestCase):
+
+    def setUp(self):
+        self.backend = _FakeBackend()
+        self.real_connections = signals.connections
+        signals.connections = {'default': _FakeConnection(self.backend)}
+
+    def tearDown(self):
+        signals.connections = self.real_connections
+
+    def test_saves_are_queued(self):
+        family = Family.objects.create(name='Sapindaceae')
+        family.save()
+        self.assertEqual(QueuedIndexUpdate.objects.filter(
+            object_id=family.pk, deleted=False).count(), 2)
+        self.assertEqual(self.backend.updated, [])
+
+    def test_flush_collapses_duplicate_updates(self):
+        family = Family.objects.create(name='Sapindaceae')
+        family.save()
+        family.save()
+        counts = signals.flush_queue()
+        self.assertEqual(counts, {'family': 1})
+        self.assertEqual(self.backend.updated, [family])
+        self.assertEqual(QueuedIndexUpdate.objects.count(), 0)
+
+    def test_flush_removes_deleted_objects(self):
+        family = Family.objects.create(name='Sapindaceae')
+        pk = family.pk
+        family.delete()
+        signals.flush_queue()
+        self.assertEqual(self.backend.updated, [])
+        self.assertEqual(self.backend.removed, ['core.family.%d' % pk])
+
+    def test_failing_model_does_not_hold_up_the_queue(self):
+        def update(index, iterable, commit=True):
+            if index.get_model() is Family:
+                raise IOError('Solr is unhappy')
+            self.backend.updated.extend(iterable)
+        self.backend.update = update
+        Family.objects.create(name='Sapindaceae')
+        page = PlainPage.objects.create(title='Help', url_path='/help/',
+                                        search_text='help')
+        counts = signals.flush_queue()
+        self.assertEqual(counts, {'plainpage': 1})
+        self.assertEqual(self.backend.updated, [page])
+        queued = QueuedIndexUpdate.objects.get()
+        self.assertEqual(queued.content_type.model, 'family')
+        self.assertEqual(queued.attempts, 1)
+        for attempt in range(signals.MAX_ATTEMPTS - 1):
+            signals.flush_queue()
+        self.assertEqual(QueuedIndexUpdate.objects.count(), 0)
+
+    def test_flush_invalidates_cached_results(self):
+        version = resultcache.index_version()
+        Family.objects.create(name='Sapindaceae')
+        signals.flush_queue()
+        self.assertNotEqual(resultcache.index_version(), version)
+
+
+@override_settings(SEARCH_RESULT_CACHE_TIMEOUT=60)
+class ResultCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_key_ignores_case_and_spacing(self):
+        self.assertEqual(resultcache.page_key(u'Christmas  fern ', 1),
+                         resultcache.page_key(u'christmas fern', 1))
+        self.assertNotEqual(resultcache.page_key(u'christmas fern', 1),
+                            resultcache.page_key(u'christmas fern', 2))
+
+    def test_bumping_the_version_invalidates_results(self):
+        key = resultcache.page_key(u'acer', 1)
+        version = resultcache.index_version()
+        resultcache.store(key, {'count': 3}, version)
+        self.assertEqual(resultcache.lookup(key, version), {'count': 3})
+        resultcache.bump_index_version()
+        self.assertEqual(
+            resultcache.lookup(key, resultcache.index_version()), None)
+
+    def test_hit_rate(self):
+        key = resultcache.page_key(u'acer', 1)
+        resultcache.lookup(key, 0)
+        resultcache.store(key, {'count': 3}, 0)
+        resultcache.lookup(key, 0)
+        resultcache.lookup(key, 0)
+        self.assertEqual(resultcache.stats(),
+                         {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3.0})
+
+    def test_cached_page_keeps_spelling_suggestion(self):
+        family = Family.objects.create(name='Aceraceae',
+                                       common_name='maple family')
+        embedded = connections['embedded']
+        embedded.get_backend().update(
+            embedded.get_unified_index().get_index(Family), [family])
+
+        class SuggestingForm(HighlightedSearchForm):
+            def get_suggestion(self):
+                return u'acer'
+
+        view = GoBotanySearchView(template='search.html',
+                                  form_class=SuggestingForm,
+                                  searchqueryset=SearchQuerySet(
+                                      using='embedded'))
+        suggestions = []
+        def rendered(sender, template, context, **kwargs):
+            if template.name == 'search.html':
+                suggestions.append(context.get('suggestion'))
+        template_rendered.connect(rendered)
+        try:
+            for i in range(2):
+                request = RequestFactory().get('/search/', {'q': 'maple'})
+                request.user = AnonymousUser()
+                view(request)
+        finally:
+            template_rendered.disconnect(rendered)
+        self.assertEqual(suggestions, [u'acer', u'acer'])
+        self.assertEqual(resultcache.stats()['hits'], 1)
+
+    @override_settings(SEARCH_RESULT_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        key = resultcache.page_key(u'acer', 1)
+        resultcache.store(key, {'count': 3}, 0)
+        self.assertEqual(resultcache.lookup(key, 0), None)
+
+
+class IdRangesTestCase(TestCase):
+
+    def test_ranges_cover_every_id(self):
+        self.assertEqual(id_ranges([1, 2, 5, 9, 10], 2),
+                         [(1, 2), (5, 9), (10, 10)])
+
+    def test_no_ids(self):
+        self.assertEqual(id_ranges([], 100), [])
+
+
+class EmbeddedSearchBackendTestCase(TestCase):
+
+    def setUp(self):
+        self.backend = connections['embedded'].get_backend()
+        self.backend.include_spelling = True
+        self.index = connections['embedded'].get_unified_index().get_index(
+            Family)
+        self.families = [
+            Family.objects.create(name='Sapindaceae',
+                                  common_name='soapberry family',
+                                  description='Maples and relatives.'),
+            Family.objects.create(name='Aceraceae',
+                                  common_name='maple family',
+                                  description='Maples of old. Maples.'),
+            Family.objects.create(name='Betulaceae',
+                                  common_name='birch family'),
+            ]
+        self.backend.update(self.index, self.families)
+
+    def _search(self, query):
+        return SearchQuerySet(using='embedded').auto_query(query)
+
+    def test_all_words_must_match(self):
+        names = [result.title for result in self._search('maple family')]
+        self.assertEqual(len(names), 1)
+        self.assertIn('Aceraceae', names[0])
+
+    def test_term_frequency_ranks_results(self):
+        results = list(self._search('maples'))
+        self.assertEqual(len(results), 2)
+        self.assertIn('Aceraceae', results[0].title)
+
+    def test_exact_name_is_promoted(self):
+        sqs = self._search('maples').filter_or(name__exact='sapindaceae')
+        self.assertIn('Sapindaceae', sqs[0].title)
+
+    def test_excluded_words(self):
+        results = list(self._search('maples -old'))
+        self.assertEqual(len(results), 1)
+        self.assertIn('Sapindaceae', results[0].title)
+
+    def test_spelling_suggestion(self):
+        sqs = self._search('birhc')
+        self.assertEqual(sqs.count(), 0)
+        self.assertEqual(sqs.spelling_suggestion('birhc'), 'birch')
+
+    def test_remove(self):
+        self.backend.remove(self.families[2])
+        self.assertEqual(self._search('birch').count(), 0)
+
+    def test_exact_match_on_a_stored_field(self):
+        title = list(self._search('birch'))[0].title
+        sqs = SearchQuerySet(using='embedded').filter(
+            title__exact=title.upper())
+        self.assertEqual([result.title for result in sqs], [title])
+
+    def test_more_like_this(self):
+        results = SearchQuerySet(using='embedded').more_like_this(
+            self.families[1])
+        self.assertIn('Sapindaceae', results[0].title)
+        self.assertNotIn('Aceraceae', [result.title for result in results])
+
+    def test_changes_bump_the_index_version(self):
+        version = resultcache.index_version()
+        self.backend.update(self.index, self.families[:1])
+        updated_version = resultcache.index_version()
+        self.assertNotEqual(updated_version, version)
+        self.backend.clear(models=[Family])
+        self.assertNotEqual(resultcache.index_version(), updated_version)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,11 +1,102 @@
 """The magic behind our search page."""
 
 import re
+from multiprocessing.pool import ThreadPool
+
+from django.db import connection
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from haystack.query import EmptySearchQuerySet
 from haystack.views import SearchView
 
+from gobotany.search import resultcache
+
+MAX_CONCURRENT_QUERIES = 4
+
+def count_results(queryset):
+    """Return how many hits a search has, without fetching any of them."""
+    if isinstance(queryset, EmptySearchQuerySet):
+        return 0
+    counter = queryset._clone()
+    counter.query.set_limits(0, 0)
+    return counter.query.get_count() or 0
+
+def _count_results_in_thread(queryset):
+    try:
+        return count_results(queryset)
+    finally:
+        connection.close()  # in case the search backend used the database
+
+def count_results_concurrently(querysets):
+    """Count the hits of several searches at once, in threads."""
+    if len(querysets) < 2:
+        return [count_results(queryset) for queryset in querysets]
+    pool = ThreadPool(min(len(querysets), MAX_CONCURRENT_QUERIES))
+    try:
+        return pool.map(_count_results_in_thread, querysets)
+    finally:
+        pool.close()
+
+class CachedResults(object):
+    """Stands in for the results of a search whose page is cached.
+
+    The paginator needs only the number of hits to lay out the page
+    navigation; the results themselves are already rendered.
+
+    """
+    def __init__(self, count):
+        self._count = count
+
+    def count(self):
+        return self._count
+
+    def __getitem__(self, key):
+        return []
+
 class GoBotanySearchView(SearchView):
     __name__ = "GoBotanySearchView"
 
+    def __call__(self, request):
+        self.request = request
+        self.form = self.build_form()
+        self.query = self.get_query()
+
+        # Pages that build_page() would reject are not cached.
+        key = None
+        page_number = request.GET.get('page', '1')
+        if page_number.isdigit() and int(page_number) > 0:
+            key = resultcache.page_key(self.query, int(page_number))
+            version = resultcache.index_version()
+
+        cached = key and resultcache.lookup(key, version)
+        if cached:
+            words = self.query.split()
+            if cached['query_words'] < len(words):
+                self.query = ' '.join(words[:cached['query_words']])
+            self.results = CachedResults(cached['count'])
+            context = self.get_context()
+            # Haystack only asks for a spelling suggestion when it has
+            # real results, so the one found the first time is kept.
+            if 'suggestion' in cached:
+                context['suggestion'] = cached['suggestion']
+        else:
+            self.results = self.get_results()
+            context = self.get_context()
+            cached = {
+                'count': context['paginator'].count,
+                'query_words': len(self.query.split()),
+                'results_html': render_to_string(
+                    '_search_results.html', context, request),
+                }
+            if 'suggestion' in context:
+                cached['suggestion'] = context['suggestion']
+            if key:
+                resultcache.store(key, cached, version)
+
+        context['results_html'] = mark_safe(cached['results_html'])
+        return render(request, self.template, context)
+
     def get_results(self):
         """When no results are found for multiple word searches, try
         searching without some of the words in order to be able to
@@ -21,21 +112,34 @@ class GoBotanySearchView(SearchView):
 
         # Fall back to less specific searches.
 
-        if len(queryset) == 0:
+        if count_results(queryset) == 0:
             # Query words come back "cleaned" from get_query().
-            query_words = self.get_query().split(' ')
+            query = self.get_query()
+            query_words = query.split(' ')
             if len(query_words) > 1:
-                # Try queries that drop a word at a time off the end.
-                for end_index in reversed(range(1, len(query_words))):
-                    new_query = ' '.join(query_words[0:end_index])
+                # Try queries that drop a word at a time off the end,
+                # counting the hits for all of them at once, and keep
+                # the longest one that finds something.
+                shorter_queries = [' '.join(query_words[0:end_index])
+                                   for end_index
+                                   in reversed(range(1, len(query_words)))]
+                querysets = []
+                for new_query in shorter_queries:
                     self.form.cleaned_data['q'] = new_query
-                    queryset = self.form.search()
-                    if len(queryset) > 0:
+                    querysets.append(self.form.search())
+                self.form.cleaned_data['q'] = query
+
+                counts = count_results_concurrently(querysets)
+                for new_query, new_queryset, count in zip(
+                        shorter_queries, querysets, counts):
+                    if count > 0:
                         # Found results for one of the words.
                         # Set our SearchView's query to the altered
                         # query, so the user can see the shortened
                         # search query that returned some results.
+                        self.form.cleaned_data['q'] = new_query
                         self.query = self.get_query()
+                        queryset = new_queryset
                         break
 
         # Privilege any result whose name is exactly what the user was
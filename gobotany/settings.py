@@ -217,7 +217,7 @@ USE_TZ = True
 # For django-haystack
 HAYSTACK_CONNECTIONS = {
     'default': {
-        'ENGINE': 'haystack.backends.solr_backend.SolrEngine',
+        'ENGINE': 'gobotany.search.backends.VersionedSolrEngine',
         'URL': 'http://127.0.0.1:8983/solr',
         'TIMEOUT': 20,  # Longer than default timeout; added for indexing
         'INCLUDE_SPELLING': True,
@@ -225,10 +225,49 @@ HAYSTACK_CONNECTIONS = {
     },
 }
 HAYSTACK_SEARCH_RESULTS_PER_PAGE = 10
-HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
+HAYSTACK_SIGNAL_PROCESSOR = 'gobotany.search.signals.QueuedSignalProcessor'
+# Seconds between flushes of the queue of search index updates by a
+# background thread in each process.  If unset, as it is by default in
+# production, run "dev/django process_search_queue --interval 5"
+# instead, as the Procfile does.
+SEARCH_QUEUE_INTERVAL = int(os.environ.get(
+    'SEARCH_QUEUE_INTERVAL', 0 if IN_PRODUCTION else 2)) or None
+# Seconds between runs of the queue of uploaded PlantShare images by a
+# background thread in each process.  If unset, as it is by default in
+# production, run "dev/django process_image_queue" instead, as the
+# Procfile does.
+IMAGE_QUEUE_INTERVAL = int(os.environ.get(
+    'IMAGE_QUEUE_INTERVAL', 0 if IN_PRODUCTION else 2)) or None
+if 'test' in sys.argv:
+    SEARCH_QUEUE_INTERVAL = None   # tests flush the queue themselves
+    IMAGE_QUEUE_INTERVAL = None   # tests run the queue themselves
+# Seconds to keep each rendered page of search results; 0 disables the
+# cache.  Cached pages are also dropped whenever the search index changes.
+SEARCH_RESULT_CACHE_TIMEOUT = int(os.environ.get(
+    'SEARCH_RESULT_CACHE_TIMEOUT', 60 * 60))
 # For when we are running on Heroku:
 if 'WEBSOLR_URL' in os.environ:
     HAYSTACK_CONNECTIONS['default']['URL'] = os.environ['WEBSOLR_URL']
+# An embedded search index kept in our own database, for running without
+# a Solr server.  Set $SEARCH_ENGINE to 'embedded' to use it instead of
+# Solr.  It is only registered when in use, because rebuild_index and
+# update_index fill every registered connection.
+EMBEDDED_SEARCH_CONNECTION = {
+    'ENGINE': 'gobotany.search.backends.EmbeddedSearchEngine',
+    'INCLUDE_SPELLING': True,
+    'BATCH_SIZE': 100,
+}
+if os.environ.get('SEARCH_ENGINE') == 'embedded':
+    HAYSTACK_CONNECTIONS['default'] = EMBEDDED_SEARCH_CONNECTION
+if 'test' in sys.argv:
+    # The embedded backend's own tests use it by name.
+    HAYSTACK_CONNECTIONS['embedded'] = EMBEDDED_SEARCH_CONNECTION
+
+# Seconds to keep each pre-rendered dichotomous key page in the cache,
+# where pages are put by the build_dkey_snapshots command and the first
+# time each is rendered.  Unset, as it is by default, every page is
+# rendered live from the database.
+DKEY_SNAPSHOT_TIMEOUT = int(os.environ.get('DKEY_SNAPSHOT_TIMEOUT', 0)) or None
 
 # For django-facebook-connect
 FACEBOOK_LOGIN_REDIRECT = '/plantshare/'
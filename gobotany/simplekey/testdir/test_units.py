@@ -14,6 +14,7 @@ from gobotany.simplekey.models import (GroupsListPage,
 from gobotany.simplekey.templatetags.simplekey_extras import italicize_plant
 from gobotany.simplekey.views import (_format_character_value,
                                       ordered_pilegroups, ordered_piles)
+from gobotany.site import suggestions
 
 # Following are data for groups and subgroups in the order that they are
 # created in the database by the importer. This will be tested against
@@ -407,6 +408,8 @@ class SearchSuggestionsTestCase(TestCase):
         for suggestion in SUGGESTIONS:
             s, created = SearchSuggestion.objects.get_or_create(
                 term=suggestion)
+        # Suggestion indexes are kept between requests until told otherwise.
+        suggestions.bump_data_version()
 
     def setUp(self):
         self.create_search_suggestions()
@@ -1,9 +1,20 @@
 from django.contrib import admin
 
 from gobotany.admin import GoBotanyModelAdmin
+from gobotany.site import suggestions
 from gobotany.site.models import SearchSuggestion
 
 class SearchSuggestionAdmin(GoBotanyModelAdmin):
     search_fields = ('term',)
 
+    # Tell each process to reload its in-memory suggestion index.
+    def save_model(self, request, obj, form, change):
+        super(SearchSuggestionAdmin, self).save_model(
+            request, obj, form, change)
+        suggestions.bump_data_version()
+
+    def delete_model(self, request, obj):
+        super(SearchSuggestionAdmin, self).delete_model(request, obj)
+        suggestions.bump_data_version()
+
 admin.site.register(SearchSuggestion, SearchSuggestionAdmin)
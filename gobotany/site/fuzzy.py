@@ -0,0 +1,100 @@
+"""Typo-tolerant matching of plant names, backed by trigram indexes.
+
+Names match a query under the rules of `query_regex`: interior letters
+of each word may be transposed, and a word may have one extra or one
+missing letter.  Such patterns force PostgreSQL into a sequential scan
+unless the column has a `pg_trgm` GIN index, which lets it narrow the
+rows by the trigrams the pattern requires before trying the pattern
+itself; a migration creates one for each column searched this way.
+
+Other databases, like the SQLite used by the tests, run the same
+regular expression through Django's `iregex` lookup.  `TrigramIndex`
+is a small pure-Python version of the trigram technique, used by the
+in-memory suggestion indexes of `gobotany.site.suggestions`.
+
+"""
+import re
+from collections import defaultdict
+
+from gobotany.site.utils import query_regex
+
+word_re = re.compile(r'[^\W_]+', re.UNICODE)
+QUANTIFIERS = '*+?{'
+
+def trigrams(text):
+    """Return the set of trigrams in `text`, as `pg_trgm` computes them.
+
+    Each word is lowercased and padded with two spaces in front and one
+    behind, so that trigrams also record where words begin and end.
+
+    """
+    grams = set()
+    for word in word_re.findall(text.lower()):
+        padded = u'  %s ' % word
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def required_trigrams(query, anchor_at_start=False):
+    """Return trigrams present in every name that `query` matches.
+
+    Every query word after the first is preceded by non-word characters
+    in a match, so its first letter, and for a two-letter word both of
+    its letters, must begin a word of the name.  The first word only
+    begins a word of the name if the match is anchored at the start.
+
+    """
+    grams = set()
+    for i, word in enumerate(query.lower().split()):
+        if i == 0 and not anchor_at_start:
+            continue
+        if len(word) > 2:
+            letters = word[0]   # the rest of a long word can vary
+        elif len(word) == 2 and word.isalnum():
+            letters = word
+        elif len(word) == 1 or word[1] not in QUANTIFIERS:
+            letters = word[0]
+        else:
+            continue
+        if not word_re.match(letters[0]):
+            continue
+        grams.add(u'  ' + letters[0])
+        if len(letters) == 2:
+            grams.add(u' ' + letters)
+    return grams
+
+class TrigramIndex(object):
+    """An inverted index from trigrams to positions in a list of names."""
+
+    def __init__(self, names):
+        self.postings = defaultdict(set)
+        for position, name in enumerate(names):
+            for gram in trigrams(name):
+                self.postings[gram].add(position)
+
+    def candidates(self, query, anchor_at_start=False):
+        """Return the sorted positions of names that could match `query`.
+
+        Returns None if the query requires no trigrams, in which case
+        any name could match.
+
+        """
+        grams = required_trigrams(query, anchor_at_start)
+        if not grams:
+            return None
+        postings = sorted((self.postings.get(gram, set()) for gram in grams),
+                          key=len)
+        positions = set(postings[0])
+        for other in postings[1:]:
+            positions &= other
+        return sorted(positions)
+
+def matching(queryset, field, name, anchor_at_start=False,
+             anchor_at_end=False):
+    """Return the rows of `queryset` whose `field` matches `name`."""
+    regex = query_regex(name, anchor_at_start=anchor_at_start,
+                        anchor_at_end=anchor_at_end)
+    try:
+        re.compile(regex, re.I | re.U)
+    except re.error:
+        return queryset.none()
+    return queryset.filter(**{field + '__iregex': regex})
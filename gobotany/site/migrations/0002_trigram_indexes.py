@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Columns searched with the typo-tolerant patterns of gobotany.site.fuzzy.
+
+TRIGRAM_INDEXES = [
+    ('core_taxon', 'scientific_name'),
+    ('core_commonname', 'common_name'),
+    ('core_synonym', 'scientific_name'),
+    ('site_plantnamesuggestion', 'name'),
+    ('site_searchsuggestion', 'term'),
+    ]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            'CREATE INDEX {0}_{1}_trgm ON {0} USING gin ({1} gin_trgm_ops)'
+            .format(table, column))
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS {0}_{1}_trgm'.format(table, column))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_auto_20160413_1915'),
+        ('site', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
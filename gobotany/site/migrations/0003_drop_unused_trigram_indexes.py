@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Suggestions are now matched by the in-memory indexes of
+# gobotany.site.suggestions, and PlantShare looks plant names up in
+# core_postingrestrictionname, so nothing searches these columns with
+# trigram-indexable patterns any more.  The indexes only slow down
+# every import.
+
+TRIGRAM_INDEXES = [
+    ('core_taxon', 'scientific_name'),
+    ('core_commonname', 'common_name'),
+    ('core_synonym', 'scientific_name'),
+    ('site_plantnamesuggestion', 'name'),
+    ('site_searchsuggestion', 'term'),
+    ]
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS {0}_{1}_trgm'.format(table, column))
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            'CREATE INDEX {0}_{1}_trgm ON {0} USING gin ({1} gin_trgm_ops)'
+            .format(table, column))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site', '0002_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_trigram_indexes, create_trigram_indexes),
+    ]
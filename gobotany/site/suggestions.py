@@ -0,0 +1,156 @@
+"""In-memory indexes of search and plant name suggestions.
+
+The suggestion web services are called on every keystroke.  Rather than
+run a case-insensitive regular expression across a whole table of
+suggestions each time, each process keeps the suggestions in a sorted
+list, which it reloads only when the data version kept in the cache is
+bumped: by the importer after rebuilding the suggestion tables, or by
+the admin after a suggestion is edited.
+
+Matching uses the same typo-tolerant `query_regex` as before, so the
+suggestions offered are unchanged.  Matches at the start of a name come
+from a binary search for the query's first characters followed by the
+regular expression on just that range; other matches are looked for
+among the names that share the query's required trigrams (see
+`gobotany.site.fuzzy`).  Finished answers are remembered until the next
+reload.
+
+"""
+import re
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+from gobotany.site.fuzzy import TrigramIndex
+from gobotany.site.models import PlantNameSuggestion, SearchSuggestion
+from gobotany.site.utils import query_regex
+
+DATA_VERSION_KEY = 'suggestions-data-version'
+MAX_REMEMBERED_QUERIES = 10000
+
+literal_re = re.compile(r'[a-z0-9 ]+')
+
+def data_version():
+    """Return the current version of the suggestion tables."""
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        version = 0
+    return version
+
+def bump_data_version():
+    """Tell every process that its suggestion indexes are stale."""
+    try:
+        cache.incr(DATA_VERSION_KEY)
+    except ValueError:
+        cache.set(DATA_VERSION_KEY, 1, None)
+
+def _literal_prefix(query):
+    """Return the characters that every match must begin with."""
+    words = query.split()
+    if not words:
+        return u''
+    word = words[0]
+    if len(word) > 2:
+        word = word[0]   # query_regex() lets the rest of a long word vary
+    match = literal_re.match(word)
+    return match.group(0) if match else u''
+
+class SuggestionIndex(object):
+    """A sorted list of suggestions, searchable with `query_regex`."""
+
+    def __init__(self, names):
+        self.names = sorted(names, key=lambda name: (name.lower(), name))
+        self.keys = [name.lower() for name in self.names]
+        self.trigrams = TrigramIndex(self.names)
+        self.answers = {}
+
+    def match(self, query, limit):
+        """Return up to `limit` names matching `query`.
+
+        Names matching at their start come first, then names matching
+        anywhere else, each group in case-insensitive alphabetical
+        order.  A name equal to the query itself is not suggested.
+
+        """
+        key = (query, limit)
+        answer = self.answers.get(key)
+        if answer is None:
+            answer = self._match(query, limit)
+            if len(self.answers) >= MAX_REMEMBERED_QUERIES:
+                self.answers.clear()
+            self.answers[key] = answer
+        return list(answer)
+
+    def _match(self, query, limit):
+        try:
+            regex = re.compile(query_regex(query), re.I | re.U)
+        except re.error:
+            return []
+
+        prefix = _literal_prefix(query)
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + u'\uffff')
+
+        found = []
+        for i in xrange(start, end):
+            name = self.names[i]
+            if name != query and regex.match(name):
+                found.append(name)
+                if len(found) == limit:
+                    return found
+
+        positions = self.trigrams.candidates(query)
+        if positions is None:
+            positions = xrange(len(self.names))
+        first = prefix[:1]
+        for i in positions:
+            if first not in self.keys[i]:
+                continue
+            name = self.names[i]
+            if start <= i < end and regex.match(name):
+                continue   # already offered, or equal to the query
+            if regex.search(name):
+                found.append(name)
+                if len(found) == limit:
+                    break
+        return found
+
+def _load_search_suggestions():
+    # Terms are stored lowercased, but older rows may not be; offer
+    # each term only once, in lowercase.
+    terms = SearchSuggestion.objects.values_list('term', flat=True)
+    return SuggestionIndex(set(term.lower() for term in terms))
+
+def _load_plant_name_suggestions():
+    return SuggestionIndex(
+        PlantNameSuggestion.objects.values_list('name', flat=True))
+
+_loaders = {
+    'search': _load_search_suggestions,
+    'plant-names': _load_plant_name_suggestions,
+    }
+_indexes = {}
+_indexes_version = [None]
+
+def get_index(name):
+    """Return the named `SuggestionIndex`, loading it only if necessary.
+
+    Each index is kept until the data version is bumped, as it is
+    whenever the suggestion tables change, so changes show up at once
+    in development too.
+
+    """
+    version = data_version()
+    if _indexes_version[0] != version:
+        _indexes.clear()
+        _indexes_version[0] = version
+    index = _indexes.get(name)
+    if index is None:
+        index = _indexes[name] = _loaders[name]()
+    return index
+
+def search_suggestions(query, limit):
+    return get_index('search').match(query, limit)
+
+def plant_name_suggestions(query, limit):
+    return get_index('plant-names').match(query, limit)
@@ -10,6 +10,7 @@ from django.test.client import Client
 
 from gobotany.libtest import FunctionalCase
 from gobotany.site import models as site_models
+from gobotany.site import fuzzy, suggestions
 
 def _setup_sample_data():
     names = [   ('Abies balsamea', 'balsam fir'),
@@ -57,6 +58,8 @@ def _setup_sample_data():
         s.save()
         s = site_models.PlantNameSuggestion(name=name[1])
         s.save()
+    # Suggestion indexes are kept between requests until told otherwise.
+    suggestions.bump_data_version()
 
 
 @unittest.skip('Skipping tests that run against the real database')
@@ -568,6 +571,65 @@ class PlantNameSuggestionsTests(TestCase):
         self.assertEqual(names, expected_names)
 
 
+class SuggestionIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = suggestions.SuggestionIndex([
+            u'Plymouth rose-gentian', u'Sabatia kennedyana', u'sweetflag',
+            u'several-veined sweetflag', u'single-veined sweetflag',
+            ])
+
+    def test_matches_at_start_come_first(self):
+        self.assertEqual(self.index.match(u'sweetflag', 10), [
+            u'several-veined sweetflag', u'single-veined sweetflag'])
+        self.assertEqual(self.index.match(u's', 10), [
+            u'Sabatia kennedyana', u'several-veined sweetflag',
+            u'single-veined sweetflag', u'sweetflag',
+            u'Plymouth rose-gentian'])
+
+    def test_limit(self):
+        self.assertEqual(self.index.match(u's', 2), [
+            u'Sabatia kennedyana', u'several-veined sweetflag'])
+
+    def test_typos_are_tolerated(self):
+        self.assertEqual(self.index.match(u'pylmouth rsoe', 10),
+                         [u'Plymouth rose-gentian'])
+        self.assertEqual(self.index.match(u'sabatia kened', 10),
+                         [u'Sabatia kennedyana'])
+
+    def test_invalid_pattern_matches_nothing(self):
+        self.assertEqual(self.index.match(u'+', 10), [])
+
+
+class FuzzyMatchingTests(TestCase):
+
+    def test_trigrams_are_padded_like_pg_trgm(self):
+        self.assertEqual(fuzzy.trigrams(u'Acer'),
+                         set([u'  a', u' ac', u'ace', u'cer', u'er ']))
+
+    def test_required_trigrams(self):
+        self.assertEqual(fuzzy.required_trigrams(u'pylmouth rs'),
+                         set([u'  r', u' rs']))
+        self.assertEqual(fuzzy.required_trigrams(u'pylmouth rs', True),
+                         set([u'  p', u'  r', u' rs']))
+
+    def test_candidates_include_every_match(self):
+        names = [u'Plymouth rose-gentian', u'Sabatia kennedyana',
+                 u'rose pogonia']
+        index = fuzzy.TrigramIndex(names)
+        self.assertEqual(index.candidates(u'plymouth rsoe'), [0, 2])
+        self.assertEqual(index.candidates(u'sabatia kened', True), [1])
+        self.assertEqual(index.candidates(u'rose'), None)
+
+    def test_matching(self):
+        for name in [u'Plymouth rose-gentian', u'Sabatia kennedyana']:
+            site_models.PlantNameSuggestion.objects.create(name=name)
+        names = fuzzy.matching(
+            site_models.PlantNameSuggestion.objects.all(), 'name',
+            u'sabatia kenedyana', anchor_at_start=True, anchor_at_end=True)
+        self.assertEqual([n.name for n in names], [u'Sabatia kennedyana'])
+
+
 class RobotsTests(TestCase):
 
     def test_robots_returns_ok(self):
@@ -4,10 +4,7 @@ import json
 import re
 import string
 
-from datetime import date
-
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Q
 from django.core.urlresolvers import reverse
 from django.http import HttpResponse
@@ -15,7 +12,6 @@ from django.shortcuts import redirect, render
 from django.template import RequestContext
 from django.views.decorators.vary import vary_on_headers
 
-from gobotany.core import botany
 from gobotany.core.models import (
     CommonName, ContentImage, CopyrightHolder, Distribution,
     Family, Genus, GlossaryTerm, HomePageImage, PartnerSite, PartnerSpecies,
@@ -23,10 +19,10 @@ from gobotany.core.models import (
     )
 from gobotany.core.partner import (which_partner, partner_short_name,
                                    per_partner_template, render_per_partner)
-from gobotany.plantoftheday.models import PlantOfTheDay
+from gobotany.plantoftheday import daily
 from gobotany.simplekey.groups_order import ordered_pilegroups, ordered_piles
-from gobotany.site.models import PlantNameSuggestion, SearchSuggestion
-from gobotany.site.utils import query_regex
+from gobotany.site.suggestions import (plant_name_suggestions,
+                                      search_suggestions)
 
 # Home page
 
@@ -39,27 +35,18 @@ def home_view(request):
     # Get home page images for the partner
     home_page_images = HomePageImage.objects.filter(partner_site=partner)
 
-    # Get or generate today's Plant of the Day, if appropriate.
-    plant_of_the_day = PlantOfTheDay.get_by_date.for_day(
-        date.today(), partner.short_name)
-    plant_of_the_day_taxon = None
-    if plant_of_the_day:
-        # Get the Taxon record of the Plant of the Day.
-        try:
-            plant_of_the_day_taxon = Taxon.objects.get(
-                scientific_name=plant_of_the_day.scientific_name)
-        except ObjectDoesNotExist:
-            pass
-
+    # Get today's Plant of the Day, and what the page shows about it,
+    # from the partner's daily list of recent plants.
+    plant_of_the_day = None
     plant_of_the_day_image = None
-    species_images = botany.species_images(plant_of_the_day_taxon)
-    if species_images:
-        plant_of_the_day_image = botany.species_images(
-            plant_of_the_day_taxon)[0]
+    plants_of_the_day = daily.plants_of_the_day(partner.short_name)
+    if plants_of_the_day:
+        plant_of_the_day = plants_of_the_day[0]
+        plant_of_the_day_image = plant_of_the_day['image']
 
     return render_per_partner('home.html', {
             'home_page_images': home_page_images,
-            'plant_of_the_day': plant_of_the_day_taxon,
+            'plant_of_the_day': plant_of_the_day,
             'plant_of_the_day_image': plant_of_the_day_image,
             }, request)
 
@@ -208,42 +195,11 @@ def search_suggestions_view(request):
     query = request.GET.get('q', '').lower()
     query = clean_input_string(query)
 
+    # Suggestions that match at the start of a term come first, then
+    # any that match elsewhere in a term.
     suggestions = []
     if query != '':
-        regex = query_regex(query)
-
-        # Make a variation for checking at the start of the string.
-        regex_at_start = '^%s' % regex
-
-        # First look for suggestions that match at the start of the
-        # query string.
-
-        # This query is case-sensitive for better speed than using a
-        # case-insensitive query. The database field is also case-
-        # sensitive, so it is important that all SearchSuggestion
-        # records be lowercased before import to ensure that they
-        # can be reached.
-        suggestions = list(SearchSuggestion.objects.filter(
-            term__iregex=regex_at_start).exclude(term=query).
-            order_by('term').values_list('term', flat=True)
-            [:MAX_RESULTS * 2])   # Fetch extra to handle case-sensitive dups
-        # Remove any duplicates due to case-sensitivity and pare down to
-        # the desired number of results.
-        suggestions = list(sorted(set([suggestion.lower()
-            for suggestion in suggestions])))[:MAX_RESULTS]
-
-        # If fewer than the maximum number of suggestions were found,
-        # try finding some additional ones that match anywhere in the
-        # query string.
-        remaining_slots = MAX_RESULTS - len(suggestions)
-        if remaining_slots > 0:
-            more_suggestions = list(SearchSuggestion.objects.filter(
-                term__iregex=regex).exclude(term__iregex=regex_at_start).
-                order_by('term').values_list('term', flat=True)
-                [:MAX_RESULTS * 2])
-            more_suggestions = list(sorted(set([suggestion.lower()
-                for suggestion in  more_suggestions])))[:remaining_slots]
-            suggestions.extend(more_suggestions)
+        suggestions = search_suggestions(query, MAX_RESULTS)
 
     return HttpResponse(json.dumps(suggestions),
         content_type='application/json; charset=utf-8')
@@ -256,29 +212,11 @@ def plant_name_suggestions_view(request):
     query = request.GET.get('q', '').lower()
     query = clean_input_string(query)
 
+    # Names that match at the start come first, then any that match
+    # elsewhere in a name.
     suggestions = []
     if query != '':
-        regex = query_regex(query)
-
-        # Make a variation for checking at the start of the string.
-        regex_at_start = '^%s' % regex
-
-        # First look for suggestions that match at the start of the
-        # query string.
-        suggestions = list(PlantNameSuggestion.objects.filter(
-            name__iregex=regex_at_start).exclude(name=query).
-            order_by('name').values_list('name', flat=True)[:MAX_RESULTS])
-
-        # If fewer than the maximum number of suggestions were found,
-        # try finding some additional ones that match anywhere in the
-        # query string.
-        remaining_slots = MAX_RESULTS - len(suggestions)
-        if remaining_slots > 0:
-            more_suggestions = list(PlantNameSuggestion.objects.filter(
-                name__iregex=regex).exclude(name__iregex=regex_at_start).
-                order_by('name').values_list('name', flat=True)[:MAX_RESULTS])
-            more_suggestions = list(more_suggestions)[:remaining_slots]
-            suggestions.extend(more_suggestions)
+        suggestions = plant_name_suggestions(query, MAX_RESULTS)
 
     return HttpResponse(json.dumps(suggestions),
         content_type='application/json; charset=utf-8')
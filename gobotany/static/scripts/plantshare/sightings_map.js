@@ -5,8 +5,9 @@
 
 define([
     'bridge/jquery',
+    'mapping/google_maps',
     'mapping/marker_map'
-], function ($, MarkerMap) {
+], function ($, google_maps, MarkerMap) {
 
     // Constructor
     function SightingsMap(map_div, cookie_names) {
@@ -15,6 +16,8 @@ define([
 
         this.cookie_names = cookie_names;
         this.MAX_INFO_DESC_LENGTH = 70;
+        this.cluster_markers = [];
+        this.request_number = 0;
 
         return this;
     };
@@ -97,24 +100,65 @@ define([
     };
 
     SightingsMap.prototype.show_sightings = function (plant_name) {
-        // Get sightings data from the server and show them on the map.
-        var url = '/plantshare/api/sightings/'
+        // Get sightings data from the server and show them on the map,
+        // fitting the map to them. Afterwards, whenever the user pans
+        // or zooms the map, get just the sightings within its bounds.
 
         // If the plant_name is undefined or null, will leave off the
         // plant parameter and show recent sightings. If the plant name
         // is non-empty or empty, will include the plant parameter and
         // show sightings for that query.
-        var show_plant = (plant_name !== undefined && plant_name !== null);
-        if (show_plant) {
-            url += '?plant=' + plant_name
+        this.plant_name = plant_name;
+        this.show_plant = (plant_name !== undefined && plant_name !== null);
+        this.get_sightings(true);
+
+        if (this.idle_listener === undefined) {
+            // The map goes idle once it has finished panning or zooming.
+            this.idle_listener = google_maps.event.addListener(
+                this.map, 'idle', $.proxy(function () {
+                    this.get_sightings(false);
+                }, this));
+        }
+    };
+
+    SightingsMap.prototype.get_sightings = function (fit_bounds) {
+        // Get sightings from the server. Unless fitting the map to all
+        // of them, ask only for those in the map's current bounds at
+        // its zoom level, which at low zoom levels come back as clusters.
+        var url = '/plantshare/api/sightings/';
+        var parameters = {};
+        if (this.show_plant) {
+            parameters.plant = this.plant_name;
+        }
+        var bounds = this.get_bounds();
+        if (fit_bounds !== true && bounds) {
+            var south_west = bounds.getSouthWest();
+            var north_east = bounds.getNorthEast();
+            parameters.bbox = [south_west.lng(), south_west.lat(),
+                               north_east.lng(), north_east.lat()].join(',');
+            parameters.zoom = this.map.getZoom();
         }
+
+        // Only the latest request's response is shown, in case an
+        // earlier one is slower to return.
+        var request_number = this.request_number = this.request_number + 1;
         $.ajax({
             url: url,
+            data: parameters,
             context: this
         }).done(function (json) {
+            if (request_number !== this.request_number) {
+                return;
+            }
             this.clear_markers();
+
+            if (json.clusters !== undefined) {
+                this.show_clusters(json.clusters);
+                return;
+            }
+
             var sightings_count = json.sightings.length;
-            if (show_plant) {
+            if (this.show_plant) {
                 this.show_sightings_count(sightings_count);
             }
 
@@ -129,10 +173,12 @@ define([
 
                 // Determine whether to show the info window for this
                 // sighting: do so if it was stored as the last viewed.
+                // Only do this when fitting the map to the sightings,
+                // because opening the window can pan the map again.
                 var show_info = false;
                 var last_sighting_id = parseInt(
                     $.cookie(this.cookie_names['last_viewed']));
-                if (last_sighting_id === sighting.id) {
+                if (fit_bounds === true && last_sighting_id === sighting.id) {
                     show_info = true;
                 }
 
@@ -147,11 +193,48 @@ define([
                     show_info);
             }
 
-            // Set the viewport bounds to show all the markers.
-            this.fit_bounds_to_coordinates(coordinates);
+            if (fit_bounds === true) {
+                // Set the viewport bounds to show all the markers.
+                this.fit_bounds_to_coordinates(coordinates);
+            }
         });
     };
 
+    SightingsMap.prototype.show_clusters = function (clusters) {
+        // Show a marker, labeled with its count, for each cluster of
+        // sightings. Clicking one zooms the map in on it.
+        var sightings_count = 0;
+        for (var i = 0; i < clusters.length; i++) {
+            var cluster = clusters[i];
+            sightings_count += cluster.count;
+            var marker = new google_maps.Marker({
+                position: new google_maps.LatLng(cluster.latitude,
+                                                 cluster.longitude),
+                label: String(cluster.count),
+                title: cluster.count + (cluster.count === 1 ?
+                    ' sighting' : ' sightings'),
+                map: this.map
+            });
+            google_maps.event.addListener(marker, 'click', $.proxy(
+                function (marker) {
+                    this.map.setCenter(marker.getPosition());
+                    this.map.setZoom(this.map.getZoom() + 2);
+                }, this, marker));
+            this.cluster_markers.push(marker);
+        }
+        if (this.show_plant) {
+            this.show_sightings_count(sightings_count);
+        }
+    };
+
+    SightingsMap.prototype.clear_markers = function () {
+        MarkerMap.prototype.clear_markers.call(this);
+        for (var i = 0; i < this.cluster_markers.length; i++) {
+            this.cluster_markers[i].setMap(null);
+        }
+        this.cluster_markers = [];
+    };
+
     SightingsMap.prototype.show_sighting = function (sighting_id,
             cookie_names) {
         // Show a single recent sighting on the map.
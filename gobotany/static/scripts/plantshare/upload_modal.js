@@ -6,6 +6,8 @@ define([
     var EMPTY_FILE_PATH = 'None Selected';
     var EMPTY_IMAGE_URL = '/static/images/icons/no-image.png';
     var LOADING_IMAGE_URL = '/static/images/icons/preloaders-dot-net-lg.gif';
+    var STATUS_POLL_INTERVAL = 1000;   // milliseconds
+    var MAX_STATUS_POLLS = 180;   // give up after about three minutes
 
     function resize(image, $thumbnail_element) {
         var MAX_WIDTH = 1000;
@@ -43,6 +45,35 @@ define([
         }
     }
 
+    function wait_until_processed(response, callback, polls) {
+        // Uploaded images are resized on the server after the upload
+        // itself returns, so check back until the image is ready, or
+        // report an error if it does not become ready in time.
+        polls = polls || 0;
+        if (!response.success || response.status !== 'pending') {
+            callback(response);
+            return;
+        }
+        if (polls >= MAX_STATUS_POLLS) {
+            callback({
+                'success': false,
+                'info': 'The image is taking too long to process. ' +
+                        'Please try again later.'
+            });
+            return;
+        }
+        setTimeout(function () {
+            $.getJSON(response.status_url, function (status) {
+                wait_until_processed(status, callback, polls + 1);
+            }).fail(function () {
+                callback({
+                    'success': false,
+                    'info': 'Could not check whether the image is ready.'
+                });
+            });
+        }, STATUS_POLL_INTERVAL);
+    }
+
     function reset_dialog_controls($modal) {
         // Clear any thumbnail and filename, and disable the Upload button.
         $modal.find('img').attr('src', EMPTY_IMAGE_URL);
@@ -148,21 +179,24 @@ define([
         // Submit button
         $modal.find('#upload-image-submit').click(function () {
             $modal.find('#upload-image-form').ajaxSubmit(function (response) {
-                if(response.success) {
-                    console.log('Upload complete');
-                    var imageInfo = {
-                        'id': response.id,
-                        'thumb': response.thumb,
-                        'url': response.url,
-                        'latitude': response.latitude,
-                        'longitude': response.longitude
-                    };
-                    settings.onUploadComplete.call(this, imageInfo,
-                        $lastTrigger); 
-                } else {
-                    console.log('Error during upload: ' + response.info);
-                    settings.onError.call(this, response.info, $lastTrigger);
-                }
+                wait_until_processed(response, function (response) {
+                    if(response.success) {
+                        console.log('Upload complete');
+                        var imageInfo = {
+                            'id': response.id,
+                            'thumb': response.thumb,
+                            'url': response.url,
+                            'latitude': response.latitude,
+                            'longitude': response.longitude
+                        };
+                        settings.onUploadComplete.call(this, imageInfo,
+                            $lastTrigger); 
+                    } else {
+                        console.log('Error during upload: ' + response.info);
+                        settings.onError.call(this, response.info,
+                            $lastTrigger);
+                    }
+                });
             });
             $lastTrigger.overlay().close();
             settings.onStartUpload.call(this, $lastTrigger);
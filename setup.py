@@ -63,6 +63,7 @@ package_data['gobotany'].append('static/*/*/*/*.*')
 package_data['gobotany.api'].append('testdata/*.*')
 package_data['gobotany.core'].append('image_categories.csv')
 package_data['gobotany.core'].append('testdata/*.*')
+package_data['gobotany.plantshare'].append('state_boundaries.json')
 
 setup(
     name='gobotany',